@@ -0,0 +1,84 @@
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from urllib.parse import urlsplit, quote
+
+
+# Адреса нагрузки по умолчанию: первые страницы списков, поиск и расчеты стоимости
+DEFAULT_PATHS = (
+    "/products?limit=50",
+    "/products?limit=50&text=" + quote("Обои"),
+    "/materials?limit=50",
+    "/products/{product_id}/quote?quantity=10",
+)
+
+
+async def client(host, port, paths, deadline, latencies, statuses, etags, revalidate):
+    # Одно keep-alive соединение, запросы друг за другом до deadline
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            path = random.choice(paths).format(product_id=random.randint(1, 1000))
+            request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n"
+            if revalidate and path in etags:
+                request += f"If-None-Match: {etags[path]}\r\n"
+            started = time.perf_counter()
+            writer.write((request + "\r\n").encode("utf-8"))
+            head = await reader.readuntil(b"\r\n\r\n")
+            headers = {}
+            lines = head.decode("latin-1").split("\r\n")
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            if length:
+                await reader.readexactly(length)
+            latencies.append((time.perf_counter() - started) * 1000)
+            status = int(lines[0].split(" ")[1])
+            statuses[status] = statuses.get(status, 0) + 1
+            if "etag" in headers:
+                etags[path] = headers["etag"]
+    finally:
+        writer.close()
+
+
+async def run(url, connections, duration, paths, revalidate):
+    parts = urlsplit(url)
+    latencies = []
+    statuses = {}
+    etags = {}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client(parts.hostname, parts.port or 80, paths, deadline, latencies, statuses, etags,
+                                  revalidate)
+                           for _ in range(connections)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузка на HTTP-сервис каталога (python -m nashdekor.api)")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="адрес сервиса")
+    parser.add_argument("--connections", type=int, default=50, help="одновременных соединений")
+    parser.add_argument("--duration", type=float, default=10, help="длительность, секунд")
+    parser.add_argument("--path", action="append", help="адрес запроса (можно несколько; {product_id} - случайный)")
+    parser.add_argument("--revalidate", action="store_true", help="повторять запросы с If-None-Match")
+    args = parser.parse_args(argv)
+
+    latencies, statuses, elapsed = asyncio.run(run(args.url, args.connections, args.duration,
+                                                   args.path or DEFAULT_PATHS, args.revalidate))
+    if not latencies:
+        print("Нет ни одного ответа", file=sys.stderr)
+        return 1
+    latencies.sort()
+    print(f"Запросов: {len(latencies)} за {elapsed:.1f} с - {len(latencies) / elapsed:.0f} в секунду")
+    print(f"Задержка, мс: медиана {statistics.median(latencies):.2f}, "
+          f"95% {latencies[int(len(latencies) * 0.95)]:.2f}, максимум {latencies[-1]:.2f}")
+    print("Коды ответов: " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+import os
+import sys
+import argparse
+import time
+
+import psycopg2
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from nashdekor.db import ConnectionManager, load_db_config, apply_migrations
+from nashdekor.catalog import recalculate_prices, MATERIAL_UNITS
+from nashdekor.reports import refresh_reports
+
+
+# Отдельная база для замеров: генератор пересоздает ее целиком
+BENCH_DBNAME = "nashdekor_bench"
+
+SCHEMA_FILE = os.path.join(ROOT_DIR, "скрипт бд.sql")
+
+# Раздел индексов в скрипте требует pg_trgm; те же индексы создает миграция 0001,
+# которая проверяет наличие расширения, поэтому из скрипта берутся только таблицы
+SCHEMA_INDEXES_MARKER = "-- Индексы для списков"
+
+# Начальное значение генератора случайных чисел PostgreSQL (setseed): одинаковые
+# параметры дают одинаковые данные
+DEFAULT_SEED = 0.42
+
+TYPE_PRODUCT = (("Обои", 1.5), ("Ламинат", 2.3), ("Плитка", 3.1), ("Паркет", 4.2), ("Панели", 1.8))
+TYPE_MATERIAL = (("Бумага", 0.7), ("Краска", 0.5), ("Пленка", 1.2), ("Клей", 0.3), ("Пигмент", 0.9))
+TYPE_PART_SUP = ("ООО", "ЗАО", "ИП", "ПАО", "ОАО")
+SPECIALIZATIONS = ("Менеджер", "Мастер", "Кладовщик", "Технолог", "Бухгалтер")
+SKLADS = ("Основной склад", "Склад сырья", "Склад готовой продукции")
+
+PRODUCT_WORDS = ("Обои", "Ламинат", "Плитка", "Паркет", "Панель", "Бордюр", "Фреска", "Молдинг")
+PRODUCT_STYLES = ("Классика", "Модерн", "Прованс", "Лофт", "Сканди", "Барокко", "Минимал", "Эко")
+MATERIAL_WORDS = ("Бумага", "Краска", "Пленка", "Клей", "Пигмент", "Грунт", "Лак", "Флизелин")
+
+
+def dataset_sizes(products, **overrides):
+    # Размеры всех 13 таблиц от числа продукции; любое можно задать явно
+    sizes = {
+        "type_product": len(TYPE_PRODUCT),
+        "type_material": len(TYPE_MATERIAL),
+        "type_part_sup": len(TYPE_PART_SUP),
+        "specialization": len(SPECIALIZATIONS),
+        "sklad": len(SKLADS),
+        "products": products,
+        "materials": max(100, products // 10),
+        "partners": max(100, products // 10),
+        "employees": max(10, products // 1000),
+        "suppliers": max(5, products // 5000),
+        "requests": products,
+        "supplies": max(100, products // 10),
+    }
+    sizes["staff"] = sizes["employees"]
+    for table, value in overrides.items():
+        if value is not None:
+            sizes[table] = value
+    return sizes
+
+
+def sql_array(values):
+    return "ARRAY[" + ", ".join("'" + value.replace("'", "''") + "'" for value in values) + "]"
+
+
+def random_pick(values):
+    # Случайный элемент массива-литерала
+    return f"({sql_array(values)})[1 + floor(random() * {len(values)})::int]"
+
+
+def random_int(low, high):
+    return f"({low} + floor(random() * {high - low + 1})::int)"
+
+
+def random_money(low, high):
+    return f"round(({low} + random() * {high - low})::numeric, 2)"
+
+
+def schema_sql():
+    with open(SCHEMA_FILE, encoding="utf-8") as file:
+        script = file.read()
+    tables = script.split(SCHEMA_INDEXES_MARKER)[0]
+    return tables + "\nEND;\n"
+
+
+def recreate_database(config, dbname):
+    connection = psycopg2.connect(**ConnectionManager(config).connect_kwargs())
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS "{dbname}"')
+            cursor.execute(f'CREATE DATABASE "{dbname}"')
+    finally:
+        connection.close()
+
+
+def fill_tables(connection, sizes, seed):
+    # Заполняет таблицы одним INSERT ... SELECT на таблицу; порядок вставок
+    # и вызовов random() фиксирован, поэтому результат воспроизводим
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT setseed(%s)", (seed,))
+
+        cursor.execute(
+            "INSERT INTO type_product (type_product, coefficient_type_product) SELECT * FROM unnest(%s, %s)",
+            ([name for name, _ in TYPE_PRODUCT], [value for _, value in TYPE_PRODUCT])
+        )
+        cursor.execute(
+            "INSERT INTO type_material (type_material, percentage_material_defects) SELECT * FROM unnest(%s, %s)",
+            ([name for name, _ in TYPE_MATERIAL], [value for _, value in TYPE_MATERIAL])
+        )
+        cursor.execute("INSERT INTO type_part_sup (name) SELECT unnest(%s)", (list(TYPE_PART_SUP),))
+        cursor.execute("INSERT INTO specialization (name) SELECT unnest(%s)", (list(SPECIALIZATIONS),))
+        cursor.execute("INSERT INTO sklad (name) SELECT unnest(%s)", (list(SKLADS),))
+
+        cursor.execute(f"""
+            INSERT INTO employees (fio, date_birth, pasport, bank_details, having_family, health_condition)
+            SELECT 'Сотрудник ' || i,
+                   DATE '1965-01-01' + {random_int(0, 14000)},
+                   lpad({random_int(1000, 9999)}::text, 4, '0') || ' ' || lpad(i::text, 6, '0'),
+                   '40817810' || lpad(i::text, 12, '0'),
+                   {random_pick(("Женат/замужем", "Холост/не замужем", "Есть дети"))},
+                   {random_pick(("Здоров", "Ограничений нет", "Есть ограничения"))}
+            FROM generate_series(1, %s) AS i
+        """, (sizes["employees"],))
+        cursor.execute(f"""
+            INSERT INTO staff (id_employ, id_specialization)
+            SELECT 1 + (i - 1) %% %s, {random_int(1, sizes["specialization"])}
+            FROM generate_series(1, %s) AS i
+        """, (sizes["employees"], sizes["staff"]))
+
+        cursor.execute(f"""
+            INSERT INTO products (product_name, articul, min_cost, width, id_type_product)
+            SELECT {random_pick(PRODUCT_WORDS)} || ' ' || {random_pick(PRODUCT_STYLES)} || ' ' || i,
+                   'A' || lpad(i::text, 7, '0'),
+                   0,
+                   {random_money(0.5, 3)}::double precision,
+                   {random_int(1, sizes["type_product"])}
+            FROM generate_series(1, %s) AS i
+        """, (sizes["products"],))
+
+        cursor.execute(f"""
+            INSERT INTO materials (material_name, unit_price, stock_quantity, min_quantity,
+                                   package_quantity, unit, id_type_material)
+            SELECT {random_pick(MATERIAL_WORDS)} || ' ' || i,
+                   {random_money(10, 500)},
+                   {random_int(0, 1000)},
+                   {random_int(10, 300)},
+                   {random_int(1, 50)},
+                   {random_pick(MATERIAL_UNITS)},
+                   {random_int(1, sizes["type_material"])}
+            FROM generate_series(1, %s) AS i
+        """, (sizes["materials"],))
+
+        cursor.execute(f"""
+            INSERT INTO partners (partner_name, director, email, phone_number, legal_addres, inn,
+                                  rating, id_type_part)
+            SELECT 'Партнер ' || i,
+                   'Директор ' || i,
+                   'partner' || i || '@example.com',
+                   '+7 9' || lpad({random_int(0, 999999999)}::text, 9, '0'),
+                   'г. Москва, ул. Примерная, д. ' || i,
+                   7700000000 + i,
+                   {random_int(1, 10)},
+                   {random_int(1, sizes["type_part_sup"])}
+            FROM generate_series(1, %s) AS i
+        """, (sizes["partners"],))
+
+        cursor.execute(f"""
+            INSERT INTO suppliers (id_type_sup, supplier_name, inn, rating, date)
+            SELECT {random_int(1, sizes["type_part_sup"])},
+                   'Поставщик ' || i,
+                   5000000000 + i,
+                   {random_int(1, 10)},
+                   DATE '2015-01-01' + {random_int(0, 3650)}
+            FROM generate_series(1, %s) AS i
+        """, (sizes["suppliers"],))
+
+        cursor.execute(f"""
+            INSERT INTO supplies (id_suppliers, id_material, id_sklad, count)
+            SELECT {random_int(1, sizes["suppliers"])},
+                   {random_int(1, sizes["materials"])},
+                   {random_int(1, sizes["sklad"])},
+                   {random_int(1, 500)}
+            FROM generate_series(1, %s)
+        """, (sizes["supplies"],))
+
+        cursor.execute(f"""
+            INSERT INTO requests (id_product, cost, date, count, id_part, id_employ)
+            SELECT {random_int(1, sizes["products"])},
+                   {random_money(100, 50000)}::double precision,
+                   DATE '2020-01-01' + {random_int(0, 2190)},
+                   {random_int(1, 100)},
+                   {random_int(1, sizes["partners"])},
+                   {random_int(1, sizes["employees"])}
+            FROM generate_series(1, %s)
+        """, (sizes["requests"],))
+
+
+def generate(config, dbname, sizes, seed=DEFAULT_SEED):
+    # Пересоздает базу dbname со схемой из скрипта, данными и всеми миграциями
+    recreate_database(config, dbname)
+
+    bench_config = dict(config, dbname=dbname)
+    db = ConnectionManager(bench_config)
+    try:
+        db.run(lambda connection: connection.cursor().execute(schema_sql()))
+        db.run(lambda connection: fill_tables(connection, sizes, seed))
+        # Стоимость по тому же правилу, что и в приложении: пересчет в замерах
+        # возвращает данные к исходному состоянию
+        db.run(recalculate_prices)
+        # Индексы и триггеры миграций создаются после загрузки - так быстрее
+        db.run(apply_migrations)
+        db.run(lambda connection: refresh_reports(connection, full=True))
+    finally:
+        db.close()
+
+    connection = psycopg2.connect(**ConnectionManager(bench_config).connect_kwargs())
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE")
+    finally:
+        connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Синтетические данные для замеров производительности")
+    parser.add_argument("--products", type=int, default=10000, help="число продукции (от 1000 до 1000000)")
+    for table in ("materials", "partners", "requests", "supplies", "employees", "suppliers"):
+        parser.add_argument(f"--{table}", type=int, help="по умолчанию - от числа продукции")
+    parser.add_argument("--seed", type=float, default=DEFAULT_SEED, help="setseed(), от -1 до 1")
+    parser.add_argument("--dbname", default=BENCH_DBNAME, help="база для замеров (будет пересоздана)")
+    args = parser.parse_args(argv)
+
+    config = load_db_config()
+    if args.dbname == config["dbname"]:
+        print(f"Ошибка: база {args.dbname} указана в настройках приложения, генератор ее не пересоздает",
+              file=sys.stderr)
+        return 1
+
+    sizes = dataset_sizes(args.products, materials=args.materials, partners=args.partners,
+                          requests=args.requests, supplies=args.supplies, employees=args.employees,
+                          suppliers=args.suppliers)
+    started = time.perf_counter()
+    try:
+        generate(config, args.dbname, sizes, args.seed)
+    except (psycopg2.Error, OSError) as e:
+        print(f"Ошибка: {str(e)}", file=sys.stderr)
+        return 1
+
+    print(f"База {args.dbname} заполнена за {time.perf_counter() - started:.1f} с:")
+    for table, count in sizes.items():
+        print(f"  {table}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
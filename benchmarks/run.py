@@ -0,0 +1,398 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import statistics
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# Окна не показываются: замеры идут на платформе Qt без экрана
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication, QMessageBox
+from PySide6.QtCore import QEventLoop, QTimer
+
+from nashdekor.db import ConnectionManager, load_db_config
+from nashdekor.catalog import (fetch_products, fetch_materials, recalculate_prices, fetch_product_form,
+                               fetch_material_form, save_product_row, save_material_row, ReferenceCache)
+from main import MainWindow, ProductDialog, MaterialDialog, apply_theme
+from generate import BENCH_DBNAME
+
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+DEFAULT_REPEAT = 5
+
+# Допустимое замедление медианы относительно базовой линии
+DEFAULT_TOLERANCE = 0.25
+
+# Разница меньше этой не считается регрессией (шум таймера и планировщика), мс
+MIN_REGRESSION_MS = 5.0
+
+# Предельное время одного действия в окне, мс
+GUI_TIMEOUT_MS = 600000
+
+SEARCH_FILTERS = {"text": "лофт", "type_id": None, "price_min": None, "price_max": None}
+TYPE_FILTERS = {"text": "", "type_id": 4, "price_min": 500, "price_max": 1000}
+
+TABLES = ("products", "materials", "partners", "requests", "supplies", "suppliers", "employees", "staff",
+          "sklad", "specialization", "type_product", "type_material", "type_part_sup")
+
+
+def dataset_info(connection):
+    with connection.cursor() as cursor:
+        counts = {}
+        for table in TABLES:
+            cursor.execute(f"SELECT count(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+        cursor.execute("SHOW server_version")
+        server_version = cursor.fetchone()[0]
+    return counts, server_version
+
+
+def sample_rows(connection):
+    # Строки из середины таблиц: для диалогов и второй страницы списка
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT id_product FROM products ORDER BY id_product
+            OFFSET (SELECT count(*) / 2 FROM products) LIMIT 1
+        """)
+        product_id = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT id_material FROM materials ORDER BY id_material
+            OFFSET (SELECT count(*) / 2 FROM materials) LIMIT 1
+        """)
+        material_id = cursor.fetchone()[0]
+        cursor.execute("SELECT articul, id_type_product, product_name, min_cost, width FROM products "
+                       "WHERE id_product = %s", (product_id,))
+        product_row = cursor.fetchone()
+        cursor.execute("SELECT material_name, id_type_material, unit_price, stock_quantity, min_quantity, "
+                       "package_quantity, unit FROM materials WHERE id_material = %s", (material_id,))
+        material_row = cursor.fetchone()
+    rows, _ = fetch_products(connection)
+    return {
+        "product_id": product_id,
+        "material_id": material_id,
+        "product_after": (rows[-1][2], rows[-1][0]),
+        "product_row": product_row,
+        "material_row": material_row,
+    }
+
+
+def perturb_prices(connection):
+    # Сдвигает стоимость всей продукции, чтобы пересчет каждый раз менял все строки
+    with connection.cursor() as cursor:
+        cursor.execute("UPDATE products SET min_cost = min_cost + 1")
+
+
+def vacuum_products(db):
+    # Пересчет оставляет мертвые версии всех строк продукции; без очистки
+    # следующие замеры шли бы по раздутой таблице
+    with db.lease() as connection:
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM ANALYZE products")
+        finally:
+            connection.autocommit = False
+
+
+def save_sample_product(connection, samples):
+    # Повторное сохранение тех же значений: данные не меняются между прогонами
+    return save_product_row(connection, samples["product_id"], *samples["product_row"])
+
+
+def save_sample_material(connection, samples):
+    return save_material_row(connection, samples["material_id"], *samples["material_row"])
+
+
+# Замеры слоя данных: (имя, подготовка вне замера, замеряемая функция)
+DATA_BENCHMARKS = (
+    ("data.fetch_products", None, lambda connection, samples: fetch_products(connection)),
+    ("data.fetch_products.next_page", None,
+     lambda connection, samples: fetch_products(connection, samples["product_after"])),
+    ("data.fetch_products.search", None, lambda connection, samples: fetch_products(connection, filters=SEARCH_FILTERS)),
+    ("data.fetch_products.type_price", None,
+     lambda connection, samples: fetch_products(connection, filters=TYPE_FILTERS)),
+    ("data.fetch_materials", None, lambda connection, samples: fetch_materials(connection)),
+    ("data.fetch_materials.search", None,
+     lambda connection, samples: fetch_materials(connection, filters=SEARCH_FILTERS)),
+    ("data.recalculate_prices", perturb_prices, lambda connection, samples: recalculate_prices(connection)),
+    ("data.fetch_product_form", None,
+     lambda connection, samples: fetch_product_form(connection, ReferenceCache(), samples["product_id"])),
+    ("data.save_product_row", None, save_sample_product),
+    ("data.fetch_material_form", None,
+     lambda connection, samples: fetch_material_form(connection, ReferenceCache(), samples["material_id"])),
+    ("data.save_material_row", None, save_sample_material),
+)
+
+
+def summarize(timings):
+    return {
+        "median_ms": round(statistics.median(timings), 2),
+        "min_ms": round(min(timings), 2),
+        "max_ms": round(max(timings), 2),
+        "runs": len(timings),
+    }
+
+
+def run_data_benchmarks(db, samples, repeat):
+    # Каждый прогон - в своей транзакции с откатом, поэтому данные не меняются.
+    # Первый прогон - прогрев (кэш страниц сервера), в результат не входит.
+    results = {}
+    for name, setup, fn in DATA_BENCHMARKS:
+        modifies = setup is not None
+        timings = []
+        for attempt in range(repeat + 1):
+            with db.lease() as connection:
+                try:
+                    if setup is not None:
+                        setup(connection)
+                    with db.stats.action(name):
+                        started = time.perf_counter()
+                        fn(connection, samples)
+                        elapsed = (time.perf_counter() - started) * 1000
+                finally:
+                    connection.rollback()
+            if modifies:
+                vacuum_products(db)
+            if attempt:
+                timings.append(elapsed)
+
+        results[name] = summarize(timings)
+        for entry in db.stats.snapshot()["actions"]:
+            if entry["action"] == name:
+                results[name]["round_trips"] = entry["max_round_trips"]
+                results[name]["rows"] = entry["rows"] // entry["count"]
+        print(f"  {name}: {results[name]['median_ms']} мс")
+    return results
+
+
+def wait_idle(worker):
+    # Ждет, пока фоновые запросы окна и обработка их результатов не завершатся
+    if worker.is_busy():
+        loop = QEventLoop()
+
+        def quit_when_idle(busy):
+            if not busy:
+                loop.quit()
+
+        worker.busy_changed.connect(quit_when_idle)
+        QTimer.singleShot(GUI_TIMEOUT_MS, loop.quit)
+        loop.exec()
+        worker.busy_changed.disconnect(quit_when_idle)
+    QApplication.processEvents()
+
+
+def measure(worker, action):
+    started = time.perf_counter()
+    action()
+    wait_idle(worker)
+    return (time.perf_counter() - started) * 1000
+
+
+def silence_message_boxes(errors):
+    # Подтверждения принимаются, сообщения не показываются (замеры без пользователя);
+    # предупреждения и ошибки собираются в errors
+    QMessageBox.question = staticmethod(lambda *args, **kwargs: QMessageBox.Yes)
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    for name in ("warning", "critical"):
+        setattr(QMessageBox, name,
+                staticmethod(lambda parent, title, text, *args, **kwargs: errors.append(f"{title}: {text}")
+                             or QMessageBox.Ok))
+    QMessageBox.exec = lambda self: QMessageBox.Ok
+
+
+def run_gui_benchmarks(db, samples, repeat):
+    # Те же действия, что выполняет пользователь, в настоящем окне приложения:
+    # время от вызова до применения результата в интерфейсе
+    app = QApplication.instance() or QApplication(sys.argv)
+    apply_theme(app)
+    errors = []
+    silence_message_boxes(errors)
+
+    window = MainWindow()
+    window.show()
+    # Окно начинает запросы к серверу после первой отрисовки
+    while window.services_started is None:
+        app.processEvents()
+    wait_idle(window.db_worker)
+    # Уведомления о собственных изменениях вызывали бы лишние запросы между замерами
+    window.catalog_listener.stop()
+    worker = window.db_worker
+    window.show_products_page()
+    wait_idle(worker)
+    products_page = window.page("products")
+    materials_page = window.page("materials")
+
+    def open_product_dialog():
+        dialogs.append(ProductDialog(window, worker, samples["product_id"]))
+
+    def open_material_dialog():
+        dialogs.append(MaterialDialog(window, worker, samples["material_id"]))
+
+    def save_dialog():
+        dialogs[-1].validate_and_accept()
+
+    # (имя, подготовка вне замера, действие, очистка вне замера)
+    benchmarks = (
+        ("gui.load_products", window.show_products_page, products_page.load_products, None),
+        ("gui.load_materials", window.show_materials_page, materials_page.load_materials, None),
+        ("gui.recalculate_all_prices", lambda: (db.run(perturb_prices), window.show_products_page()),
+         products_page.recalculate_all_prices, lambda: vacuum_products(db)),
+        ("gui.product_dialog.open", None, open_product_dialog, None),
+        ("gui.product_dialog.save", None, save_dialog, None),
+        ("gui.material_dialog.open", None, open_material_dialog, None),
+        ("gui.material_dialog.save", None, save_dialog, None),
+    )
+
+    results = {}
+    timings = {name: [] for name, _, _, _ in benchmarks}
+    dialogs = []
+    for attempt in range(repeat + 1):
+        for name, setup, action, cleanup in benchmarks:
+            if setup is not None:
+                setup()
+                wait_idle(worker)
+            elapsed = measure(worker, action)
+            if errors:
+                window.close()
+                raise RuntimeError(f"{name}: {errors[0]}")
+            if cleanup is not None:
+                cleanup()
+            if attempt:
+                timings[name].append(elapsed)
+        for dialog in dialogs:
+            dialog.deleteLater()
+        dialogs.clear()
+
+    for name, _, _, _ in benchmarks:
+        results[name] = summarize(timings[name])
+        print(f"  {name}: {results[name]['median_ms']} мс")
+
+    window.close()
+    app.processEvents()
+    return results
+
+
+def baseline_path(counts):
+    return os.path.join(BASELINES_DIR, f"products-{counts['products']}.json")
+
+
+def compare(results, baseline, tolerance):
+    # Строки сравнения и список замедлившихся замеров
+    rows = []
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous is None:
+            rows.append((name, None, current["median_ms"], None, "новый"))
+            continue
+        change = (current["median_ms"] - previous["median_ms"]) / previous["median_ms"] if previous["median_ms"] else 0
+        slower = (change > tolerance
+                  and current["median_ms"] - previous["median_ms"] > MIN_REGRESSION_MS)
+        if slower:
+            regressions.append(name)
+        rows.append((name, previous["median_ms"], current["median_ms"], change, "ХУЖЕ" if slower else ""))
+    return rows, regressions
+
+
+def print_comparison(rows):
+    width = max(len(row[0]) for row in rows)
+    print(f"{'Замер':<{width}}  {'база, мс':>10}  {'сейчас, мс':>10}  {'изм.':>8}")
+    for name, previous, current, change, mark in rows:
+        previous_text = "—" if previous is None else f"{previous:.2f}"
+        change_text = "" if change is None else f"{change:+.0%}"
+        print(f"{name:<{width}}  {previous_text:>10}  {current:>10.2f}  {change_text:>8}  {mark}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности на синтетических данных")
+    parser.add_argument("--dbname", default=BENCH_DBNAME, help="база, заполненная generate.py")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="число прогонов каждого замера")
+    parser.add_argument("--only", choices=("data", "gui"), help="только слой данных или только окно")
+    parser.add_argument("--baseline", help="файл базовой линии (по умолчанию - по числу продукции)")
+    parser.add_argument("--save-baseline", action="store_true", help="сохранить результат как базовую линию")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое замедление медианы (0.25 = 25%%)")
+    parser.add_argument("--output", help="сохранить результат в JSON")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat должно быть не меньше 1")
+
+    # Окно приложения читает настройки из окружения, поэтому база задается так же
+    os.environ["NASHDEKOR_DB_DBNAME"] = args.dbname
+    snapshot_dir = tempfile.TemporaryDirectory()
+    os.environ["NASHDEKOR_DB_SNAPSHOT_FILE"] = os.path.join(snapshot_dir.name, "snapshot.sqlite3")
+
+    db = ConnectionManager(load_db_config())
+    try:
+        counts, server_version = db.run(dataset_info)
+        samples = db.run(sample_rows)
+        print(f"База {args.dbname}: продукции {counts['products']}, материалов {counts['materials']}, "
+              f"заявок {counts['requests']}")
+
+        benchmarks = {}
+        if args.only != "gui":
+            print("Слой данных:")
+            benchmarks.update(run_data_benchmarks(db, samples, args.repeat))
+        if args.only != "data":
+            print("Окно (offscreen):")
+            benchmarks.update(run_gui_benchmarks(db, samples, args.repeat))
+    except Exception as e:
+        print(f"Ошибка: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+        snapshot_dir.cleanup()
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "postgres": server_version,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "dataset": counts,
+        "benchmarks": benchmarks,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+    path = args.baseline or baseline_path(counts)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f"Базовая линия сохранена: {path}")
+        return 0
+
+    if not os.path.exists(path):
+        print(f"Базовой линии {path} нет; сохраните ее с --save-baseline")
+        return 0
+
+    with open(path, encoding="utf-8") as file:
+        baseline = json.load(file)
+    if baseline["dataset"] != counts:
+        print("Внимание: размеры таблиц отличаются от базовой линии", file=sys.stderr)
+    rows, regressions = compare(results, baseline, args.tolerance)
+    print_comparison(rows)
+    if regressions:
+        print(f"Замедлились: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    code = main()
+    # PySide6 6.12.0 теряет ссылку на True при каждой доставке сигнала в Python-слот,
+    # и после долгого прогона интерпретатор аварийно падает при завершении.
+    # Результаты к этому моменту уже записаны, поэтому выходим без финализации,
+    # чтобы код возврата (есть ли замедления) не терялся.
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
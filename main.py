@@ -1,96 +1,815 @@
+import json
+import sqlite3
 import sys
+import argparse
+import time
+import threading
+from array import array
+
+# Начало импорта библиотек - первая фаза профиля запуска (--profile-startup)
+STARTUP_STARTED = time.perf_counter()
+
+import psycopg2
+
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
-                               QHBoxLayout, QLabel, QScrollArea, QFrame,
-                               QPushButton, QGridLayout, QSizePolicy,
+                               QHBoxLayout, QLabel, QFrame, QPushButton,
                                QMessageBox, QLineEdit, QComboBox, QDialog,
-                               QDialogButtonBox, QFormLayout, QDoubleSpinBox, QStackedWidget, QSpinBox)
-from PySide6.QtGui import QFont, QPixmap, QIcon, QColor, QPalette
-from PySide6.QtCore import Qt
+                               QDialogButtonBox, QFormLayout, QDoubleSpinBox, QStackedWidget, QSpinBox,
+                               QListView, QStyledItemDelegate, QStyle, QAbstractItemView, QProgressBar,
+                               QFileDialog, QInputDialog, QTableWidget, QTableWidgetItem, QHeaderView,
+                               QTableView, QTabWidget, QCompleter)
+from PySide6.QtGui import (QFont, QPixmap, QIcon, QColor, QPalette, QPainter, QPen, QFontMetrics,
+                           QShortcut, QKeySequence)
+from PySide6.QtCore import (Qt, QAbstractListModel, QModelIndex, QRect, QRectF, QSize, QEvent, Signal,
+                            QObject, QRunnable, QThreadPool, QTimer, QAbstractTableModel,
+                            QSortFilterProxyModel, QRegularExpression, QSocketNotifier)
+
+from nashdekor.db import load_db_config, dump_query_stats, ConnectionManager, apply_migrations, is_connection_error
+from nashdekor.catalog import (RECALCULATION_REPORT_LIMIT, MATERIAL_UNITS, PARTNER_DISCOUNT_TIERS, CATALOG_CHANNEL,
+                               CATALOG_TABLES, ReferenceCache,
+                               recalculate_prices, calculate_product_cost, calculate_material_requirements,
+                               validate_product_fields, validate_material_fields, fetch_products, fetch_materials,
+                               partner_discount, fetch_partners, fetch_product_form, fetch_material_form, fetch_replenishment_plan,
+                               fetch_calculator_data, save_product_row, save_material_row,
+                               write_off_material_requirements)
+from nashdekor.snapshot import SNAPSHOT_FILE, SnapshotStore, sync_snapshot
+from nashdekor.reports import SALES_REPORT_DIMENSIONS, refresh_reports, fetch_reports
+from nashdekor.stock import (STOCK_LEDGER_RETENTION_DAYS, compact_stock_movements, fetch_stock_mismatches,
+                             fetch_supply_form, validate_supply_note, post_supply_note)
+from nashdekor.transfer import (EXPORT_TABLES, SUPPLY_NOTE_COLUMNS, import_products, import_materials,
+                                read_supply_note, write_import_error_report, export_table)
+
+
+# Фильтр диалога выбора файла для импорта
+IMPORT_FILE_FILTER = "Таблицы (*.csv *.xlsx);;CSV (*.csv);;Excel (*.xlsx)"
+
+# Фильтр диалога сохранения файла выгрузки
+EXPORT_FILE_FILTER = "CSV (*.csv);;Parquet (*.parquet)"
+
+
+class DbTaskSignals(QObject):
+    # Сигналы фоновой задачи. Объект живет в GUI-потоке, поэтому
+    # результаты доставляются в него через очередь событий Qt.
+    finished = Signal(int, object)
+    # (id задачи, сообщение, ошибка связи с сервером)
+    failed = Signal(int, str, bool)
+
+
+class DbTask(QRunnable):
+    # Фоновая задача: выполняет fn(connection) на арендованном соединении
+
+    def __init__(self, task_id, db, fn, retries, signals, action):
+        super().__init__()
+        self.task_id = task_id
+        self.db = db
+        self.fn = fn
+        self.action = action
+        self.retries = retries
+        self.signals = signals
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _set_connection(self, connection):
+        with self._lock:
+            self._connection = connection
+
+    def cancel(self):
+        # Прерывает выполняющийся запрос на сервере
+        with self._lock:
+            if self._connection is not None and not self._connection.closed:
+                try:
+                    self._connection.cancel()
+                except psycopg2.Error:
+                    pass
+
+    def run(self):
+        try:
+            with self.db.stats.action(self.action):
+                result = self.db.run(self.fn, retries=self.retries, on_lease=self._set_connection)
+        except Exception as e:
+            self.signals.failed.emit(self.task_id, str(e), is_connection_error(e))
+            return
+        self.signals.finished.emit(self.task_id, result)
+
+
+class DbWorker(QObject):
+    # Выполняет запросы вне GUI-потока и возвращает результаты через сигналы.
+    # Задачи с одинаковым ключом вытесняют друг друга: еще не начатая задача
+    # снимается с очереди, а результат уже выполняющейся отбрасывается.
+
+    busy_changed = Signal(bool)
+    # Связь с сервером потеряна (False) или восстановлена (True)
+    online_changed = Signal(bool)
+
+    # Повторы при обрыве соединения для задач-чтений
+    READ_RETRIES = 2
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+
+        # Каждая задача берет свое соединение из пула, поэтому потоков столько же, сколько соединений
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(db.max_connections if db else 1)
+
+        self.signals = DbTaskSignals(self)
+        self.signals.finished.connect(self._on_finished)
+        self.signals.failed.connect(self._on_failed)
+
+        self._next_task_id = 0
+        self._tasks = {}
+        self._latest = {}
+        self.online = True
+
+    def is_available(self):
+        return self.db is not None
+
+    def is_busy(self):
+        return bool(self._tasks)
+
+    def submit(self, key, fn, on_result, on_error, read_only=False, action=None):
+        # Ставит fn(connection) в очередь; on_result/on_error вызываются в GUI-потоке.
+        # read_only=True разрешает повтор запроса после переподключения.
+        # action - имя действия в статистике запросов (по умолчанию - ключ).
+        self.cancel(key)
+
+        self._next_task_id += 1
+        task_id = self._next_task_id
+        retries = self.READ_RETRIES if read_only else 0
+        task = DbTask(task_id, self.db, fn, retries, self.signals, action or key)
+        task.setAutoDelete(False)
+
+        self._tasks[task_id] = (key, task, on_result, on_error)
+        self._latest[key] = task_id
+        if len(self._tasks) == 1:
+            self.busy_changed.emit(True)
+
+        self.pool.start(task)
+        return task_id
+
+    def cancel(self, key):
+        # Отменяет последнюю задачу с данным ключом
+        task_id = self._latest.pop(key, None)
+        if task_id is None or task_id not in self._tasks:
+            return
+        task = self._tasks[task_id][1]
+        if self.pool.tryTake(task):
+            self._forget(task_id)
+        else:
+            task.cancel()
+
+    def shutdown(self):
+        self.pool.clear()
+        self.pool.waitForDone()
+
+    def _forget(self, task_id):
+        entry = self._tasks.pop(task_id, None)
+        if entry is not None and not self._tasks:
+            self.busy_changed.emit(False)
+        return entry
+
+    def _set_online(self, online):
+        if self.online != online:
+            self.online = online
+            self.online_changed.emit(online)
+
+    def _on_finished(self, task_id, result):
+        self._set_online(True)
+        entry = self._forget(task_id)
+        if entry is None:
+            return
+        key, task, on_result, on_error = entry
+        if self._latest.get(key) != task_id:
+            return
+        del self._latest[key]
+        on_result(result)
+
+    def _on_failed(self, task_id, message, connection_lost):
+        if connection_lost:
+            self._set_online(False)
+        entry = self._forget(task_id)
+        if entry is None:
+            return
+        key, task, on_result, on_error = entry
+        if self._latest.get(key) != task_id:
+            return
+        del self._latest[key]
+        on_error(message)
+
+
+# Как часто проверять связь с сервером в режиме без связи, мс
+OFFLINE_PING_INTERVAL_MS = 10000
+
+# Уведомления копятся столько миллисекунд и применяются одной пачкой
+CATALOG_DEBOUNCE_MS = 200
+# Пауза перед повторным подключением слушателя после обрыва
+CATALOG_RECONNECT_MS = 5000
+
+
+class CatalogListener(QObject):
+    # Слушает LISTEN catalog_changes на отдельном соединении в режиме autocommit.
+    # Сокет соединения отслеживается QSocketNotifier в потоке интерфейса, поэтому
+    # опроса по таймеру нет. Сигнал changed(таблица, список id или None): None -
+    # изменений слишком много или часть уведомлений пропущена, нужна полная загрузка.
+
+    changed = Signal(str, object)
+    _connected = Signal(object)
+    _connect_failed = Signal(str)
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.connection = None
+        self.notifier = None
+        self._connecting = False
+        self._stopped = False
+        self._was_connected = False
+        self._pending = {}
+
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(CATALOG_DEBOUNCE_MS)
+        self._debounce.timeout.connect(self._flush)
+
+        self._reconnect = QTimer(self)
+        self._reconnect.setSingleShot(True)
+        self._reconnect.setInterval(CATALOG_RECONNECT_MS)
+        self._reconnect.timeout.connect(self.start)
+
+        self._connected.connect(self._on_connected)
+        self._connect_failed.connect(self._on_connect_failed)
+
+    def start(self):
+        # Подключение выполняется в фоне, чтобы недоступный сервер не блокировал окно
+        if self._connecting or self.connection is not None or self._stopped:
+            return
+        self._connecting = True
+        QThreadPool.globalInstance().start(self._connect)
+
+    def _connect(self):
+        try:
+            connection = psycopg2.connect(**self.db.connect_kwargs())
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CATALOG_CHANNEL}")
+        except psycopg2.Error as e:
+            self._connect_failed.emit(str(e))
+            return
+        self._connected.emit(connection)
+
+    def _on_connected(self, connection):
+        self._connecting = False
+        if self._stopped:
+            connection.close()
+            return
+
+        self.connection = connection
+        self.notifier = QSocketNotifier(connection.fileno(), QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self._read)
+
+        # Пока соединения не было, уведомления могли потеряться
+        if self._was_connected:
+            for table in CATALOG_TABLES:
+                self._pending[table] = None
+            self._debounce.start()
+        self._was_connected = True
+
+    def _on_connect_failed(self, message):
+        self._connecting = False
+        if not self._stopped:
+            self._reconnect.start()
+
+    def _read(self):
+        try:
+            self.connection.poll()
+        except psycopg2.Error:
+            self._disconnect()
+            self._reconnect.start()
+            return
+
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload)
+                table = payload["table"]
+                ids = payload["ids"]
+            except (ValueError, KeyError, TypeError):
+                continue
+
+            if table in self._pending and self._pending[table] is None:
+                continue
+            if ids is None:
+                self._pending[table] = None
+            else:
+                self._pending.setdefault(table, set()).update(ids)
+
+        if self._pending:
+            self._debounce.start()
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        for table, ids in pending.items():
+            self.changed.emit(table, None if ids is None else sorted(ids))
+
+    def _disconnect(self):
+        if self.notifier is not None:
+            self.notifier.setEnabled(False)
+            self.notifier.deleteLater()
+            self.notifier = None
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except psycopg2.Error:
+                pass
+            self.connection = None
+
+    def is_live(self):
+        # Уведомления доходят: открытые списки актуальны без перезагрузки
+        return self.connection is not None
+
+    def stop(self):
+        self._stopped = True
+        self._debounce.stop()
+        self._reconnect.stop()
+        self._disconnect()
+
+
+# Бюджет запуска: от старта процесса до первой отрисовки окна, мс
+STARTUP_BUDGET_MS = 1500
+
+
+class StartupProfiler:
+    # Профиль запуска (python main.py --profile-startup): фазы от старта до первой
+    # отрисовки окна идут друг за другом, подключение и первые данные - в фоне
+
+    def __init__(self, started=STARTUP_STARTED):
+        self.started = started
+        self.last = started
+        self.phases = []
+
+    def mark(self, phase):
+        # Завершилась очередная фаза запуска
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000, False))
+        self.last = now
+
+    def add_background(self, phase, duration_ms):
+        self.phases.append((phase, duration_ms, True))
+
+    def elapsed_ms(self):
+        return (self.last - self.started) * 1000
+
+    def report(self):
+        lines = ["Профиль запуска, мс:"]
+        for phase, duration_ms, background in self.phases:
+            lines.append(f"  {phase:<28}{duration_ms:8.1f}{'  (в фоне)' if background else ''}")
+        verdict = "в пределах бюджета" if self.within_budget() else "БЮДЖЕТ ПРЕВЫШЕН"
+        lines.append(f"  до первой отрисовки: {self.elapsed_ms():.1f} из {STARTUP_BUDGET_MS} - {verdict}")
+        return "\n".join(lines)
+
+    def within_budget(self):
+        return self.elapsed_ms() <= STARTUP_BUDGET_MS
+
+
+# Оформление приложения: цвета, шрифты и варианты элементов в одном месте.
+# Таблицы стилей собираются один раз при загрузке модуля и назначаются только
+# кнопкам и спискам, которым они нужны: общая таблица стилей приложения заставила бы
+# Qt оформлять через нее каждый виджет (таблицы отчетов, поля диалогов), а это медленнее.
+# Подписи окрашиваются палитрой - без разбора стилей совсем.
+THEME_FONT_FAMILY = "Gabriola"
+THEME_FONT_SIZE = 12
+
+THEME_COLORS = {
+    "primary": "#2D6033",
+    "primary_hover": "#3E8043",
+    "primary_pressed": "#1D4023",
+    "on_primary": "#FFFFFF",
+    "card": "#E8F4E5",
+    "card_border": "#BBD9B2",
+    "hint": "#555555",
+    "error": "#B00020",
+}
+
+THEME_STYLESHEETS = {
+    "primary": """
+        QPushButton {{
+            background-color: {primary};
+            color: {on_primary};
+            border: none;
+            padding: 12px 24px;
+            border-radius: 6px;
+            min-width: 150px;
+            font-weight: bold;
+        }}
+        QPushButton:hover {{
+            background-color: {primary_hover};
+        }}
+        QPushButton:pressed {{
+            background-color: {primary_pressed};
+        }}
+    """.format(**THEME_COLORS),
+    "card-list": """
+        QListView {{
+            border: none;
+            background: transparent;
+        }}
+        QScrollBar:vertical {{
+            width: 12px;
+            background: {card_border};
+        }}
+        QScrollBar::handle:vertical {{
+            background: {primary};
+            min-height: 20px;
+            border-radius: 6px;
+        }}
+    """.format(**THEME_COLORS),
+}
+
+# Варианты подписей: (цвет текста, полужирный)
+THEME_LABEL_VARIANTS = {
+    "title": ("primary", False),
+    "hint": ("hint", False),
+    "error": ("error", True),
+}
+
+# Шрифты, цвета, палитры, картинки и значки создаются один раз и дальше берутся из кэша
+_theme_fonts = {}
+_theme_colors = {}
+_theme_palettes = {}
+_theme_pixmaps = {}
+_theme_icons = {}
+
+
+def apply_theme(app):
+    app.setFont(theme_font(THEME_FONT_SIZE))
+
+
+def set_variant(widget, variant):
+    # Оформление элемента по варианту: таблица стилей или палитра и шрифт
+    if variant in THEME_STYLESHEETS:
+        widget.setStyleSheet(THEME_STYLESHEETS[variant])
+    else:
+        color, bold = THEME_LABEL_VARIANTS[variant]
+        widget.setPalette(theme_palette(color))
+        if bold:
+            font = QFont(widget.font())
+            font.setBold(True)
+            widget.setFont(font)
+    return widget
+
+
+def theme_font(size=THEME_FONT_SIZE, bold=False):
+    key = (size, bold)
+    font = _theme_fonts.get(key)
+    if font is None:
+        font = QFont(THEME_FONT_FAMILY, size, QFont.Bold if bold else QFont.Normal)
+        _theme_fonts[key] = font
+    return font
+
+
+def theme_color(name):
+    color = _theme_colors.get(name)
+    if color is None:
+        color = QColor(THEME_COLORS[name])
+        _theme_colors[name] = color
+    return color
+
+
+def theme_palette(color_name):
+    # Палитра только с цветом текста: остальные цвета наследуются от родителя
+    palette = _theme_palettes.get(color_name)
+    if palette is None:
+        palette = QPalette()
+        palette.setColor(QPalette.WindowText, theme_color(color_name))
+        _theme_palettes[color_name] = palette
+    return palette
+
+
+def theme_pixmap(path, size=None):
+    # size - сторона квадрата, в который картинка вписывается с сохранением пропорций
+    key = (path, size)
+    pixmap = _theme_pixmaps.get(key)
+    if pixmap is None:
+        pixmap = QPixmap(path)
+        if size is not None and not pixmap.isNull():
+            pixmap = pixmap.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        _theme_pixmaps[key] = pixmap
+    return pixmap
+
+
+def theme_icon(path):
+    icon = _theme_icons.get(path)
+    if icon is None:
+        icon = QIcon(path)
+        _theme_icons[path] = icon
+    return icon
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    # Страницы, которые без связи с сервером переходят в режим просмотра
+    EDITABLE_PAGES = ("products", "materials", "supplies")
+
+    def __init__(self, profiler=None):
         super().__init__()
+        self.profiler = profiler
+        self.services_started = None
         self.setWindowTitle("Система управления «Наш декор» - Главная")
-        self.setWindowIcon(QIcon("logo.ico"))
+        self.setWindowIcon(theme_icon("logo.ico"))
         self.setMinimumSize(1000, 700)
 
         self.setup_colors()
 
         # Подключение к базе данных
-        self.db_connection = self.connect_to_db()
+        self.db = self.connect_to_db()
+
+        # Локальная копия данных для мгновенного открытия и работы без сервера
+        self.snapshot = self.open_snapshot()
+
+        # Фоновое выполнение запросов и индикатор загрузки
+        self.db_worker = DbWorker(self.db, self)
+        self.setup_loading_indicator()
+        self.db_worker.busy_changed.connect(self.set_loading)
+        self.db_worker.online_changed.connect(self.on_online_changed)
 
-        # Создаем стек виджетов для навигации
+        # Пока сервер недоступен, связь периодически проверяется
+        self.ping_timer = QTimer(self)
+        self.ping_timer.setInterval(OFFLINE_PING_INTERVAL_MS)
+        self.ping_timer.timeout.connect(self.ping_server)
+
+        self.reference_cache = ReferenceCache()
+
+        # Создаем стек виджетов для навигации; страницы создаются при первом переходе
         self.stacked_widget = QStackedWidget()
         self.setCentralWidget(self.stacked_widget)
+        self.pages = {}
 
-        self.main_page = MainPage(self)
-        self.products_page = ProductsPage(self)
-        self.materials_page = MaterialsPage(self)
+        # Изменения, сделанные другими пользователями, приходят через LISTEN/NOTIFY
+        self.catalog_listener = CatalogListener(self.db, self)
+        self.catalog_listener.changed.connect(self.on_catalog_changed)
 
-        self.stacked_widget.addWidget(self.main_page)
-        self.stacked_widget.addWidget(self.products_page)
-        self.stacked_widget.addWidget(self.materials_page)
+        # Скрытая панель диагностики запросов
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.show_diagnostics)
 
         self.show_main_page()
+        # Запросы к серверу начинаются после первой отрисовки окна
+        self.page("main").installEventFilter(self)
+
+    def page(self, name):
+        page = self.pages.get(name)
+        if page is None:
+            page_class = {
+                "main": MainPage,
+                "products": ProductsPage,
+                "materials": MaterialsPage,
+                "partners": PartnersPage,
+                "reports": ReportsPage,
+                "supplies": SuppliesPage,
+            }[name]
+            page = page_class(self)
+            self.pages[name] = page
+            self.stacked_widget.addWidget(page)
+            if name in self.EDITABLE_PAGES and not self.db_worker.online:
+                page.set_read_only(True)
+        return page
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint and self.services_started is None:
+            watched.removeEventFilter(self)
+            if self.profiler is not None:
+                self.profiler.mark("первая отрисовка")
+            QTimer.singleShot(0, self.start_services)
+        return super().eventFilter(watched, event)
+
+    def start_services(self):
+        # Подключение, миграции, справочники и синхронизация локальной копии (в фоне)
+        self.services_started = time.perf_counter()
+
+        # Недостающие миграции схемы применяются в фоне при каждом запуске
+        self.db_worker.submit("migrations", apply_migrations, self.on_migrations_applied, self.on_migrations_failed)
+
+        # Справочники загружаем заранее, чтобы диалоги открывались без запросов
+        self.db_worker.submit(
+            "reference-data", self.reference_cache.load_all,
+            lambda result: self.on_first_data(), lambda message: self.on_first_data(),
+            read_only=True
+        )
+
+        self.catalog_listener.start()
+        self.sync_snapshot()
+
+    def on_first_data(self):
+        if self.profiler is None:
+            return
+        if self.db.connect_time is not None:
+            self.profiler.add_background("подключение к базе", self.db.connect_time * 1000)
+        self.profiler.add_background("первые данные", (time.perf_counter() - self.services_started) * 1000)
+        print(self.profiler.report(), file=sys.stderr)
+        QApplication.instance().exit(0 if self.profiler.within_budget() else 1)
 
     def setup_colors(self):
         palette = self.palette()
         palette.setColor(QPalette.Window, QColor("#FFFFFF"))
         palette.setColor(QPalette.WindowText, QColor("#000000"))
         palette.setColor(QPalette.Base, QColor("#FFFFFF"))
-        palette.setColor(QPalette.AlternateBase, QColor("#E8F4E5"))
-        palette.setColor(QPalette.Button, QColor("#2D6033"))
-        palette.setColor(QPalette.ButtonText, QColor("#FFFFFF"))
-        palette.setColor(QPalette.Highlight, QColor("#3E8043"))
+        palette.setColor(QPalette.AlternateBase, theme_color("card"))
+        palette.setColor(QPalette.Button, theme_color("primary"))
+        palette.setColor(QPalette.ButtonText, theme_color("on_primary"))
+        palette.setColor(QPalette.Highlight, theme_color("primary_hover"))
         self.setPalette(palette)
 
+    def setup_loading_indicator(self):
+        self.loading_label = QLabel("Загрузка данных...")
+        self.loading_bar = QProgressBar()
+        self.loading_bar.setRange(0, 0)
+        self.loading_bar.setTextVisible(False)
+        self.loading_bar.setMaximumWidth(200)
+        self.statusBar().addPermanentWidget(self.loading_label)
+        self.statusBar().addPermanentWidget(self.loading_bar)
+        self.set_loading(False)
+
+        self.offline_label = QLabel("Нет связи с сервером: показана локальная копия, изменения недоступны")
+        set_variant(self.offline_label, "error")
+        self.offline_label.setVisible(False)
+        self.statusBar().addWidget(self.offline_label)
+
+    def set_loading(self, loading):
+        self.loading_label.setVisible(loading)
+        self.loading_bar.setVisible(loading)
+
+    def on_migrations_applied(self, applied):
+        if applied:
+            self.statusBar().showMessage(f"Применены миграции базы данных: {', '.join(applied)}", 10000)
+
+    def on_migrations_failed(self, message):
+        # Недоступность сервера показывается индикатором, а не окном ошибки
+        if self.db_worker.online:
+            self.show_error_message("Ошибка обновления базы данных", message)
+
+    def on_catalog_changed(self, table, ids):
+        # Еще не открытая страница загрузит свежие данные при первом переходе
+        page = self.pages.get(table)
+        if page is not None:
+            page.apply_remote_changes(ids)
+
     def connect_to_db(self):
-        #Установка соединения с PostgreSQL
+        # Пул соединений с PostgreSQL; параметры берутся из db.ini и переменных окружения.
+        # Соединения открываются первой фоновой задачей, поэтому окно не ждет сервер;
+        # если сервер недоступен, приложение переходит в режим просмотра локальной копии.
+        return ConnectionManager(load_db_config())
+
+    def open_snapshot(self):
+        config = self.db.config
+        path = config["snapshot_file"] or SNAPSHOT_FILE
+        source = f"{config['host']}:{config['port']}/{config['dbname']}"
         try:
-            import psycopg2
-            conn = psycopg2.connect(
-                dbname="postgres",
-                user="postgres",
-                password="toor",
-                host="localhost",
-                port="5432"
-            )
-            return conn
-        except Exception as e:
-            self.show_error_message(
-                "Ошибка подключения к базе данных",
-                f"Не удалось подключиться к базе данных: {str(e)}"
-            )
+            return SnapshotStore(path, source)
+        except sqlite3.Error:
+            # Без локальной копии приложение работает как раньше, только онлайн
             return None
 
+    def sync_snapshot(self):
+        # Догоняющая синхронизация локальной копии (в фоне)
+        if self.snapshot is None:
+            return
+        snapshot = self.snapshot
+        self.db_worker.submit(
+            "snapshot-sync",
+            lambda connection: sync_snapshot(connection, snapshot),
+            lambda result: None,
+            lambda message: None,
+            read_only=True
+        )
+
+    def snapshot_page(self, table, after=None, filters=None):
+        # Страница списка из локальной копии (пустая, если копии нет)
+        if self.snapshot is None:
+            return [], False
+        return self.snapshot.fetch_page(table, after, filters=filters)
+
+    def snapshot_reference(self, name):
+        # Справочник из локальной копии, пока нет связи с сервером
+        if self.snapshot is None or self.db_worker.online:
+            return None
+        return self.snapshot.reference(name)
+
+    def ping_server(self):
+        self.db_worker.submit("ping", lambda connection: None, lambda result: None, lambda message: None)
+
+    def on_online_changed(self, online):
+        self.offline_label.setVisible(not online)
+        for name in self.EDITABLE_PAGES:
+            if name in self.pages:
+                self.pages[name].set_read_only(not online)
+        if online:
+            self.ping_timer.stop()
+            self.sync_snapshot()
+            # Открытый список перечитывается с сервера
+            current = self.stacked_widget.currentWidget()
+            if current is self.pages.get("products"):
+                current.load_products()
+            elif current is self.pages.get("materials"):
+                current.load_materials()
+        else:
+            self.ping_timer.start()
+
     # Методы навигации
     def show_main_page(self):
         self.setWindowTitle("Система управления «Наш декор» - Главная")
-        self.stacked_widget.setCurrentWidget(self.main_page)
+        self.stacked_widget.setCurrentWidget(self.page("main"))
 
     def show_products_page(self):
         self.setWindowTitle("Система управления «Наш декор» - Продукция")
-        self.products_page.load_products()
-        self.stacked_widget.setCurrentWidget(self.products_page)
+        products_page = self.page("products")
+        products_page.open_page()
+        self.stacked_widget.setCurrentWidget(products_page)
+        self.sync_snapshot()
 
     def show_materials_page(self):
         self.setWindowTitle("Система управления «Наш декор» - Материалы")
-        self.materials_page.load_materials()
-        self.stacked_widget.setCurrentWidget(self.materials_page)
+        materials_page = self.page("materials")
+        materials_page.open_page()
+        self.stacked_widget.setCurrentWidget(materials_page)
+        self.sync_snapshot()
+
+    def show_partners_page(self):
+        self.setWindowTitle("Система управления «Наш декор» - Партнеры")
+        partners_page = self.page("partners")
+        partners_page.load_partners()
+        self.stacked_widget.setCurrentWidget(partners_page)
+
+    def show_supplies_page(self):
+        self.setWindowTitle("Система управления «Наш декор» - Поставки")
+        supplies_page = self.page("supplies")
+        supplies_page.open_page()
+        self.stacked_widget.setCurrentWidget(supplies_page)
+
+    def show_reports_page(self):
+        self.setWindowTitle("Система управления «Наш декор» - Отчеты")
+        reports_page = self.page("reports")
+        reports_page.load_reports()
+        self.stacked_widget.setCurrentWidget(reports_page)
 
     def show_error_message(self, title, message):
         QMessageBox.critical(self, title, message)
 
+    def export_data(self, parent, tables):
+        # Выгрузка одной из таблиц tables в файл (в фоне)
+        titles = [EXPORT_TABLES[table][0] for table in tables]
+        title, ok = QInputDialog.getItem(parent, "Экспорт", "Что выгрузить:", titles, 0, False)
+        if not ok:
+            return
+        table = tables[titles.index(title)]
+
+        path, _ = QFileDialog.getSaveFileName(parent, "Экспорт", f"{table}.csv", EXPORT_FILE_FILTER)
+        if not path:
+            return
+
+        self.db_worker.submit(
+            "export",
+            lambda connection: export_table(connection, table, path),
+            lambda count: self.show_info_message("Экспорт завершен", f"Выгружено строк: {count}\nФайл: {path}"),
+            lambda message: self.show_error_message("Ошибка экспорта", f"Не удалось выгрузить данные: {message}"),
+            read_only=True
+        )
+
+    def show_import_report(self, path, result):
+        # Итог импорта; ошибки по строкам сохраняются в файл рядом с исходным
+        inserted, updated, errors = result
+        text = f"Добавлено: {inserted}, обновлено: {updated}, строк с ошибками: {len(errors)}."
+
+        box = QMessageBox(self)
+        box.setWindowTitle("Импорт завершен")
+        box.setIcon(QMessageBox.Warning if errors else QMessageBox.Information)
+        if errors:
+            try:
+                report_path = write_import_error_report(path, errors)
+                text += f"\nОтчет об ошибках: {report_path}"
+            except OSError as e:
+                text += f"\nНе удалось сохранить отчет об ошибках: {str(e)}"
+            box.setDetailedText("\n".join(
+                f"Строка {line_number}: {message}" for line_number, message in errors[:RECALCULATION_REPORT_LIMIT]
+            ))
+        box.setText(text)
+        box.exec()
+
     def show_warning_message(self, title, message):
         QMessageBox.warning(self, title, message)
 
     def show_info_message(self, title, message):
         QMessageBox.information(self, title, message)
 
+    def show_diagnostics(self):
+        dialog = DiagnosticsDialog(self, self.db.stats)
+        dialog.setAttribute(Qt.WA_DeleteOnClose)
+        dialog.show()
+
     def closeEvent(self, event):
-        if self.db_connection:
-            self.db_connection.close()
+        self.catalog_listener.stop()
+        self.db_worker.shutdown()
+        self.db.close()
+        dump_query_stats(self.db)
+        if self.snapshot is not None:
+            self.snapshot.close()
         event.accept()
 
 
@@ -109,13 +828,12 @@ class MainPage(QWidget):
         # Заголовок с логотипом
         header_layout = QHBoxLayout()
         logo_label = QLabel()
-        logo_pixmap = QPixmap("logo.png").scaled(120, 120, Qt.KeepAspectRatio)
-        logo_label.setPixmap(logo_pixmap)
+        logo_label.setPixmap(theme_pixmap("logo.png", 120))
         header_layout.addWidget(logo_label)
 
         title_label = QLabel("Главное меню")
-        title_label.setFont(QFont("Gabriola", 28, QFont.Bold))
-        title_label.setStyleSheet("color: #2D6033;")
+        title_label.setFont(theme_font(28, bold=True))
+        set_variant(title_label, "title")
         header_layout.addWidget(title_label)
         header_layout.addStretch()
 
@@ -123,43 +841,630 @@ class MainPage(QWidget):
 
         # Кнопки навигации
         products_btn = QPushButton("Управление продукцией")
-        products_btn.setFont(QFont("Gabriola", 14))
-        products_btn.setStyleSheet(self.get_button_style())
+        products_btn.setFont(theme_font(14))
+        set_variant(products_btn, "primary")
         products_btn.clicked.connect(self.main_window.show_products_page)
 
         materials_btn = QPushButton("Управление материалами")
-        materials_btn.setFont(QFont("Gabriola", 14))
-        materials_btn.setStyleSheet(self.get_button_style())
+        materials_btn.setFont(theme_font(14))
+        set_variant(materials_btn, "primary")
         materials_btn.clicked.connect(self.main_window.show_materials_page)
 
+        partners_btn = QPushButton("Партнеры")
+        partners_btn.setFont(theme_font(14))
+        set_variant(partners_btn, "primary")
+        partners_btn.clicked.connect(self.main_window.show_partners_page)
+
+        supplies_btn = QPushButton("Поставки")
+        supplies_btn.setFont(theme_font(14))
+        set_variant(supplies_btn, "primary")
+        supplies_btn.clicked.connect(self.main_window.show_supplies_page)
+
+        reports_btn = QPushButton("Отчеты")
+        reports_btn.setFont(theme_font(14))
+        set_variant(reports_btn, "primary")
+        reports_btn.clicked.connect(self.main_window.show_reports_page)
+
         layout.addWidget(products_btn)
         layout.addWidget(materials_btn)
+        layout.addWidget(partners_btn)
+        layout.addWidget(supplies_btn)
+        layout.addWidget(reports_btn)
         layout.addStretch()
 
-    def get_button_style(self):
-        return """
-            QPushButton {
-                background-color: #2D6033;
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 6px;
-                min-width: 150px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #3E8043;
-            }
-            QPushButton:pressed {
-                background-color: #1D4023;
-            }
-        """
+
+
+# Роли модели списка: идентификатор записи и данные карточки для отрисовки
+ID_ROLE = Qt.UserRole + 1
+CARD_ROLE = Qt.UserRole + 2
+# Роль для сортировки таблиц по исходным значениям, а не по отображаемому тексту
+SORT_ROLE = Qt.UserRole + 3
+
+
+class PagedListModel(QAbstractListModel):
+    # Базовая модель списка, подгружаемого страницами. Когда представление
+    # докручено до конца, Qt вызывает fetchMore(), и модель запрашивает
+    # следующую страницу сигналом more_requested(ключ последней строки).
+    # Подклассы хранят строки и реализуют clear_rows/store_rows, а также
+    # row_id/row_key (для строки из БД) и key_at/insert_row_at/remove_row_at/replace_row_at.
+
+    more_requested = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._has_more = False
+        self._fetching = False
+        self._key_by_id = {}
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more and not self._fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._fetching = True
+            self.more_requested.emit(self.last_key())
+
+    def last_key(self):
+        return self.key_at(self.rowCount() - 1)
+
+    def _remember_keys(self, rows):
+        for row in rows:
+            self._key_by_id[self.row_id(row)] = self.row_key(row)
+
+    def set_page(self, rows, has_more):
+        # Первая страница: полная замена данных модели
+        self.beginResetModel()
+        self.clear_rows()
+        self._key_by_id = {}
+        self.store_rows(rows)
+        self._remember_keys(rows)
+        self._has_more = has_more
+        self._fetching = False
+        self.endResetModel()
+
+    def append_page(self, rows, has_more):
+        # Следующая страница дописывается в конец
+        if rows:
+            first = self.rowCount()
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self.store_rows(rows)
+            self._remember_keys(rows)
+            self.endInsertRows()
+        self._has_more = has_more
+        self._fetching = False
+
+    def fetch_failed(self):
+        # После ошибки не запрашиваем страницы автоматически до следующей загрузки
+        self._has_more = False
+        self._fetching = False
+
+    def find_key(self, key):
+        # Бинарный поиск позиции ключа в отсортированном списке
+        low, high = 0, self.rowCount()
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def upsert_row(self, row):
+        # Вставляет новую или обновляет существующую строку на ее месте в порядке сортировки
+        row_id = self.row_id(row)
+        key = self.row_key(row)
+
+        old_key = self._key_by_id.get(row_id)
+        if old_key is not None:
+            old_position = self.find_key(old_key)
+            if old_key == key:
+                self.replace_row_at(old_position, row)
+                index = self.index(old_position)
+                self.dataChanged.emit(index, index)
+                return
+            self._remove_at(old_position, row_id)
+
+        position = self.find_key(key)
+        if position == self.rowCount() and self._has_more:
+            # Строка относится к еще не загруженной части списка
+            return
+
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.insert_row_at(position, row)
+        self._key_by_id[row_id] = key
+        self.endInsertRows()
+
+    def row_for_id(self, row_id):
+        # Загруженная строка по id (в формате запроса списка) или None
+        key = self._key_by_id.get(row_id)
+        if key is None:
+            return None
+        return self.row_at(self.find_key(key))
+
+    def remove_row(self, row_id):
+        key = self._key_by_id.get(row_id)
+        if key is not None:
+            self._remove_at(self.find_key(key), row_id)
+
+    def _remove_at(self, position, row_id):
+        self.beginRemoveRows(QModelIndex(), position, position)
+        self.remove_row_at(position)
+        del self._key_by_id[row_id]
+        self.endRemoveRows()
+
+
+class ProductListModel(PagedListModel):
+    # Модель списка продукции. Хранит только кортежи строк из БД,
+    # виджеты под каждую строку не создаются.
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+
+    def clear_rows(self):
+        self._rows = []
+
+    def store_rows(self, rows):
+        self._rows.extend(rows)
+
+    def row_id(self, row):
+        return row[0]
+
+    def row_key(self, row):
+        return row[2], row[0]
+
+    def key_at(self, position):
+        return self.row_key(self._rows[position])
+
+    def row_at(self, position):
+        return self._rows[position]
+
+    def insert_row_at(self, position, row):
+        self._rows.insert(position, row)
+
+    def remove_row_at(self, position):
+        del self._rows[position]
+
+    def replace_row_at(self, position, row):
+        self._rows[position] = row
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        product_id, product_type, product_name, min_cost, articul, width, type_id = self._rows[index.row()]
+
+        if role == Qt.DisplayRole:
+            return product_name
+        if role == ID_ROLE:
+            return product_id
+        if role == CARD_ROLE:
+            return (
+                product_type,
+                product_name,
+                f"{min_cost:.2f} ₽",
+                f"Артикул: {articul}",
+                (f"Мин. стоимость партнера: {min_cost:.2f} ₽", f"Ширина: {width} м"),
+            )
+        return None
+
+
+class MaterialListModel(PagedListModel):
+    # Модель списка материалов с поколоночным хранением: числовые поля
+    # лежат в массивах array, повторяющиеся строки (тип, единица измерения)
+    # хранятся кодами в словаре значений.
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.clear_rows()
+
+    def clear_rows(self):
+        self._ids = array("q")
+        self._names = []
+        self._type_codes = array("i")
+        self._type_ids = array("i")
+        self._unit_codes = array("i")
+        self._unit_prices = array("d")
+        self._stock_quantities = array("q")
+        self._min_quantities = array("q")
+        self._package_quantities = array("q")
+        self._strings = []
+        self._string_codes = {}
+
+    def _encode(self, value):
+        code = self._string_codes.get(value)
+        if code is None:
+            code = len(self._strings)
+            self._strings.append(value)
+            self._string_codes[value] = code
+        return code
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self._names[row]
+        if role == ID_ROLE:
+            return self._ids[row]
+        if role == CARD_ROLE:
+            unit = self._strings[self._unit_codes[row]]
+            return (
+                self._strings[self._type_codes[row]],
+                self._names[row],
+                f"{self._unit_prices[row]:.2f} ₽/{unit}",
+                f"На складе: {self._stock_quantities[row]} {unit}",
+                (f"Мин. заказ: {self._min_quantities[row]} {unit}",
+                 f"Упаковка: {self._package_quantities[row]} {unit}"),
+            )
+        return None
+
+    def store_rows(self, rows):
+        for row in rows:
+            self.insert_row_at(len(self._ids), row)
+
+    def row_id(self, row):
+        return row[0]
+
+    def row_key(self, row):
+        return row[2], row[0]
+
+    def key_at(self, position):
+        return self._names[position], self._ids[position]
+
+    def row_at(self, position):
+        return (
+            self._ids[position],
+            self._strings[self._type_codes[position]],
+            self._names[position],
+            self._unit_prices[position],
+            self._stock_quantities[position],
+            self._min_quantities[position],
+            self._package_quantities[position],
+            self._strings[self._unit_codes[position]],
+            self._type_ids[position],
+        )
+
+    def insert_row_at(self, position, row):
+        material_id, material_type, material_name, unit_price, stock_quantity, min_quantity, package_quantity, unit, type_id = row
+        self._ids.insert(position, material_id)
+        self._names.insert(position, material_name)
+        self._type_codes.insert(position, self._encode(material_type))
+        self._type_ids.insert(position, type_id)
+        self._unit_codes.insert(position, self._encode(unit))
+        self._unit_prices.insert(position, float(unit_price))
+        self._stock_quantities.insert(position, stock_quantity)
+        self._min_quantities.insert(position, min_quantity)
+        self._package_quantities.insert(position, package_quantity)
+
+    def remove_row_at(self, position):
+        for column in (self._ids, self._names, self._type_codes, self._type_ids, self._unit_codes, self._unit_prices,
+                       self._stock_quantities, self._min_quantities, self._package_quantities):
+            del column[position]
+
+    def replace_row_at(self, position, row):
+        self.remove_row_at(position)
+        self.insert_row_at(position, row)
+
+class PartnerListModel(PagedListModel):
+    # Модель списка партнеров (строки fetch_partners) с расчетом скидки
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+
+    def clear_rows(self):
+        self._rows = []
+
+    def store_rows(self, rows):
+        self._rows.extend(rows)
+
+    def row_id(self, row):
+        return row[0]
+
+    def row_key(self, row):
+        return row[2], row[0]
+
+    def key_at(self, position):
+        return self.row_key(self._rows[position])
+
+    def row_at(self, position):
+        return self._rows[position]
+
+    def insert_row_at(self, position, row):
+        self._rows.insert(position, row)
+
+    def remove_row_at(self, position):
+        del self._rows[position]
+
+    def replace_row_at(self, position, row):
+        self._rows[position] = row
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        (partner_id, partner_type, partner_name, director, phone_number, rating,
+         total_quantity, requests_count, last_request_date, type_id) = self._rows[index.row()]
+
+        if role == Qt.DisplayRole:
+            return partner_name
+        if role == ID_ROLE:
+            return partner_id
+        if role == CARD_ROLE:
+            details = [f"Продано: {total_quantity} шт.", f"Заявок: {requests_count}"]
+            if last_request_date is not None:
+                details.append(f"Последняя заявка: {last_request_date:%d.%m.%Y}")
+            return (
+                partner_type,
+                partner_name,
+                f"Скидка {partner_discount(total_quantity)}%",
+                f"Директор: {director}, {phone_number}, рейтинг: {rating}",
+                tuple(details),
+            )
+        return None
+
+
+class CardDelegate(QStyledItemDelegate):
+    # Рисует карточку записи (тип, наименование, цена, подзаголовок, детали
+    # и кнопку "Редактировать", если она нужна) только для видимых строк списка.
+    # Данные берутся из роли CARD_ROLE модели.
+
+    edit_requested = Signal(object)
+
+    OUTER_MARGIN = 10
+    PADDING = 25
+    SPACING = 15
+    DETAILS_SPACING = 30
+    BUTTON_TEXT = "Редактировать"
+
+    def __init__(self, parent=None, button_text=BUTTON_TEXT):
+        super().__init__(parent)
+        # button_text = None - карточка только для просмотра, без кнопки
+        self.button_text = button_text
+        self.type_font = theme_font(14, bold=True)
+        self.title_font = theme_font(16, bold=True)
+        self.price_font = theme_font(14, bold=True)
+        self.text_font = theme_font(13)
+        self.button_font = theme_font(12, bold=True)
+
+        # Метрики шрифтов считаются один раз, а не при каждой отрисовке
+        self.type_metrics = QFontMetrics(self.type_font)
+        self.title_metrics = QFontMetrics(self.title_font)
+        self.price_metrics = QFontMetrics(self.price_font)
+        self.text_metrics = QFontMetrics(self.text_font)
+
+        self.row1_height = max(self.title_metrics.height(), self.type_metrics.height())
+        self.text_height = self.text_metrics.height()
+        button_metrics = QFontMetrics(self.button_font)
+        self.button_size = QSize(
+            max(150, button_metrics.horizontalAdvance(button_text or "")) + 48,
+            button_metrics.height() + 24
+        )
+        self.card_height = (2 * self.OUTER_MARGIN + 2 * self.PADDING + self.row1_height
+                            + 2 * (self.SPACING + self.text_height)
+                            + self.SPACING + self.button_size.height())
+        if not button_text:
+            self.card_height -= self.SPACING + self.button_size.height()
+
+    def sizeHint(self, option, index):
+        return QSize(0, self.card_height)
+
+    def card_rect(self, option):
+        return option.rect.adjusted(self.OUTER_MARGIN, self.OUTER_MARGIN, -self.OUTER_MARGIN, -self.OUTER_MARGIN)
+
+    def button_rect(self, option):
+        card = self.card_rect(option)
+        return QRect(
+            card.right() - self.PADDING - self.button_size.width(),
+            card.bottom() - self.PADDING - self.button_size.height(),
+            self.button_size.width(),
+            self.button_size.height()
+        )
+
+    def paint(self, painter, option, index):
+        card_data = index.data(CARD_ROLE)
+        if card_data is None:
+            return
+        type_text, title_text, price_text, subtitle_text, details = card_data
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        card = self.card_rect(option)
+        painter.setPen(QPen(theme_color("card_border"), 1))
+        painter.setBrush(theme_color("card"))
+        painter.drawRoundedRect(QRectF(card).adjusted(0.5, 0.5, -0.5, -0.5), 10, 10)
+
+        content = card.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+
+        # Первая строка: тип, наименование и цена справа
+        row = QRect(content.left(), content.top(), content.width(), self.row1_height)
+        painter.setFont(self.price_font)
+        painter.setPen(theme_color("primary"))
+        painter.drawText(row, Qt.AlignRight | Qt.AlignVCenter, price_text)
+        price_width = self.price_metrics.horizontalAdvance(price_text) + self.SPACING
+
+        painter.setFont(self.type_font)
+        type_width = self.type_metrics.horizontalAdvance(type_text)
+        painter.drawText(row, Qt.AlignLeft | Qt.AlignVCenter, type_text)
+
+        painter.setFont(self.title_font)
+        painter.setPen(theme_color("primary_pressed"))
+        title_rect = row.adjusted(type_width + self.SPACING, 0, -price_width, 0)
+        title_text = self.title_metrics.elidedText(title_text, Qt.ElideRight, title_rect.width())
+        painter.drawText(title_rect, Qt.AlignLeft | Qt.AlignVCenter, title_text)
+
+        # Вторая и третья строки: подзаголовок и детали
+        painter.setFont(self.text_font)
+        painter.setPen(theme_color("hint"))
+        row = QRect(content.left(), row.bottom() + 1 + self.SPACING, content.width(), self.text_height)
+        painter.drawText(row, Qt.AlignLeft | Qt.AlignVCenter, subtitle_text)
+
+        row = QRect(content.left(), row.bottom() + 1 + self.SPACING, content.width(), self.text_height)
+        x = row.left()
+        for detail in details:
+            painter.drawText(QRect(x, row.top(), row.right() - x, row.height()), Qt.AlignLeft | Qt.AlignVCenter, detail)
+            x += self.text_metrics.horizontalAdvance(detail) + self.DETAILS_SPACING
+
+        # Кнопка редактирования
+        if self.button_text:
+            button = self.button_rect(option)
+            hovered = bool(option.state & QStyle.State_MouseOver)
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(theme_color("primary_hover" if hovered else "primary"))
+            painter.drawRoundedRect(QRectF(button), 6, 6)
+            painter.setFont(self.button_font)
+            painter.setPen(theme_color("on_primary"))
+            painter.drawText(button, Qt.AlignCenter, self.button_text)
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        # Нажатие на нарисованную кнопку или двойной щелчок по карточке
+        if not self.button_text:
+            return super().editorEvent(event, model, option, index)
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            if self.button_rect(option).contains(event.position().toPoint()):
+                self.edit_requested.emit(index.data(ID_ROLE))
+                return True
+        elif event.type() == QEvent.MouseButtonDblClick and event.button() == Qt.LeftButton:
+            self.edit_requested.emit(index.data(ID_ROLE))
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+def create_card_view(delegate):
+    # Список карточек: одинаковая высота строк позволяет не измерять каждую запись
+    view = QListView()
+    view.setItemDelegate(delegate)
+    view.setUniformItemSizes(True)
+    view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+    view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+    view.setResizeMode(QListView.Adjust)
+    view.setSelectionMode(QAbstractItemView.NoSelection)
+    view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    view.setFrameShape(QFrame.NoFrame)
+    view.setMouseTracking(True)
+    set_variant(view, "card-list")
+    return view
+
+
+# Задержка перед поиском после ввода, мс
+SEARCH_DEBOUNCE_MS = 300
+
+
+class FilterBar(QWidget):
+    # Строка поиска и фильтров списка (тип, диапазон цены).
+    # Сигнал changed отправляется после паузы во вводе, а не на каждое нажатие.
+
+    changed = Signal()
+
+    def __init__(self, placeholder, price_label, parent=None):
+        super().__init__(parent)
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(self.changed)
+
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(10)
+        self.setLayout(layout)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setFont(theme_font(12))
+        self.search_edit.setPlaceholderText(placeholder)
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.debounce_timer.start)
+        layout.addWidget(self.search_edit, 1)
+
+        self.type_combo = QComboBox()
+        self.type_combo.setFont(theme_font(12))
+        self.type_combo.addItem("Все типы", None)
+        self.type_combo.currentIndexChanged.connect(self.debounce_timer.start)
+        layout.addWidget(self.type_combo)
+
+        price_title = QLabel(price_label)
+        price_title.setFont(theme_font(12))
+        layout.addWidget(price_title)
+
+        # Значение 0 означает "без ограничения"
+        self.price_min_spin = QDoubleSpinBox()
+        self.price_max_spin = QDoubleSpinBox()
+        for spin, prefix in ((self.price_min_spin, "от "), (self.price_max_spin, "до ")):
+            spin.setFont(theme_font(12))
+            spin.setRange(0, 999999.99)
+            spin.setDecimals(2)
+            spin.setPrefix(prefix)
+            spin.setSpecialValueText(prefix + "—")
+            spin.valueChanged.connect(self.debounce_timer.start)
+            layout.addWidget(spin)
+
+    def set_types(self, types):
+        # Заполняет список типов из справочника, сохраняя выбранный тип
+        current = self.type_combo.currentData()
+        self.type_combo.blockSignals(True)
+        self.type_combo.clear()
+        self.type_combo.addItem("Все типы", None)
+        for type_row in types:
+            self.type_combo.addItem(type_row[1], type_row[0])
+        index = self.type_combo.findData(current)
+        self.type_combo.setCurrentIndex(max(index, 0))
+        self.type_combo.blockSignals(False)
+
+    def filters(self):
+        return {
+            "text": self.search_edit.text().strip(),
+            "type_id": self.type_combo.currentData(),
+            "price_min": self.price_min_spin.value() or None,
+            "price_max": self.price_max_spin.value() or None,
+        }
+
+    def is_empty(self):
+        return not any(value for value in self.filters().values())
+
+    def matches(self, name, type_id, price, articul=None):
+        # Та же проверка, что и в SQL (filter_conditions), для строки, сохраненной в диалоге
+        filters = self.filters()
+        text = filters["text"].lower()
+        if text and text not in name.lower() and not (articul and articul.lower().startswith(text)):
+            return False
+        if filters["type_id"] is not None and filters["type_id"] != type_id:
+            return False
+        if filters["price_min"] is not None and price < filters["price_min"]:
+            return False
+        if filters["price_max"] is not None and price > filters["price_max"]:
+            return False
+        return True
 
 
 class ProductsPage(QWidget):
     def __init__(self, main_window):
         super().__init__()
         self.main_window = main_window
+        # Номер пачки удаленных изменений: каждая загружается отдельной задачей
+        self.remote_changes_seq = 0
+        # Список изменился, пока страница была скрыта
+        self.stale = False
+        self.read_only = False
         self.init_ui()
 
     def init_ui(self):
@@ -171,65 +1476,62 @@ class ProductsPage(QWidget):
         header_layout = QHBoxLayout()
 
         back_btn = QPushButton("Назад")
-        back_btn.setFont(QFont("Gabriola", 12))
-        back_btn.setStyleSheet(self.get_button_style())
+        back_btn.setFont(theme_font(12))
+        set_variant(back_btn, "primary")
         back_btn.clicked.connect(self.main_window.show_main_page)
         header_layout.addWidget(back_btn)
 
         title_label = QLabel("Управление продукцией")
-        title_label.setFont(QFont("Gabriola", 24, QFont.Bold))
-        title_label.setStyleSheet("color: #2D6033;")
+        title_label.setFont(theme_font(24, bold=True))
+        set_variant(title_label, "title")
         header_layout.addWidget(title_label)
         header_layout.addStretch()
 
         layout.addLayout(header_layout)
 
-        # Область с продукцией (скроллинг)
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setFrameShape(QFrame.NoFrame)
-        self.scroll_area.setStyleSheet("""
-            QScrollArea {
-                border: none;
-            }
-            QScrollBar:vertical {
-                width: 12px;
-                background: #BBD9B2;
-            }
-            QScrollBar::handle:vertical {
-                background: #2D6033;
-                min-height: 20px;
-                border-radius: 6px;
-            }
-        """)
-
-        self.scroll_widget = QWidget()
-        self.scroll_layout = QVBoxLayout()
-        self.scroll_layout.setContentsMargins(10, 10, 10, 10)
-        self.scroll_layout.setSpacing(20)
-        self.scroll_widget.setLayout(self.scroll_layout)
-
-        self.scroll_area.setWidget(self.scroll_widget)
-        layout.addWidget(self.scroll_area)
+        # Поиск и фильтры
+        self.filter_bar = FilterBar("Поиск по артикулу или наименованию", "Стоимость:")
+        self.filter_bar.changed.connect(self.load_products)
+        layout.addWidget(self.filter_bar)
+
+        # Список продукции: модель + делегат, рисующий карточки видимых строк
+        self.products_model = ProductListModel(self)
+        self.products_model.more_requested.connect(self.load_more_products)
+        self.card_delegate = CardDelegate(self)
+        self.card_delegate.edit_requested.connect(self.show_edit_product_dialog)
+
+        self.products_view = create_card_view(self.card_delegate)
+        self.products_view.setModel(self.products_model)
+        layout.addWidget(self.products_view)
 
         # Кнопки управления
         buttons_layout = QHBoxLayout()
 
         self.add_button = QPushButton("Добавить продукт")
-        self.add_button.setFont(QFont("Gabriola", 12))
-        self.add_button.setStyleSheet(self.get_button_style())
+        self.add_button.setFont(theme_font(12))
+        set_variant(self.add_button, "primary")
         self.add_button.clicked.connect(self.show_add_product_dialog)
 
         self.refresh_button = QPushButton("Обновить")
-        self.refresh_button.setFont(QFont("Gabriola", 12))
-        self.refresh_button.setStyleSheet(self.get_button_style())
-        self.refresh_button.clicked.connect(self.load_products)
+        self.refresh_button.setFont(theme_font(12))
+        set_variant(self.refresh_button, "primary")
+        self.refresh_button.clicked.connect(self.refresh_products)
 
         self.calculate_button = QPushButton("Пересчитать стоимость")
-        self.calculate_button.setFont(QFont("Gabriola", 12))
-        self.calculate_button.setStyleSheet(self.get_button_style())
+        self.calculate_button.setFont(theme_font(12))
+        set_variant(self.calculate_button, "primary")
         self.calculate_button.clicked.connect(self.recalculate_all_prices)
 
+        self.import_button = QPushButton("Импорт")
+        self.import_button.setFont(theme_font(12))
+        set_variant(self.import_button, "primary")
+        self.import_button.clicked.connect(self.import_products)
+
+        self.export_button = QPushButton("Экспорт")
+        self.export_button.setFont(theme_font(12))
+        set_variant(self.export_button, "primary")
+        self.export_button.clicked.connect(lambda: self.main_window.export_data(self, ["products", "requests"]))
+
         buttons_layout.addWidget(self.add_button)
         buttons_layout.addWidget(self.refresh_button)
         buttons_layout.addWidget(self.calculate_button)
@@ -237,260 +1539,1046 @@ class ProductsPage(QWidget):
 
         layout.addLayout(buttons_layout)
 
+        # Импорт и экспорт - в строке заголовка
+        header_layout.addWidget(self.import_button)
+        header_layout.addWidget(self.export_button)
+
+    def refresh_products(self):
+        # Кнопка "Обновить": справочник типов тоже перечитывается
+        self.main_window.reference_cache.invalidate("type_product")
+        self.load_products()
+
+    def open_page(self):
+        # Открытый ранее список поддерживается уведомлениями об изменениях,
+        # поэтому заново загружается, только если он пуст или мог устареть
+        if self.stale or self.products_model.rowCount() == 0 or not self.main_window.catalog_listener.is_live():
+            self.load_products()
+
     def load_products(self):
-        #Загрузка списка продукции из базы данных
-        if not self.main_window.db_connection:
+        #Загрузка первой страницы продукции из базы данных (в фоне)
+        if not self.main_window.db_worker.is_available():
             return
 
-        # Очищаем предыдущие данные
-        for i in reversed(range(self.scroll_layout.count())):
-            widget = self.scroll_layout.itemAt(i).widget()
-            if widget is not None:
-                widget.deleteLater()
+        # Список считается актуальным только после ответа сервера: локальная копия
+        # и отмененный запрос (другая страница, новый фильтр) оставляют его устаревшим
+        self.stale = True
+        self.fill_type_filter()
 
-        try:
-            cursor = self.main_window.db_connection.cursor()
-
-            # Получаем данные о продукции
-            query = """SELECT 
-                    p.id_product,
-                    tp.type_product,
-                    p.product_name,
-                    p.min_cost,
-                    p.articul,
-                    p.width
-                FROM products p
-                JOIN type_product tp ON p.id_type_product = tp.id_type_product
-                ORDER BY p.product_name"""
-
-            cursor.execute(query)
-            products = cursor.fetchall()
-
-            if not products:
-                self.main_window.show_info_message("Информация", "В базе данных нет продукции.")
-                return
+        filters = self.filter_bar.filters()
+        self.main_window.db_worker.cancel("products-more")
+
+        # Без связи с сервером - список из локальной копии
+        if not self.main_window.db_worker.online:
+            self.on_products_loaded(self.main_window.snapshot_page("products", filters=filters))
+            return
+
+        # При первом открытии сразу показываем локальную копию, пока идет запрос
+        if self.products_model.rowCount() == 0:
+            rows, has_more = self.main_window.snapshot_page("products", filters=filters)
+            if rows:
+                self.products_model.set_page(rows, has_more)
+
+        self.main_window.db_worker.submit(
+            "products-page",
+            lambda connection: fetch_products(connection, filters=filters),
+            self.on_products_server_loaded,
+            self.on_products_load_failed,
+            read_only=True,
+            action="products"
+        )
+
+    def fill_type_filter(self):
+        # Типы продукции для фильтра берутся из кэша справочников
+        reference_cache = self.main_window.reference_cache
+        types = reference_cache.peek("type_product") or self.main_window.snapshot_reference("type_product")
+        if types is not None:
+            self.filter_bar.set_types(types)
+            return
+        self.main_window.db_worker.submit(
+            "product-type-filter",
+            lambda connection: reference_cache.get("type_product", connection),
+            self.filter_bar.set_types,
+            lambda message: None,
+            read_only=True
+        )
+
+    def on_products_server_loaded(self, result):
+        self.stale = False
+        self.on_products_loaded(result)
+
+    def on_products_loaded(self, result):
+        products, has_more = result
+        self.products_model.set_page(products, has_more)
+
+        if not products and self.filter_bar.is_empty():
+            self.main_window.show_info_message("Информация", "В базе данных нет продукции.")
+
+    def on_products_load_failed(self, message):
+        # Сервер недоступен - показываем локальную копию без окна ошибки
+        if not self.main_window.db_worker.online:
+            self.on_products_loaded(self.main_window.snapshot_page("products", filters=self.filter_bar.filters()))
+            return
+        self.main_window.show_error_message(
+            "Ошибка загрузки продукции",
+            f"Произошла ошибка при загрузке продукции: {message}"
+        )
+
+    def load_more_products(self, after):
+        # Следующая страница при прокрутке списка до конца
+        filters = self.filter_bar.filters()
+        if not self.main_window.db_worker.online:
+            self.products_model.append_page(*self.main_window.snapshot_page("products", after, filters))
+            return
+        self.main_window.db_worker.submit(
+            "products-more",
+            lambda connection: fetch_products(connection, after, filters=filters),
+            lambda result: self.products_model.append_page(*result),
+            self.on_more_products_failed,
+            read_only=True
+        )
+
+    def on_more_products_failed(self, message):
+        self.products_model.fetch_failed()
+        if self.main_window.db_worker.online:
+            self.on_products_load_failed(message)
+
+    def apply_saved_row(self, row, product_id=None):
+        # Сохраненная строка попадает в список, только если подходит под текущие фильтры;
+        # без строки (продукт уже удален в базе) он только убирается из списка
+        if row is None:
+            if product_id is not None:
+                self.products_model.remove_row(product_id)
+            return
+        product_id, product_type, product_name, min_cost, articul, width, type_id = row
+        if self.filter_bar.matches(product_name, type_id, min_cost, articul):
+            self.products_model.upsert_row(row)
+        else:
+            self.products_model.remove_row(product_id)
+
+    def apply_remote_changes(self, ids):
+        # Изменения из других копий приложения: перечитываются только измененные строки.
+        # Скрытая страница только помечает список устаревшим - он загрузится при открытии.
+        if not self.isVisible():
+            self.stale = True
+            return
+        if not self.main_window.db_worker.is_available():
+            return
+        if ids is None:
+            self.load_products()
+            return
+
+        self.remote_changes_seq += 1
+        self.main_window.db_worker.submit(
+            f"products-changes-{self.remote_changes_seq}",
+            lambda connection: fetch_products(connection, limit=len(ids), ids=ids)[0],
+            lambda rows: self.on_remote_rows_loaded(ids, rows),
+            lambda message: None,
+            read_only=True,
+            action="products-changes"
+        )
+
+    def on_remote_rows_loaded(self, ids, rows):
+        # Строки, которых больше нет в базе, удаляются из списка
+        for row in rows:
+            self.apply_saved_row(row)
+        found = {row[0] for row in rows}
+        for row_id in ids:
+            if row_id not in found:
+                self.products_model.remove_row(row_id)
+
+    def set_read_only(self, read_only):
+        # Без связи с сервером список доступен только для просмотра
+        self.read_only = read_only
+        self.add_button.setEnabled(not read_only)
+        self.calculate_button.setEnabled(not read_only)
+        self.import_button.setEnabled(not read_only)
+
+    def show_add_product_dialog(self):
+        # Показывает диалог добавления нового продукта
+        dialog = ProductDialog(self.main_window, self.main_window.db_worker)
+        if dialog.exec() == QDialog.Accepted:
+            self.apply_saved_row(dialog.saved_row)
+            self.main_window.show_info_message("Успех", "Продукт успешно добавлен.")
+
+    def show_edit_product_dialog(self, product_id):
+        # Показывает диалог редактирования продукта
+        if self.read_only:
+            self.main_window.show_warning_message(
+                "Нет связи с сервером",
+                "Редактирование недоступно, пока нет связи с сервером."
+            )
+            return
+        dialog = ProductDialog(self.main_window, self.main_window.db_worker, product_id,
+                               self.products_model.row_for_id(product_id))
+        if dialog.exec() == QDialog.Accepted:
+            self.apply_saved_row(dialog.saved_row, product_id)
+            self.main_window.show_info_message("Успех", "Продукт успешно обновлен.")
+
+    def recalculate_all_prices(self):
+        # Пересчет стоимости для всей продукции
+        if not self.main_window.db_worker.is_available():
+            return
+
+        reply = QMessageBox.question(
+            self, 'Подтверждение',
+            'Вы уверены, что хотите пересчитать стоимость для всей продукции?',
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+
+        if reply != QMessageBox.Yes:
+            return
+
+        # Пересчет одним UPDATE на стороне сервера; при ошибке транзакция откатывается
+        self.calculate_button.setEnabled(False)
+        self.main_window.db_worker.submit(
+            "recalculate", recalculate_prices, self.on_prices_recalculated, self.on_recalculation_failed
+        )
+
+    def on_prices_recalculated(self, changes):
+        self.calculate_button.setEnabled(True)
+
+        if not changes:
+            self.main_window.show_info_message("Пересчет завершен", "Стоимость всей продукции актуальна.")
+            return
+
+        self.load_products()
+        self.show_recalculation_report(changes)
+
+    def on_recalculation_failed(self, message):
+        self.calculate_button.setEnabled(True)
+        self.main_window.show_error_message(
+            "Ошибка пересчета стоимости",
+            f"Произошла ошибка при пересчете стоимости: {message}"
+        )
+
+    def import_products(self):
+        # Массовый импорт продукции из CSV/Excel-файла
+        if not self.main_window.db_worker.is_available():
+            return
+
+        path, _ = QFileDialog.getOpenFileName(self, "Импорт продукции", "", IMPORT_FILE_FILTER)
+        if not path:
+            return
+
+        self.import_button.setEnabled(False)
+        reference_cache = self.main_window.reference_cache
+        self.main_window.db_worker.submit(
+            "products-import",
+            lambda connection: import_products(connection, path, reference_cache),
+            lambda result: self.on_products_imported(path, result),
+            self.on_products_import_failed
+        )
+
+    def on_products_imported(self, path, result):
+        self.import_button.setEnabled(True)
+        self.load_products()
+        self.main_window.show_import_report(path, result)
+
+    def on_products_import_failed(self, message):
+        self.import_button.setEnabled(True)
+        self.main_window.show_error_message(
+            "Ошибка импорта",
+            f"Не удалось импортировать продукцию: {message}"
+        )
+
+    def show_recalculation_report(self, changes):
+        # Показывает количество измененных строк и разницу "было/стало"
+        lines = [
+            f"{articul} {product_name}: {old_cost:.2f} ₽ → {new_cost:.2f} ₽"
+            for product_id, articul, product_name, old_cost, new_cost in changes[:RECALCULATION_REPORT_LIMIT]
+        ]
+        if len(changes) > RECALCULATION_REPORT_LIMIT:
+            lines.append(f"... и еще {len(changes) - RECALCULATION_REPORT_LIMIT}")
+
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Information)
+        box.setWindowTitle("Пересчет завершен")
+        box.setText(f"Стоимость пересчитана для {len(changes)} продуктов.")
+        box.setDetailedText("\n".join(lines))
+        box.exec()
+
+
+
+class PartnersPage(QWidget):
+    def __init__(self, main_window):
+        super().__init__()
+        self.main_window = main_window
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+        layout.setContentsMargins(30, 30, 30, 30)
+        layout.setSpacing(20)
+
+        header_layout = QHBoxLayout()
+
+        back_btn = QPushButton("Назад")
+        back_btn.setFont(theme_font(12))
+        set_variant(back_btn, "primary")
+        back_btn.clicked.connect(self.main_window.show_main_page)
+        header_layout.addWidget(back_btn)
+
+        title_label = QLabel("Партнеры")
+        title_label.setFont(theme_font(24, bold=True))
+        set_variant(title_label, "title")
+        header_layout.addWidget(title_label)
+        header_layout.addStretch()
+
+        self.refresh_button = QPushButton("Обновить")
+        self.refresh_button.setFont(theme_font(12))
+        set_variant(self.refresh_button, "primary")
+        self.refresh_button.clicked.connect(self.refresh_partners)
+        header_layout.addWidget(self.refresh_button)
+
+        layout.addLayout(header_layout)
+
+        # Поиск и фильтры: диапазон - по объему продаж
+        self.filter_bar = FilterBar("Поиск по наименованию", "Продано, шт.:")
+        self.filter_bar.changed.connect(self.load_partners)
+        layout.addWidget(self.filter_bar)
+
+        # Карточки партнеров только для просмотра
+        self.partners_model = PartnerListModel(self)
+        self.partners_model.more_requested.connect(self.load_more_partners)
+        self.card_delegate = CardDelegate(self, button_text=None)
+
+        self.partners_view = create_card_view(self.card_delegate)
+        self.partners_view.setModel(self.partners_model)
+        layout.addWidget(self.partners_view)
+
+        tiers = ", ".join(f"от {threshold} шт. - {discount}%"
+                          for threshold, discount in reversed(PARTNER_DISCOUNT_TIERS))
+        tiers_label = QLabel(f"Скидка по объему продаж: {tiers}")
+        tiers_label.setFont(theme_font(12))
+        set_variant(tiers_label, "hint")
+        layout.addWidget(tiers_label)
+
+    def refresh_partners(self):
+        self.main_window.reference_cache.invalidate("type_part_sup")
+        self.load_partners()
+
+    def load_partners(self):
+        # Загрузка первой страницы партнеров (в фоне)
+        if not self.main_window.db_worker.is_available():
+            return
+
+        self.fill_type_filter()
+
+        filters = self.filter_bar.filters()
+        self.main_window.db_worker.cancel("partners-more")
+        self.main_window.db_worker.submit(
+            "page",
+            lambda connection: fetch_partners(connection, filters=filters),
+            self.on_partners_loaded,
+            self.on_partners_load_failed,
+            read_only=True,
+            action="partners"
+        )
+
+    def fill_type_filter(self):
+        # Типы партнеров для фильтра берутся из кэша справочников
+        reference_cache = self.main_window.reference_cache
+        types = reference_cache.peek("type_part_sup")
+        if types is not None:
+            self.filter_bar.set_types(types)
+            return
+        self.main_window.db_worker.submit(
+            "partner-type-filter",
+            lambda connection: reference_cache.get("type_part_sup", connection),
+            self.filter_bar.set_types,
+            lambda message: None,
+            read_only=True
+        )
+
+    def on_partners_loaded(self, result):
+        partners, has_more = result
+        self.partners_model.set_page(partners, has_more)
+
+        if not partners and self.filter_bar.is_empty():
+            self.main_window.show_info_message("Информация", "В базе данных нет партнеров.")
+
+    def on_partners_load_failed(self, message):
+        self.main_window.show_error_message(
+            "Ошибка загрузки партнеров",
+            f"Произошла ошибка при загрузке партнеров: {message}"
+        )
+
+    def load_more_partners(self, after):
+        # Следующая страница при прокрутке списка до конца
+        filters = self.filter_bar.filters()
+        self.main_window.db_worker.submit(
+            "partners-more",
+            lambda connection: fetch_partners(connection, after, filters=filters),
+            lambda result: self.partners_model.append_page(*result),
+            self.on_more_partners_failed,
+            read_only=True
+        )
+
+    def on_more_partners_failed(self, message):
+        self.partners_model.fetch_failed()
+        self.on_partners_load_failed(message)
+
+
+
+class ReportTableModel(QAbstractTableModel):
+    # Таблица отчета по готовым строкам. columns - ((заголовок, формат), ...),
+    # формат: "text", "int" или "money"
+
+    def __init__(self, columns, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self._rows = []
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+
+    def set_column_title(self, section, title):
+        columns = list(self.columns)
+        columns[section] = (title, columns[section][1])
+        self.columns = tuple(columns)
+        self.headerDataChanged.emit(Qt.Horizontal, section, section)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.columns[section][0]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self._rows[index.row()][index.column()]
+        column_format = self.columns[index.column()][1]
+
+        if role == Qt.DisplayRole:
+            if value is None:
+                return "—"
+            if column_format == "money":
+                return f"{value:,.2f}".replace(",", " ")
+            if column_format == "int":
+                return f"{value:,}".replace(",", " ")
+            return str(value)
+        if role == SORT_ROLE:
+            if column_format == "text":
+                return value or ""
+            return float(value or 0)
+        if role == Qt.TextAlignmentRole and column_format != "text":
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+
+def create_report_view(model):
+    # Таблица отчета с сортировкой по щелчку на заголовке
+    proxy_model = QSortFilterProxyModel(model)
+    proxy_model.setSourceModel(model)
+    proxy_model.setSortRole(SORT_ROLE)
+
+    view = QTableView()
+    view.setFont(theme_font(12))
+    view.setModel(proxy_model)
+    view.setSortingEnabled(True)
+    view.sortByColumn(-1, Qt.AscendingOrder)
+    view.setSelectionBehavior(QAbstractItemView.SelectRows)
+    view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    view.verticalHeader().setVisible(False)
+    view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+    view.horizontalHeader().setStretchLastSection(True)
+    return view
+
+
+class ReportsPage(QWidget):
+    # Отчеты для руководства. Страница читает только таблицы отчетов;
+    # при открытии они пополняются новыми заявками и поставками.
+
+    def __init__(self, main_window):
+        super().__init__()
+        self.main_window = main_window
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+        layout.setContentsMargins(30, 30, 30, 30)
+        layout.setSpacing(20)
+
+        header_layout = QHBoxLayout()
+
+        back_btn = QPushButton("Назад")
+        back_btn.setFont(theme_font(12))
+        set_variant(back_btn, "primary")
+        back_btn.clicked.connect(self.main_window.show_main_page)
+        header_layout.addWidget(back_btn)
+
+        title_label = QLabel("Отчеты")
+        title_label.setFont(theme_font(24, bold=True))
+        set_variant(title_label, "title")
+        header_layout.addWidget(title_label)
+        header_layout.addStretch()
+
+        self.refresh_button = QPushButton("Обновить")
+        self.refresh_button.setFont(theme_font(12))
+        set_variant(self.refresh_button, "primary")
+        self.refresh_button.clicked.connect(self.load_reports)
+        header_layout.addWidget(self.refresh_button)
+
+        self.rebuild_button = QPushButton("Полный пересчет")
+        self.rebuild_button.setFont(theme_font(12))
+        set_variant(self.rebuild_button, "primary")
+        self.rebuild_button.clicked.connect(self.rebuild_reports)
+        header_layout.addWidget(self.rebuild_button)
+
+        layout.addLayout(header_layout)
+
+        self.refreshed_label = QLabel("")
+        self.refreshed_label.setFont(theme_font(12))
+        set_variant(self.refreshed_label, "hint")
+        layout.addWidget(self.refreshed_label)
+
+        self.tabs = QTabWidget()
+        self.tabs.setFont(theme_font(12))
+        layout.addWidget(self.tabs)
+
+        # Продажи по месяцам в выбранном разрезе
+        sales_tab = QWidget()
+        sales_layout = QVBoxLayout()
+        sales_tab.setLayout(sales_layout)
+
+        dimension_layout = QHBoxLayout()
+        dimension_layout.addWidget(QLabel("Разрез:"))
+        self.dimension_combo = QComboBox()
+        self.dimension_combo.setFont(theme_font(12))
+        for dimension, (title, join, name_column) in SALES_REPORT_DIMENSIONS.items():
+            self.dimension_combo.addItem(title, dimension)
+        self.dimension_combo.currentIndexChanged.connect(lambda index: self.load_reports(refresh=False))
+        dimension_layout.addWidget(self.dimension_combo)
+        dimension_layout.addStretch()
+        sales_layout.addLayout(dimension_layout)
+
+        self.sales_model = ReportTableModel(
+            (("Месяц", "text"), ("Разрез", "text"), ("Продано, шт.", "int"),
+             ("Выручка, ₽", "money"), ("Заявок", "int")), self)
+        sales_layout.addWidget(create_report_view(self.sales_model))
+        self.tabs.addTab(sales_tab, "Продажи по месяцам")
+
+        self.stock_model = ReportTableModel(
+            (("Тип материала", "text"), ("Материалов", "int"), ("Остаток", "int"),
+             ("Стоимость остатка, ₽", "money"), ("Ниже минимума", "int")), self)
+        self.tabs.addTab(create_report_view(self.stock_model), "Остатки по типам материалов")
+
+        self.supplies_model = ReportTableModel(
+            (("Тип материала", "text"), ("Поставщик", "text"), ("Поставлено", "int"),
+             ("Поставок", "int")), self)
+        self.tabs.addTab(create_report_view(self.supplies_model), "Поставки")
+
+    def load_reports(self, refresh=True, full=False):
+        # Обновление таблиц отчетов (если refresh) и чтение их в одной фоновой задаче
+        if not self.main_window.db_worker.is_available():
+            return
+
+        dimension = self.dimension_combo.currentData()
+
+        def task(connection):
+            if refresh:
+                refresh_reports(connection, full)
+            return fetch_reports(connection, dimension)
+
+        self.set_busy(True)
+        self.main_window.db_worker.submit(
+            "reports",
+            task,
+            self.on_reports_loaded,
+            self.on_reports_load_failed,
+            read_only=not refresh
+        )
+
+    def rebuild_reports(self):
+        reply = QMessageBox.question(
+            self, "Полный пересчет",
+            "Пересчитать отчеты по всем заявкам и поставкам? Это нужно после "
+            "изменения или удаления уже учтенных записей.",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            self.load_reports(full=True)
+
+    def on_reports_loaded(self, result):
+        sales, supplies, stock, refreshed_at = result
+        self.set_busy(False)
+        self.sales_model.set_column_title(1, self.dimension_combo.currentText())
+        self.sales_model.set_rows(sales)
+        self.supplies_model.set_rows(supplies)
+        self.stock_model.set_rows(stock)
+        if refreshed_at is not None:
+            self.refreshed_label.setText(f"Данные на {refreshed_at.astimezone():%d.%m.%Y %H:%M}")
+        else:
+            self.refreshed_label.setText("Отчеты еще не рассчитывались")
+
+    def on_reports_load_failed(self, message):
+        self.set_busy(False)
+        self.main_window.show_error_message(
+            "Ошибка загрузки отчетов",
+            f"Не удалось загрузить отчеты: {message}"
+        )
+
+    def set_busy(self, busy):
+        self.refresh_button.setEnabled(not busy)
+        self.rebuild_button.setEnabled(not busy)
+
+
+
+class MaterialsPage(QWidget):
+    def __init__(self, main_window):
+        super().__init__()
+        self.main_window = main_window
+        # Номер пачки удаленных изменений: каждая загружается отдельной задачей
+        self.remote_changes_seq = 0
+        # Список изменился, пока страница была скрыта
+        self.stale = False
+        self.read_only = False
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+        layout.setContentsMargins(30, 30, 30, 30)
+        layout.setSpacing(20)
+
+        header_layout = QHBoxLayout()
+
+        back_btn = QPushButton("Назад")
+        back_btn.setFont(theme_font(12))
+        set_variant(back_btn, "primary")
+        back_btn.clicked.connect(self.main_window.show_main_page)
+        header_layout.addWidget(back_btn)
+
+        title_label = QLabel("Управление материалами")
+        title_label.setFont(theme_font(24, bold=True))
+        set_variant(title_label, "title")
+        header_layout.addWidget(title_label)
+        header_layout.addStretch()
+
+        layout.addLayout(header_layout)
+
+        # Поиск и фильтры
+        self.filter_bar = FilterBar("Поиск по наименованию", "Цена:")
+        self.filter_bar.changed.connect(self.load_materials)
+        layout.addWidget(self.filter_bar)
+
+        # Список материалов: модель + общий делегат карточек
+        self.materials_model = MaterialListModel(self)
+        self.materials_model.more_requested.connect(self.load_more_materials)
+        self.card_delegate = CardDelegate(self)
+        self.card_delegate.edit_requested.connect(self.show_edit_material_dialog)
+
+        self.materials_view = create_card_view(self.card_delegate)
+        self.materials_view.setModel(self.materials_model)
+        layout.addWidget(self.materials_view)
+
+        # Кнопки управления
+        buttons_layout = QHBoxLayout()
+
+        self.add_button = QPushButton("Добавить материал")
+        self.add_button.setFont(theme_font(12))
+        set_variant(self.add_button, "primary")
+        self.add_button.clicked.connect(self.show_add_material_dialog)
+
+        self.refresh_button = QPushButton("Обновить")
+        self.refresh_button.setFont(theme_font(12))
+        set_variant(self.refresh_button, "primary")
+        self.refresh_button.clicked.connect(self.refresh_materials)
+
+        self.import_button = QPushButton("Импорт")
+        self.import_button.setFont(theme_font(12))
+        set_variant(self.import_button, "primary")
+        self.import_button.clicked.connect(self.import_materials)
+
+        self.export_button = QPushButton("Экспорт")
+        self.export_button.setFont(theme_font(12))
+        set_variant(self.export_button, "primary")
+        self.export_button.clicked.connect(lambda: self.main_window.export_data(self, ["materials", "supplies"]))
+
+        self.calculator_button = QPushButton("Расчет сырья")
+        self.calculator_button.setFont(theme_font(12))
+        set_variant(self.calculator_button, "primary")
+        self.calculator_button.clicked.connect(self.show_calculator_dialog)
+
+        self.replenishment_button = QPushButton("Пополнение запасов")
+        self.replenishment_button.setFont(theme_font(12))
+        set_variant(self.replenishment_button, "primary")
+        self.replenishment_button.clicked.connect(self.show_replenishment_dialog)
+
+        buttons_layout.addWidget(self.add_button)
+        buttons_layout.addWidget(self.refresh_button)
+        buttons_layout.addWidget(self.calculator_button)
+        buttons_layout.addWidget(self.replenishment_button)
+        buttons_layout.addStretch()
+
+        layout.addLayout(buttons_layout)
+
+        # Импорт и экспорт - в строке заголовка
+        header_layout.addWidget(self.import_button)
+        header_layout.addWidget(self.export_button)
+
+    def refresh_materials(self):
+        # Кнопка "Обновить": справочник типов тоже перечитывается
+        self.main_window.reference_cache.invalidate("type_material")
+        self.load_materials()
+
+    def open_page(self):
+        # Открытый ранее список поддерживается уведомлениями об изменениях,
+        # поэтому заново загружается, только если он пуст или мог устареть
+        if self.stale or self.materials_model.rowCount() == 0 or not self.main_window.catalog_listener.is_live():
+            self.load_materials()
+
+    def load_materials(self):
+        # Загрузка первой страницы материалов из базы данных (в фоне)
+        if not self.main_window.db_worker.is_available():
+            return
+
+        # Список считается актуальным только после ответа сервера: локальная копия
+        # и отмененный запрос (другая страница, новый фильтр) оставляют его устаревшим
+        self.stale = True
+        self.fill_type_filter()
+
+        filters = self.filter_bar.filters()
+        self.main_window.db_worker.cancel("materials-more")
+
+        # Без связи с сервером - список из локальной копии
+        if not self.main_window.db_worker.online:
+            self.on_materials_loaded(self.main_window.snapshot_page("materials", filters=filters))
+            return
+
+        # При первом открытии сразу показываем локальную копию, пока идет запрос
+        if self.materials_model.rowCount() == 0:
+            rows, has_more = self.main_window.snapshot_page("materials", filters=filters)
+            if rows:
+                self.materials_model.set_page(rows, has_more)
+
+        self.main_window.db_worker.submit(
+            "materials-page",
+            lambda connection: fetch_materials(connection, filters=filters),
+            self.on_materials_server_loaded,
+            self.on_materials_load_failed,
+            read_only=True,
+            action="materials"
+        )
+
+    def fill_type_filter(self):
+        # Типы материалов для фильтра берутся из кэша справочников
+        reference_cache = self.main_window.reference_cache
+        types = reference_cache.peek("type_material") or self.main_window.snapshot_reference("type_material")
+        if types is not None:
+            self.filter_bar.set_types(types)
+            return
+        self.main_window.db_worker.submit(
+            "material-type-filter",
+            lambda connection: reference_cache.get("type_material", connection),
+            self.filter_bar.set_types,
+            lambda message: None,
+            read_only=True
+        )
+
+    def on_materials_server_loaded(self, result):
+        self.stale = False
+        self.on_materials_loaded(result)
+
+    def on_materials_loaded(self, result):
+        materials, has_more = result
+        self.materials_model.set_page(materials, has_more)
+
+        if not materials and self.filter_bar.is_empty():
+            self.main_window.show_info_message("Информация", "В базе данных нет материалов.")
 
-            for product in products:
-                self.add_product_card(*product)
+    def on_materials_load_failed(self, message):
+        # Сервер недоступен - показываем локальную копию без окна ошибки
+        if not self.main_window.db_worker.online:
+            self.on_materials_loaded(self.main_window.snapshot_page("materials", filters=self.filter_bar.filters()))
+            return
+        self.main_window.show_error_message(
+            "Ошибка загрузки материалов",
+            f"Произошла ошибка при загрузке материалов: {message}"
+        )
 
-        except Exception as e:
-            self.main_window.show_error_message(
-                "Ошибка загрузки продукции",
-                f"Произошла ошибка при загрузке продукции: {str(e)}"
-            )
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-
-    def add_product_card(self, product_id, product_type, product_name, min_cost, articul, width):
-        # Добавляет карточку продукта в интерфейс
-        card = QFrame()
-        card.setFrameShape(QFrame.StyledPanel)
-        card.setStyleSheet("""
-            QFrame {
-                background-color: #E8F4E5;
-                border-radius: 10px;
-                padding: 20px;
-                border: 1px solid #BBD9B2;
-            }
-        """)
-        card.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
-
-        layout = QGridLayout()
-        layout.setContentsMargins(15, 15, 15, 15)
-        layout.setSpacing(15)
-        card.setLayout(layout)
-
-        type_label = QLabel(product_type)
-        type_label.setFont(QFont("Gabriola", 14, QFont.Bold))
-        type_label.setStyleSheet("color: #2D6033;")
-
-        name_label = QLabel(product_name)
-        name_label.setFont(QFont("Gabriola", 16, QFont.Bold))
-        name_label.setStyleSheet("color: #1D4023;")
-
-        row1_layout = QHBoxLayout()
-        row1_layout.addWidget(type_label)
-        row1_layout.addWidget(name_label)
-        row1_layout.addStretch()
-
-        cost_label = QLabel(f"{min_cost:.2f} ₽")
-        cost_label.setFont(QFont("Gabriola", 14, QFont.Bold))
-        cost_label.setStyleSheet("color: #2D6033;")
-        row1_layout.addWidget(cost_label)
-
-        layout.addLayout(row1_layout, 0, 0)
-
-        articul_label = QLabel(f"Артикул: {articul}")
-        articul_label.setFont(QFont("Gabriola", 13))
-        articul_label.setStyleSheet("color: #555555;")
-        layout.addWidget(articul_label, 1, 0)
-
-        details_layout = QHBoxLayout()
-        details_layout.setSpacing(30)
-
-        min_cost_label = QLabel(f"Мин. стоимость партнера: {min_cost:.2f} ₽")
-        min_cost_label.setFont(QFont("Gabriola", 13))
-        min_cost_label.setStyleSheet("color: #555555;")
-        details_layout.addWidget(min_cost_label)
-
-        width_label = QLabel(f"Ширина: {width} м")
-        width_label.setFont(QFont("Gabriola", 13))
-        width_label.setStyleSheet("color: #555555;")
-        details_layout.addWidget(width_label)
-
-        details_layout.addStretch()
-        layout.addLayout(details_layout, 2, 0)
-
-        edit_button = QPushButton("Редактировать")
-        edit_button.setFont(QFont("Gabriola", 12))
-        edit_button.setStyleSheet(self.get_button_style())
-        edit_button.clicked.connect(lambda: self.show_edit_product_dialog(product_id))
-        layout.addWidget(edit_button, 3, 0, alignment=Qt.AlignRight)
-
-        # Сохраняем ID продукта в карточке
-        card.product_id = product_id
-
-        self.scroll_layout.addWidget(card)
+    def load_more_materials(self, after):
+        # Следующая страница при прокрутке списка до конца
+        filters = self.filter_bar.filters()
+        if not self.main_window.db_worker.online:
+            self.materials_model.append_page(*self.main_window.snapshot_page("materials", after, filters))
+            return
+        self.main_window.db_worker.submit(
+            "materials-more",
+            lambda connection: fetch_materials(connection, after, filters=filters),
+            lambda result: self.materials_model.append_page(*result),
+            self.on_more_materials_failed,
+            read_only=True
+        )
 
-    def show_add_product_dialog(self):
-        # Показывает диалог добавления нового продукта
-        dialog = ProductDialog(self.main_window, self.main_window.db_connection)
-        if dialog.exec() == QDialog.Accepted:
-            self.load_products()
-            self.main_window.show_info_message("Успех", "Продукт успешно добавлен.")
+    def on_more_materials_failed(self, message):
+        self.materials_model.fetch_failed()
+        if self.main_window.db_worker.online:
+            self.on_materials_load_failed(message)
 
-    def show_edit_product_dialog(self, product_id):
-        # Показывает диалог редактирования продукта
-        dialog = ProductDialog(self.main_window, self.main_window.db_connection, product_id)
-        if dialog.exec() == QDialog.Accepted:
-            self.load_products()
-            self.main_window.show_info_message("Успех", "Продукт успешно обновлен.")
+    def import_materials(self):
+        # Массовый импорт материалов из CSV/Excel-файла
+        if not self.main_window.db_worker.is_available():
+            return
 
-    def recalculate_all_prices(self):
-        # Пересчет стоимости для всей продукции
-        if not self.main_window.db_connection:
+        path, _ = QFileDialog.getOpenFileName(self, "Импорт материалов", "", IMPORT_FILE_FILTER)
+        if not path:
             return
 
-        reply = QMessageBox.question(
-            self, 'Подтверждение',
-            'Вы уверены, что хотите пересчитать стоимость для всей продукции?',
-            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        self.import_button.setEnabled(False)
+        reference_cache = self.main_window.reference_cache
+        self.main_window.db_worker.submit(
+            "materials-import",
+            lambda connection: import_materials(connection, path, reference_cache),
+            lambda result: self.on_materials_imported(path, result),
+            self.on_materials_import_failed
         )
 
-        if reply != QMessageBox.Yes:
+    def on_materials_imported(self, path, result):
+        self.import_button.setEnabled(True)
+        self.load_materials()
+        self.main_window.show_import_report(path, result)
+
+    def on_materials_import_failed(self, message):
+        self.import_button.setEnabled(True)
+        self.main_window.show_error_message(
+            "Ошибка импорта",
+            f"Не удалось импортировать материалы: {message}"
+        )
+
+    def apply_saved_row(self, row, material_id=None):
+        # Сохраненная строка попадает в список, только если подходит под текущие фильтры;
+        # без строки (материал уже удален в базе) он только убирается из списка
+        if row is None:
+            if material_id is not None:
+                self.materials_model.remove_row(material_id)
             return
+        material_id, material_type, material_name, unit_price, stock_quantity, min_quantity, package_quantity, unit, type_id = row
+        if self.filter_bar.matches(material_name, type_id, float(unit_price)):
+            self.materials_model.upsert_row(row)
+        else:
+            self.materials_model.remove_row(material_id)
 
-        try:
-            cursor = self.main_window.db_connection.cursor()
+    def apply_remote_changes(self, ids):
+        # Изменения из других копий приложения: перечитываются только измененные строки.
+        # Скрытая страница только помечает список устаревшим - он загрузится при открытии.
+        if not self.isVisible():
+            self.stale = True
+            return
+        if not self.main_window.db_worker.is_available():
+            return
+        if ids is None:
+            self.load_materials()
+            return
 
-            # Получаем список всех продуктов
-            cursor.execute("SELECT id_product FROM products")
-            product_ids = [row[0] for row in cursor.fetchall()]
+        self.remote_changes_seq += 1
+        self.main_window.db_worker.submit(
+            f"materials-changes-{self.remote_changes_seq}",
+            lambda connection: fetch_materials(connection, limit=len(ids), ids=ids)[0],
+            lambda rows: self.on_remote_rows_loaded(ids, rows),
+            lambda message: None,
+            read_only=True,
+            action="materials-changes"
+        )
 
-            if not product_ids:
-                self.main_window.show_info_message("Информация", "Нет продукции для пересчета.")
-                return
+    def on_remote_rows_loaded(self, ids, rows):
+        # Строки, которых больше нет в базе, удаляются из списка
+        for row in rows:
+            self.apply_saved_row(row)
+        found = {row[0] for row in rows}
+        for row_id in ids:
+            if row_id not in found:
+                self.materials_model.remove_row(row_id)
+
+    def set_read_only(self, read_only):
+        # Без связи с сервером список доступен только для просмотра
+        self.read_only = read_only
+        self.add_button.setEnabled(not read_only)
+        self.import_button.setEnabled(not read_only)
+        self.calculator_button.setEnabled(not read_only)
+        self.replenishment_button.setEnabled(not read_only)
 
-            # Пересчитываем стоимость для каждого продукта
-            updated_count = 0
-            for product_id in product_ids:
-                new_price = self.calculate_product_cost(product_id)
+    def show_add_material_dialog(self):
+        # Показывает диалог добавления нового материала
+        dialog = MaterialDialog(self.main_window, self.main_window.db_worker)
+        if dialog.exec() == QDialog.Accepted:
+            self.apply_saved_row(dialog.saved_row)
+            self.main_window.show_info_message("Успех", "Материал успешно добавлен.")
 
-                if new_price is not None:
-                    # Обновляем стоимость в базе данных
-                    update_query = """UPDATE products 
-                                    SET min_cost = %s 
-                                    WHERE id_product = %s"""
-                    cursor.execute(update_query, (new_price, product_id))
-                    updated_count += 1
+    def show_calculator_dialog(self):
+        # Калькулятор сырья для нескольких заданий сразу
+        dialog = MaterialCalculatorDialog(self.main_window, self.main_window.db_worker)
+        dialog.exec()
 
-            self.main_window.db_connection.commit()
-            self.load_products()
+    def show_replenishment_dialog(self):
+        # План закупки материалов, остаток которых ниже минимального
+        dialog = ReplenishmentDialog(self.main_window, self.main_window.db_worker)
+        dialog.exec()
 
-            self.main_window.show_info_message(
-                "Пересчет завершен",
-                f"Стоимость пересчитана для {updated_count} продуктов."
+    def show_edit_material_dialog(self, material_id):
+        # Показывает диалог редактирования материала
+        if self.read_only:
+            self.main_window.show_warning_message(
+                "Нет связи с сервером",
+                "Редактирование недоступно, пока нет связи с сервером."
             )
+            return
+        dialog = MaterialDialog(self.main_window, self.main_window.db_worker, material_id,
+                                self.materials_model.row_for_id(material_id))
+        if dialog.exec() == QDialog.Accepted:
+            self.apply_saved_row(dialog.saved_row, material_id)
+            self.main_window.show_info_message("Успех", "Материал успешно обновлен.")
 
-        except Exception as e:
-            self.main_window.db_connection.rollback()
-            self.main_window.show_error_message(
-                "Ошибка пересчета стоимости",
-                f"Произошла ошибка при пересчете стоимости: {str(e)}"
-            )
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
 
-    def calculate_product_cost(self, product_id):
-        # Рассчитывает стоимость продукта на основе типа продукта и его ширины
-        if not self.main_window.db_connection:
-            return None
 
-        try:
-            cursor = self.main_window.db_connection.cursor()
+class SupplyNoteModel(QAbstractTableModel):
+    # Строки накладной: [id_material, количество]; количество редактируется в таблице
 
-            # Получаем данные о продукте: ширину и коэффициент типа продукта
-            cursor.execute("""
-                SELECT p.width, tp.coefficient_type_product 
-                FROM products p
-                JOIN type_product tp ON p.id_type_product = tp.id_type_product
-                WHERE p.id_product = %s
-            """, (product_id,))
+    COLUMNS = ("Материал", "Ед.", "На складе", "Количество")
+    COUNT_COLUMN = 3
 
-            product_data = cursor.fetchone()
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._lines = []
+        # id_material -> (наименование, единица, остаток)
+        self.materials = {}
+
+    def lines(self):
+        return [tuple(line) for line in self._lines]
+
+    def total_count(self):
+        return sum(count for material_id, count in self._lines)
+
+    def set_materials(self, materials):
+        self.beginResetModel()
+        self.materials = {material_id: (material_name, unit, stock_quantity)
+                          for material_id, material_name, unit, stock_quantity in materials}
+        # строки с удаленными за это время материалами не проводятся
+        self._lines = [line for line in self._lines if line[0] in self.materials]
+        self.endResetModel()
+
+    def update_stock(self, stock):
+        for material_id, stock_quantity in stock.items():
+            if material_id in self.materials:
+                material_name, unit, _ = self.materials[material_id]
+                self.materials[material_id] = (material_name, unit, stock_quantity)
+        if self._lines:
+            self.dataChanged.emit(self.index(0, 2), self.index(len(self._lines) - 1, 2))
+
+    def add_lines(self, lines):
+        if not lines:
+            return
+        first = len(self._lines)
+        self.beginInsertRows(QModelIndex(), first, first + len(lines) - 1)
+        self._lines.extend([material_id, count] for material_id, count in lines)
+        self.endInsertRows()
+
+    def remove_lines(self, rows):
+        for row in sorted(set(rows), reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._lines[row]
+            self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._lines = []
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._lines)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return str(section + 1)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == self.COUNT_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        material_id, count = self._lines[index.row()]
+        column = index.column()
+
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if column == self.COUNT_COLUMN:
+                return count if role == Qt.EditRole else str(count)
+            material = self.materials.get(material_id)
+            if material is None:
+                return "—"
+            return material[column] if column < 2 else str(material[2])
+        if role == Qt.TextAlignmentRole and column >= 2:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or index.column() != self.COUNT_COLUMN:
+            return False
+        try:
+            count = int(value)
+        except (TypeError, ValueError):
+            return False
+        if count <= 0:
+            return False
+        self._lines[index.row()][1] = count
+        self.dataChanged.emit(index, index)
+        return True
 
-            if not product_data:
-                self.main_window.show_warning_message(
-                    "Предупреждение",
-                    f"Для продукта ID {product_id} не найдены данные. Стоимость не будет пересчитана."
-                )
-                return None
 
-            width, coefficient = product_data
+class MaterialChoiceModel(QAbstractListModel):
+    # Список материалов для поля выбора: задается целиком одним вызовом,
+    # без тысяч addItem; id материала - в Qt.UserRole (currentData/findData)
 
-            BASE_COST_PER_METER = 100.0
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
 
-            # Рассчитываем стоимость: ширина * базовая стоимость * коэффициент типа
-            total_cost = width * BASE_COST_PER_METER * coefficient
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
 
-            return round(total_cost, 2)
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
 
-        except Exception as e:
-            self.main_window.show_error_message(
-                "Ошибка расчета стоимости",
-                f"Не удалось рассчитать стоимость для продукта ID {product_id}: {str(e)}"
-            )
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
             return None
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-
-    def get_button_style(self):
-        return """
-            QPushButton {
-                background-color: #2D6033;
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 6px;
-                min-width: 150px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #3E8043;
-            }
-            QPushButton:pressed {
-                background-color: #1D4023;
-            }
-        """
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self._rows[index.row()][1]
+        if role == Qt.UserRole:
+            return self._rows[index.row()][0]
+        return None
 
 
-class MaterialsPage(QWidget):
+class SuppliesPage(QWidget):
+    # Ввод накладной: один поставщик, один склад, много материалов.
+    # Накладная проводится одной транзакцией (post_supply_note).
+
     def __init__(self, main_window):
         super().__init__()
         self.main_window = main_window
+        self.read_only = False
+        self.form_loaded = False
         self.init_ui()
 
     def init_ui(self):
@@ -502,225 +2590,277 @@ class MaterialsPage(QWidget):
         header_layout = QHBoxLayout()
 
         back_btn = QPushButton("Назад")
-        back_btn.setFont(QFont("Gabriola", 12))
-        back_btn.setStyleSheet(self.get_button_style())
+        back_btn.setFont(theme_font(12))
+        set_variant(back_btn, "primary")
         back_btn.clicked.connect(self.main_window.show_main_page)
         header_layout.addWidget(back_btn)
 
-        title_label = QLabel("Управление материалами")
-        title_label.setFont(QFont("Gabriola", 24, QFont.Bold))
-        title_label.setStyleSheet("color: #2D6033;")
+        title_label = QLabel("Поставки")
+        title_label.setFont(theme_font(24, bold=True))
+        set_variant(title_label, "title")
         header_layout.addWidget(title_label)
         header_layout.addStretch()
 
         layout.addLayout(header_layout)
 
-        # Область с материалами (скроллинг)
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setFrameShape(QFrame.NoFrame)
-        self.scroll_area.setStyleSheet("""
-            QScrollArea {
-                border: none;
-            }
-            QScrollBar:vertical {
-                width: 12px;
-                background: #BBD9B2;
-            }
-            QScrollBar::handle:vertical {
-                background: #2D6033;
-                min-height: 20px;
-                border-radius: 6px;
-            }
-        """)
-
-        self.scroll_widget = QWidget()
-        self.scroll_layout = QVBoxLayout()
-        self.scroll_layout.setContentsMargins(10, 10, 10, 10)
-        self.scroll_layout.setSpacing(20)
-        self.scroll_widget.setLayout(self.scroll_layout)
-
-        self.scroll_area.setWidget(self.scroll_widget)
-        layout.addWidget(self.scroll_area)
+        # Шапка накладной
+        note_layout = QHBoxLayout()
+        note_layout.addWidget(QLabel("Поставщик:"))
+        self.supplier_combo = QComboBox()
+        self.supplier_combo.setFont(theme_font(12))
+        self.supplier_combo.setMinimumWidth(250)
+        note_layout.addWidget(self.supplier_combo)
+        note_layout.addWidget(QLabel("Склад:"))
+        self.warehouse_combo = QComboBox()
+        self.warehouse_combo.setFont(theme_font(12))
+        self.warehouse_combo.setMinimumWidth(200)
+        note_layout.addWidget(self.warehouse_combo)
+        note_layout.addStretch()
+        layout.addLayout(note_layout)
+
+        # Добавление строки: материал ищется по части наименования
+        line_layout = QHBoxLayout()
+        line_layout.addWidget(QLabel("Материал:"))
+        self.material_combo = QComboBox()
+        self.material_combo.setFont(theme_font(12))
+        self.material_combo.setEditable(True)
+        self.material_combo.setInsertPolicy(QComboBox.NoInsert)
+        self.material_choices = MaterialChoiceModel(self)
+        self.material_combo.setModel(self.material_choices)
+        self.material_combo.completer().setFilterMode(Qt.MatchContains)
+        self.material_combo.completer().setCompletionMode(QCompleter.PopupCompletion)
+        line_layout.addWidget(self.material_combo, 1)
+        line_layout.addWidget(QLabel("Количество:"))
+        self.count_spin = QSpinBox()
+        self.count_spin.setFont(theme_font(12))
+        self.count_spin.setRange(1, 9999999)
+        line_layout.addWidget(self.count_spin)
+
+        self.add_line_button = QPushButton("Добавить строку")
+        self.add_line_button.setFont(theme_font(12))
+        set_variant(self.add_line_button, "primary")
+        self.add_line_button.clicked.connect(self.add_line)
+        line_layout.addWidget(self.add_line_button)
+        layout.addLayout(line_layout)
+
+        self.note_model = SupplyNoteModel(self)
+        self.note_model.rowsInserted.connect(self.update_total)
+        self.note_model.rowsRemoved.connect(self.update_total)
+        self.note_model.modelReset.connect(self.update_total)
+        self.note_model.dataChanged.connect(self.update_total)
+
+        self.table_view = QTableView()
+        self.table_view.setFont(theme_font(12))
+        self.table_view.setModel(self.note_model)
+        self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        # ResizeToContents на тысяче строк замедляет каждую вставку
+        self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table_view.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table_view.verticalHeader().setDefaultSectionSize(28)
+        layout.addWidget(self.table_view)
+
+        self.total_label = QLabel("")
+        self.total_label.setFont(theme_font(14, bold=True))
+        set_variant(self.total_label, "title")
+        layout.addWidget(self.total_label)
 
-        # Кнопки управления
         buttons_layout = QHBoxLayout()
 
-        self.add_button = QPushButton("Добавить материал")
-        self.add_button.setFont(QFont("Gabriola", 12))
-        self.add_button.setStyleSheet(self.get_button_style())
-        self.add_button.clicked.connect(self.show_add_material_dialog)
-
-        self.refresh_button = QPushButton("Обновить")
-        self.refresh_button.setFont(QFont("Gabriola", 12))
-        self.refresh_button.setStyleSheet(self.get_button_style())
-        self.refresh_button.clicked.connect(self.load_materials)
+        self.remove_line_button = QPushButton("Удалить строки")
+        self.remove_line_button.setFont(theme_font(12))
+        set_variant(self.remove_line_button, "primary")
+        self.remove_line_button.clicked.connect(self.remove_lines)
+        buttons_layout.addWidget(self.remove_line_button)
+
+        self.load_file_button = QPushButton("Загрузить из файла")
+        self.load_file_button.setFont(theme_font(12))
+        set_variant(self.load_file_button, "primary")
+        self.load_file_button.setToolTip("CSV или Excel с колонками " + ", ".join(SUPPLY_NOTE_COLUMNS))
+        self.load_file_button.clicked.connect(self.load_note_file)
+        buttons_layout.addWidget(self.load_file_button)
+
+        self.clear_button = QPushButton("Очистить")
+        self.clear_button.setFont(theme_font(12))
+        set_variant(self.clear_button, "primary")
+        self.clear_button.clicked.connect(self.note_model.clear)
+        buttons_layout.addWidget(self.clear_button)
 
-        buttons_layout.addWidget(self.add_button)
-        buttons_layout.addWidget(self.refresh_button)
         buttons_layout.addStretch()
 
+        self.post_button = QPushButton("Провести накладную")
+        self.post_button.setFont(theme_font(12))
+        set_variant(self.post_button, "primary")
+        self.post_button.clicked.connect(self.post_note)
+        buttons_layout.addWidget(self.post_button)
+
         layout.addLayout(buttons_layout)
+        self.update_total()
 
-    def load_materials(self):
-        # Загрузка списка материалов из базы данных
-        if not self.main_window.db_connection:
+    def open_page(self):
+        # Поставщики, склады и остатки перечитываются при каждом открытии
+        if not self.main_window.db_worker.is_available():
             return
 
-        # Очищаем предыдущие данные
-        for i in reversed(range(self.scroll_layout.count())):
-            widget = self.scroll_layout.itemAt(i).widget()
-            if widget is not None:
-                widget.deleteLater()
+        self.set_busy(True)
+        self.main_window.db_worker.submit(
+            "supply-form",
+            fetch_supply_form,
+            self.on_form_loaded,
+            self.on_form_load_failed,
+            read_only=True,
+            action="supply-form"
+        )
+
+    def on_form_loaded(self, result):
+        suppliers, warehouses, materials = result
+        self.set_busy(False)
+        self.fill_combo(self.supplier_combo, suppliers)
+        self.fill_combo(self.warehouse_combo, warehouses)
+
+        material_id = self.material_combo.currentData()
+        self.material_choices.set_rows([(row[0], f"{row[1]} ({row[2]})") for row in materials])
+        self.material_combo.setCurrentIndex(max(self.material_combo.findData(material_id), 0))
+
+        self.note_model.set_materials(materials)
+        self.form_loaded = True
+
+    def fill_combo(self, combo, rows):
+        # Выбранное значение сохраняется при повторной загрузке
+        selected = combo.currentData()
+        combo.clear()
+        for row_id, name in rows:
+            combo.addItem(name, row_id)
+        index = combo.findData(selected)
+        if index >= 0:
+            combo.setCurrentIndex(index)
+
+    def on_form_load_failed(self, message):
+        self.set_busy(False)
+        self.main_window.show_error_message(
+            "Ошибка загрузки данных",
+            f"Не удалось загрузить поставщиков и материалы: {message}"
+        )
+
+    def add_line(self):
+        # Текст поля должен совпадать с материалом из списка
+        index = self.material_combo.findText(self.material_combo.currentText())
+        if index < 0:
+            self.main_window.show_warning_message("Проверка данных", "Выберите материал из списка.")
+            return
+        self.note_model.add_lines([(self.material_combo.itemData(index), self.count_spin.value())])
+        self.table_view.scrollToBottom()
+        self.material_combo.setFocus()
+        self.material_combo.lineEdit().selectAll()
+
+    def remove_lines(self):
+        rows = [index.row() for index in self.table_view.selectionModel().selectedRows()]
+        if not rows and self.table_view.currentIndex().isValid():
+            rows = [self.table_view.currentIndex().row()]
+        self.note_model.remove_lines(rows)
+
+    def load_note_file(self):
+        # Строки накладной из файла добавляются к уже введенным
+        if not self.form_loaded:
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Загрузка накладной", "", IMPORT_FILE_FILTER)
+        if not path:
+            return
 
+        material_ids = {}
+        for material_id, (material_name, unit, stock_quantity) in self.note_model.materials.items():
+            material_ids.setdefault(material_name.lower(), material_id)
         try:
-            cursor = self.main_window.db_connection.cursor()
-
-            # Получаем данные о материалах
-            query = """SELECT 
-                    m.id_material,
-                    tm.type_material,
-                    m.material_name,
-                    m.unit_price,
-                    m.stock_quantity,
-                    m.min_quantity,
-                    m.package_quantity,
-                    m.unit
-                FROM materials m
-                JOIN type_material tm ON m.id_type_material = tm.id_type_material
-                ORDER BY m.material_name"""
-
-            cursor.execute(query)
-            materials = cursor.fetchall()
-
-            if not materials:
-                self.main_window.show_info_message("Информация", "В базе данных нет материалов.")
-                return
+            lines, errors = read_supply_note(path, material_ids)
+        except (OSError, ValueError) as e:
+            self.main_window.show_error_message("Ошибка загрузки", f"Не удалось прочитать файл: {str(e)}")
+            return
 
-            for material in materials:
-                self.add_material_card(*material)
+        self.note_model.add_lines(lines)
+        if errors:
+            text = f"Добавлено строк: {len(lines)}, строк с ошибками: {len(errors)}."
+            try:
+                text += f"\nОтчет об ошибках: {write_import_error_report(path, errors)}"
+            except OSError as e:
+                text += f"\nНе удалось сохранить отчет об ошибках: {str(e)}"
+            self.main_window.show_warning_message("Загрузка накладной", text)
+
+    def post_note(self):
+        if self.read_only or not self.main_window.db_worker.is_available():
+            return
 
-        except Exception as e:
-            self.main_window.show_error_message(
-                "Ошибка загрузки материалов",
-                f"Произошла ошибка при загрузке материалов: {str(e)}"
-            )
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-
-    def add_material_card(self, material_id, material_type, material_name, unit_price, stock_quantity, min_quantity, package_quantity, unit):
-        # Добавляет карточку материала в интерфейс
-        card = QFrame()
-        card.setFrameShape(QFrame.StyledPanel)
-        card.setStyleSheet("""
-            QFrame {
-                background-color: #E8F4E5;
-                border-radius: 10px;
-                padding: 20px;
-                border: 1px solid #BBD9B2;
-            }
-        """)
-        card.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
-
-        layout = QGridLayout()
-        layout.setContentsMargins(15, 15, 15, 15)
-        layout.setSpacing(15)
-        card.setLayout(layout)
-
-        type_label = QLabel(material_type)
-        type_label.setFont(QFont("Gabriola", 14, QFont.Bold))
-        type_label.setStyleSheet("color: #2D6033;")
-
-        name_label = QLabel(material_name)
-        name_label.setFont(QFont("Gabriola", 16, QFont.Bold))
-        name_label.setStyleSheet("color: #1D4023;")
-
-        row1_layout = QHBoxLayout()
-        row1_layout.addWidget(type_label)
-        row1_layout.addWidget(name_label)
-        row1_layout.addStretch()
-
-        price_label = QLabel(f"{unit_price:.2f} ₽/{unit}")
-        price_label.setFont(QFont("Gabriola", 14, QFont.Bold))
-        price_label.setStyleSheet("color: #2D6033;")
-        row1_layout.addWidget(price_label)
-
-        layout.addLayout(row1_layout, 0, 0)
-
-        stock_label = QLabel(f"На складе: {stock_quantity} {unit}")
-        stock_label.setFont(QFont("Gabriola", 13))
-        stock_label.setStyleSheet("color: #555555;")
-        layout.addWidget(stock_label, 1, 0)
-
-        details_layout = QHBoxLayout()
-        details_layout.setSpacing(30)
-
-        min_qty_label = QLabel(f"Мин. заказ: {min_quantity} {unit}")
-        min_qty_label.setFont(QFont("Gabriola", 13))
-        min_qty_label.setStyleSheet("color: #555555;")
-        details_layout.addWidget(min_qty_label)
-
-        package_label = QLabel(f"Упаковка: {package_quantity} {unit}")
-        package_label.setFont(QFont("Gabriola", 13))
-        package_label.setStyleSheet("color: #555555;")
-        details_layout.addWidget(package_label)
-
-        details_layout.addStretch()
-        layout.addLayout(details_layout, 2, 0)
-
-        edit_button = QPushButton("Редактировать")
-        edit_button.setFont(QFont("Gabriola", 12))
-        edit_button.setStyleSheet(self.get_button_style())
-        edit_button.clicked.connect(lambda: self.show_edit_material_dialog(material_id))
-        layout.addWidget(edit_button, 3, 0, alignment=Qt.AlignRight)
-
-        # Сохраняем ID материала в карточке
-        card.material_id = material_id
-
-        self.scroll_layout.addWidget(card)
+        supplier_id = self.supplier_combo.currentData()
+        warehouse_id = self.warehouse_combo.currentData()
+        lines = self.note_model.lines()
+        try:
+            validate_supply_note(supplier_id, warehouse_id, lines)
+        except ValueError as e:
+            self.main_window.show_warning_message("Проверка данных", str(e))
+            return
 
-    def show_add_material_dialog(self):
-        # Показывает диалог добавления нового материала
-        dialog = MaterialDialog(self.main_window, self.main_window.db_connection)
-        if dialog.exec() == QDialog.Accepted:
-            self.load_materials()
-            self.main_window.show_info_message("Успех", "Материал успешно добавлен.")
+        reply = QMessageBox.question(
+            self, 'Подтверждение',
+            f'Провести накладную: {self.supplier_combo.currentText()}, склад {self.warehouse_combo.currentText()}, '
+            f'строк {len(lines)}, единиц {self.note_model.total_count()}?',
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
 
-    def show_edit_material_dialog(self, material_id):
-        # Показывает диалог редактирования материала
-        dialog = MaterialDialog(self.main_window, self.main_window.db_connection, material_id)
-        if dialog.exec() == QDialog.Accepted:
-            self.load_materials()
-            self.main_window.show_info_message("Успех", "Материал успешно обновлен.")
+        self.set_busy(True)
+        self.main_window.db_worker.submit(
+            "supply-post",
+            lambda connection: post_supply_note(connection, supplier_id, warehouse_id, lines),
+            self.on_note_posted,
+            self.on_note_post_failed,
+            action="supply-post"
+        )
 
-    def get_button_style(self):
-        return """
-            QPushButton {
-                background-color: #2D6033;
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 6px;
-                min-width: 150px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #3E8043;
-            }
-            QPushButton:pressed {
-                background-color: #1D4023;
-            }
-        """
+    def on_note_posted(self, result):
+        inserted, stock = result
+        self.set_busy(False)
+        self.note_model.clear()
+        self.note_model.update_stock(stock)
+        self.main_window.show_info_message(
+            "Накладная проведена",
+            f"Добавлено строк поставок: {inserted}, изменено остатков материалов: {len(stock)}."
+        )
+
+    def on_note_post_failed(self, message):
+        self.set_busy(False)
+        self.main_window.show_error_message(
+            "Ошибка проведения",
+            f"Не удалось провести накладную: {message}"
+        )
+
+    def update_total(self, *args):
+        self.total_label.setText(
+            f"Строк: {self.note_model.rowCount()}, единиц: {self.note_model.total_count()}"
+        )
+
+    def set_busy(self, busy):
+        self.post_button.setEnabled(not busy and not self.read_only)
+        self.load_file_button.setEnabled(not busy)
+
+    def set_read_only(self, read_only):
+        # Без связи с сервером накладную можно набирать, но не провести
+        self.read_only = read_only
+        self.post_button.setEnabled(not read_only)
 
 
 class ProductDialog(QDialog):
     # Диалог для добавления/редактирования продукта
 
-    def __init__(self, parent=None, db_connection=None, product_id=None):
+    def __init__(self, parent=None, db_worker=None, product_id=None, product_row=None):
         super().__init__(parent)
-        self.db_connection = db_connection
+        self.db_worker = db_worker
+        self.reference_cache = parent.reference_cache
+        self.task_key = f"product-dialog-{id(self)}"
         self.product_id = product_id
+        # Строка из списка продукции, если она уже загружена
+        self.product_row = product_row
+        # Строки справочника типов продукции (id, название, коэффициент)
+        self.product_types = []
+        self.saved_row = None
         self.setModal(True)
 
         if product_id:
@@ -744,31 +2884,46 @@ class ProductDialog(QDialog):
         self.form_layout.setSpacing(15)
 
         self.articul_edit = QLineEdit()
-        self.articul_edit.setFont(QFont("Gabriola", 12))
+        self.articul_edit.setFont(theme_font(12))
         self.form_layout.addRow("Артикул:", self.articul_edit)
 
         self.type_combo = QComboBox()
-        self.type_combo.setFont(QFont("Gabriola", 12))
+        self.type_combo.setFont(theme_font(12))
         self.form_layout.addRow("Тип продукта:", self.type_combo)
 
         self.name_edit = QLineEdit()
-        self.name_edit.setFont(QFont("Gabriola", 12))
+        self.name_edit.setFont(theme_font(12))
         self.form_layout.addRow("Наименование:", self.name_edit)
 
         self.min_cost_spin = QDoubleSpinBox()
-        self.min_cost_spin.setFont(QFont("Gabriola", 12))
+        self.min_cost_spin.setFont(theme_font(12))
         self.min_cost_spin.setRange(0, 999999.99)
         self.min_cost_spin.setDecimals(2)
         self.min_cost_spin.setPrefix("₽ ")
         self.form_layout.addRow("Мин. стоимость:", self.min_cost_spin)
 
         self.width_spin = QDoubleSpinBox()
-        self.width_spin.setFont(QFont("Gabriola", 12))
+        self.width_spin.setFont(theme_font(12))
         self.width_spin.setRange(0.01, 10.0)
         self.width_spin.setDecimals(2)
         self.width_spin.setSuffix(" м")
         self.form_layout.addRow("Ширина:", self.width_spin)
 
+        # Стоимость по правилу пересчета цен, из коэффициента типа в кэше справочников
+        cost_layout = QHBoxLayout()
+        self.calculated_cost_label = QLabel("—")
+        self.calculated_cost_label.setFont(theme_font(12))
+        cost_layout.addWidget(self.calculated_cost_label)
+        cost_layout.addStretch()
+        self.apply_cost_button = QPushButton("Подставить")
+        self.apply_cost_button.setEnabled(False)
+        self.apply_cost_button.clicked.connect(self.apply_calculated_cost)
+        cost_layout.addWidget(self.apply_cost_button)
+        self.form_layout.addRow("Расчетная стоимость:", cost_layout)
+
+        self.type_combo.currentIndexChanged.connect(self.update_calculated_cost)
+        self.width_spin.valueChanged.connect(self.update_calculated_cost)
+
         layout.addLayout(self.form_layout)
 
         self.button_box = QDialogButtonBox(
@@ -780,50 +2935,83 @@ class ProductDialog(QDialog):
         layout.addWidget(self.button_box)
 
     def load_data(self):
-        # Загрузка данных в форму
-        if not self.db_connection:
+        # Загрузка данных в форму. Если справочник есть в кэше, а строка продукта
+        # уже загружена в список, форма заполняется сразу, без запросов к БД.
+        types = self.reference_cache.peek("type_product")
+        if types is not None and (not self.is_edit or self.product_row is not None):
+            product_data = None
+            if self.is_edit:
+                product_id, product_type, product_name, min_cost, articul, width, type_id = self.product_row
+                product_data = (articul, type_id, product_name, min_cost, width)
+            self.on_data_loaded((types, product_data))
             return
 
-        try:
-            cursor = self.db_connection.cursor()
-
-            # Загружаем типы продуктов
-            cursor.execute("SELECT id_type_product, type_product FROM type_product ORDER BY type_product")
-            types = cursor.fetchall()
-
-            self.type_combo.clear()
-            for type_id, type_name in types:
-                self.type_combo.addItem(type_name, type_id)
-
-            # Если это редактирование, загружаем данные продукта
-            if self.is_edit and self.product_id:
-                cursor.execute("""
-                    SELECT articul, id_type_product, product_name, min_cost, width 
-                    FROM products 
-                    WHERE id_product = %s
-                """, (self.product_id,))
-
-                product_data = cursor.fetchone()
-                if product_data:
-                    self.articul_edit.setText(product_data[0])
-                    self.name_edit.setText(product_data[2])
-                    self.min_cost_spin.setValue(float(product_data[3]))
-                    self.width_spin.setValue(float(product_data[4]))
-
-                    # Устанавливаем правильный тип продукта
-                    type_index = self.type_combo.findData(product_data[1])
-                    if type_index >= 0:
-                        self.type_combo.setCurrentIndex(type_index)
+        # Иначе загружаем в фоне; до загрузки кнопка OK недоступна
+        if not self.db_worker or not self.db_worker.is_available():
+            return
 
-        except Exception as e:
-            self.parent().show_error_message(
-                "Ошибка загрузки данных",
-                f"Не удалось загрузить данные: {str(e)}"
-            )
-            self.reject()
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
+        self.set_busy(True)
+        product_id = self.product_id if self.is_edit else None
+        reference_cache = self.reference_cache
+        self.db_worker.submit(
+            self.task_key,
+            lambda connection: fetch_product_form(connection, reference_cache, product_id),
+            self.on_data_loaded,
+            self.on_data_load_failed,
+            read_only=True,
+            action="product-form"
+        )
+
+    def on_data_loaded(self, result):
+        types, product_data = result
+        self.set_busy(False)
+
+        # Типы продуктов
+        self.product_types = types
+        self.type_combo.clear()
+        for type_row in types:
+            self.type_combo.addItem(type_row[1], type_row[0])
+
+        # Если это редактирование, заполняем данные продукта
+        if product_data:
+            self.articul_edit.setText(product_data[0])
+            self.name_edit.setText(product_data[2])
+            self.min_cost_spin.setValue(float(product_data[3]))
+            self.width_spin.setValue(float(product_data[4]))
+
+            # Устанавливаем правильный тип продукта
+            type_index = self.type_combo.findData(product_data[1])
+            if type_index >= 0:
+                self.type_combo.setCurrentIndex(type_index)
+
+        self.update_calculated_cost()
+
+    def update_calculated_cost(self):
+        cost = calculate_product_cost(self.width_spin.value(), self.type_combo.currentData(), self.product_types)
+        self.calculated_cost_label.setText("—" if cost is None else f"{cost:.2f} ₽")
+        self.apply_cost_button.setEnabled(cost is not None)
+
+    def apply_calculated_cost(self):
+        cost = calculate_product_cost(self.width_spin.value(), self.type_combo.currentData(), self.product_types)
+        if cost is not None:
+            self.min_cost_spin.setValue(cost)
+
+    def on_data_load_failed(self, message):
+        self.set_busy(False)
+        self.parent().show_error_message(
+            "Ошибка загрузки данных",
+            f"Не удалось загрузить данные: {message}"
+        )
+        self.reject()
+
+    def set_busy(self, busy):
+        self.button_box.button(QDialogButtonBox.Ok).setEnabled(not busy)
+
+    def done(self, result):
+        # Закрытие диалога отменяет его незавершенные запросы
+        if self.db_worker:
+            self.db_worker.cancel(self.task_key)
+        super().done(result)
 
     def validate_and_accept(self):
         # Проверка данных и сохранение
@@ -835,76 +3023,57 @@ class ProductDialog(QDialog):
             type_id = self.type_combo.currentData()
 
             # Проверка обязательных полей
-            if not articul:
-                raise ValueError("Артикул не может быть пустым")
-            if not product_name:
-                raise ValueError("Наименование не может быть пустым")
-            if type_id is None:
-                raise ValueError("Не выбран тип продукта")
-            if min_cost <= 0:
-                raise ValueError("Стоимость должна быть положительной")
-            if width <= 0:
-                raise ValueError("Ширина должна быть положительной")
+            validate_product_fields(articul, type_id, product_name, min_cost, width)
 
             # Сохранение данных
-            if self.save_product(articul, type_id, product_name, min_cost, width):
-                self.accept()
+            self.save_product(articul, type_id, product_name, min_cost, width)
 
         except ValueError as e:
             self.parent().show_warning_message("Проверка данных", str(e))
-        except Exception as e:
-            self.parent().show_error_message(
-                "Ошибка сохранения",
-                f"Не удалось сохранить продукт: {str(e)}"
-            )
 
     def save_product(self, articul, type_id, product_name, min_cost, width):
-        # Сохранение продукта в базу данных
-        if not self.db_connection:
-            return False
+        # Сохранение продукта в базу данных (в фоне); диалог закрывается после успешной записи
+        if not self.db_worker or not self.db_worker.is_available():
+            return
 
-        try:
-            cursor = self.db_connection.cursor()
-
-            if self.is_edit and self.product_id:
-                # Обновление существующего продукта
-                query = """
-                    UPDATE products 
-                    SET articul = %s, 
-                        id_type_product = %s, 
-                        product_name = %s, 
-                        min_cost = %s, 
-                        width = %s
-                    WHERE id_product = %s
-                """
-                cursor.execute(query, (articul, type_id, product_name, min_cost, width, self.product_id))
-            else:
-                # Добавление нового продукта
-                query = """
-                    INSERT INTO products 
-                    (articul, id_type_product, product_name, min_cost, width)
-                    VALUES (%s, %s, %s, %s, %s)
-                """
-                cursor.execute(query, (articul, type_id, product_name, min_cost, width))
-
-            self.db_connection.commit()
-            return True
+        self.set_busy(True)
+        product_id = self.product_id if self.is_edit else None
+        self.db_worker.submit(
+            self.task_key,
+            lambda connection: save_product_row(connection, product_id, articul, type_id, product_name, min_cost, width),
+            self.on_saved,
+            self.on_save_failed,
+            action="product-save"
+        )
 
-        except Exception as e:
-            self.db_connection.rollback()
-            raise e
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
+    def on_saved(self, result):
+        # Сохраненная строка нужна странице, чтобы обновить только ее
+        self.saved_row = result
+        self.set_busy(False)
+        self.accept()
+
+    def on_save_failed(self, message):
+        self.set_busy(False)
+        self.parent().show_error_message(
+            "Ошибка сохранения",
+            f"Не удалось сохранить продукт: {message}"
+        )
 
 
 class MaterialDialog(QDialog):
     # Диалог для добавления/редактирования материала
 
-    def __init__(self, parent=None, db_connection=None, material_id=None):
+    def __init__(self, parent=None, db_worker=None, material_id=None, material_row=None):
         super().__init__(parent)
-        self.db_connection = db_connection
+        self.db_worker = db_worker
+        self.reference_cache = parent.reference_cache
+        self.task_key = f"material-dialog-{id(self)}"
         self.material_id = material_id
+        # Строка из списка материалов, если она уже загружена
+        self.material_row = material_row
+        # Остаток, показанный в форме: при сохранении в журнал пишется разница с ним
+        self.loaded_stock_quantity = None
+        self.saved_row = None
         self.setModal(True)
 
         if material_id:
@@ -927,38 +3096,40 @@ class MaterialDialog(QDialog):
         self.form_layout.setSpacing(15)
 
         self.name_edit = QLineEdit()
-        self.name_edit.setFont(QFont("Gabriola", 12))
+        self.name_edit.setFont(theme_font(12))
         self.form_layout.addRow("Наименование:", self.name_edit)
 
         self.type_combo = QComboBox()
-        self.type_combo.setFont(QFont("Gabriola", 12))
+        self.type_combo.setFont(theme_font(12))
         self.form_layout.addRow("Тип материала:", self.type_combo)
 
         self.price_spin = QDoubleSpinBox()
-        self.price_spin.setFont(QFont("Gabriola", 12))
+        self.price_spin.setFont(theme_font(12))
         self.price_spin.setRange(0, 999999.99)
         self.price_spin.setDecimals(2)
         self.price_spin.setPrefix("₽ ")
         self.form_layout.addRow("Цена за единицу:", self.price_spin)
 
         self.stock_spin = QSpinBox()
-        self.stock_spin.setFont(QFont("Gabriola", 12))
+        self.stock_spin.setFont(theme_font(12))
         self.stock_spin.setRange(0, 999999)
+        self.stock_spin.setToolTip("Изменение остатка записывается в журнал движения материалов как корректировка; "
+                                   "приход и расход, проведенные другими пользователями, сохраняются")
         self.form_layout.addRow("Количество на складе:", self.stock_spin)
 
         self.min_qty_spin = QSpinBox()
-        self.min_qty_spin.setFont(QFont("Gabriola", 12))
+        self.min_qty_spin.setFont(theme_font(12))
         self.min_qty_spin.setRange(0, 999999)
         self.form_layout.addRow("Минимальное количество:", self.min_qty_spin)
 
         self.package_spin = QSpinBox()
-        self.package_spin.setFont(QFont("Gabriola", 12))
+        self.package_spin.setFont(theme_font(12))
         self.package_spin.setRange(0, 999999)
         self.form_layout.addRow("Количество в упаковке:", self.package_spin)
 
         self.unit_combo = QComboBox()
-        self.unit_combo.setFont(QFont("Gabriola", 12))
-        self.unit_combo.addItems(["шт", "м", "кг", "л", "упак"])
+        self.unit_combo.setFont(theme_font(12))
+        self.unit_combo.addItems(MATERIAL_UNITS)
         self.form_layout.addRow("Единица измерения:", self.unit_combo)
 
         layout.addLayout(self.form_layout)
@@ -972,57 +3143,79 @@ class MaterialDialog(QDialog):
         layout.addWidget(self.button_box)
 
     def load_data(self):
-        # Загрузка данных в форму
-        if not self.db_connection:
+        # Загрузка данных в форму. Если справочник есть в кэше, а строка материала
+        # уже загружена в список, форма заполняется сразу, без запросов к БД.
+        types = self.reference_cache.peek("type_material")
+        if types is not None and (not self.is_edit or self.material_row is not None):
+            material_data = None
+            if self.is_edit:
+                (material_id, material_type, material_name, unit_price, stock_quantity,
+                 min_quantity, package_quantity, unit, type_id) = self.material_row
+                material_data = (material_name, type_id, unit_price, stock_quantity,
+                                 min_quantity, package_quantity, unit)
+            self.on_data_loaded((types, material_data))
             return
 
-        try:
-            cursor = self.db_connection.cursor()
-
-            # Загружаем типы материалов
-            cursor.execute("SELECT id_type_material, type_material FROM type_material ORDER BY type_material")
-            types = cursor.fetchall()
-
-            self.type_combo.clear()
-            for type_id, type_name in types:
-                self.type_combo.addItem(type_name, type_id)
-
-            # Если это редактирование, загружаем данные материала
-            if self.is_edit and self.material_id:
-                cursor.execute("""
-                    SELECT material_name, id_type_material, unit_price, 
-                           stock_quantity, min_quantity, package_quantity, unit 
-                    FROM materials 
-                    WHERE id_material = %s
-                """, (self.material_id,))
-
-                material_data = cursor.fetchone()
-                if material_data:
-                    self.name_edit.setText(material_data[0])
-                    self.price_spin.setValue(float(material_data[2]))
-                    self.stock_spin.setValue(material_data[3])
-                    self.min_qty_spin.setValue(material_data[4])
-                    self.package_spin.setValue(material_data[5])
-
-                    # Устанавливаем правильный тип материала
-                    type_index = self.type_combo.findData(material_data[1])
-                    if type_index >= 0:
-                        self.type_combo.setCurrentIndex(type_index)
-
-                    # Устанавливаем правильную единицу измерения
-                    unit_index = self.unit_combo.findText(material_data[6])
-                    if unit_index >= 0:
-                        self.unit_combo.setCurrentIndex(unit_index)
+        # Иначе загружаем в фоне; до загрузки кнопка OK недоступна
+        if not self.db_worker or not self.db_worker.is_available():
+            return
 
-        except Exception as e:
-            self.parent().show_error_message(
-                "Ошибка загрузки данных",
-                f"Не удалось загрузить данные: {str(e)}"
-            )
-            self.reject()
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
+        self.set_busy(True)
+        material_id = self.material_id if self.is_edit else None
+        reference_cache = self.reference_cache
+        self.db_worker.submit(
+            self.task_key,
+            lambda connection: fetch_material_form(connection, reference_cache, material_id),
+            self.on_data_loaded,
+            self.on_data_load_failed,
+            read_only=True,
+            action="material-form"
+        )
+
+    def on_data_loaded(self, result):
+        types, material_data = result
+        self.set_busy(False)
+
+        # Типы материалов
+        self.type_combo.clear()
+        for type_row in types:
+            self.type_combo.addItem(type_row[1], type_row[0])
+
+        # Если это редактирование, заполняем данные материала
+        if material_data:
+            self.name_edit.setText(material_data[0])
+            self.price_spin.setValue(float(material_data[2]))
+            self.stock_spin.setValue(material_data[3])
+            self.loaded_stock_quantity = material_data[3]
+            self.min_qty_spin.setValue(material_data[4])
+            self.package_spin.setValue(material_data[5])
+
+            # Устанавливаем правильный тип материала
+            type_index = self.type_combo.findData(material_data[1])
+            if type_index >= 0:
+                self.type_combo.setCurrentIndex(type_index)
+
+            # Устанавливаем правильную единицу измерения
+            unit_index = self.unit_combo.findText(material_data[6])
+            if unit_index >= 0:
+                self.unit_combo.setCurrentIndex(unit_index)
+
+    def on_data_load_failed(self, message):
+        self.set_busy(False)
+        self.parent().show_error_message(
+            "Ошибка загрузки данных",
+            f"Не удалось загрузить данные: {message}"
+        )
+        self.reject()
+
+    def set_busy(self, busy):
+        self.button_box.button(QDialogButtonBox.Ok).setEnabled(not busy)
+
+    def done(self, result):
+        # Закрытие диалога отменяет его незавершенные запросы
+        if self.db_worker:
+            self.db_worker.cancel(self.task_key)
+        super().done(result)
 
     def validate_and_accept(self):
         # Проверка данных и сохранение
@@ -1036,77 +3229,611 @@ class MaterialDialog(QDialog):
             type_id = self.type_combo.currentData()
 
             # Проверка обязательных полей
-            if not material_name:
-                raise ValueError("Наименование не может быть пустым")
-            if type_id is None:
-                raise ValueError("Не выбран тип материала")
-            if unit_price <= 0:
-                raise ValueError("Цена должна быть положительной")
-            if min_quantity <= 0:
-                raise ValueError("Минимальное количество должно быть положительным")
-            if package_quantity <= 0:
-                raise ValueError("Количество в упаковке должно быть положительным")
+            validate_material_fields(material_name, type_id, unit_price, stock_quantity,
+                                     min_quantity, package_quantity, unit)
 
             # Сохранение данных
-            if self.save_material(material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit):
-                self.accept()
+            self.save_material(material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit)
 
         except ValueError as e:
             self.parent().show_warning_message("Проверка данных", str(e))
-        except Exception as e:
-            self.parent().show_error_message(
-                "Ошибка сохранения",
-                f"Не удалось сохранить материал: {str(e)}"
-            )
 
     def save_material(self, material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit):
-        # Сохранение материала в базу данных
-        if not self.db_connection:
-            return False
+        # Сохранение материала в базу данных (в фоне); диалог закрывается после успешной записи
+        if not self.db_worker or not self.db_worker.is_available():
+            return
 
-        try:
-            cursor = self.db_connection.cursor()
-
-            if self.is_edit and self.material_id:
-                # Обновление существующего материала
-                query = """
-                    UPDATE materials 
-                    SET material_name = %s, 
-                        id_type_material = %s, 
-                        unit_price = %s, 
-                        stock_quantity = %s, 
-                        min_quantity = %s, 
-                        package_quantity = %s, 
-                        unit = %s
-                    WHERE id_material = %s
-                """
-                cursor.execute(query, (material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit, self.material_id))
+        self.set_busy(True)
+        material_id = self.material_id if self.is_edit else None
+        loaded_stock_quantity = self.loaded_stock_quantity
+        self.db_worker.submit(
+            self.task_key,
+            lambda connection: save_material_row(connection, material_id, material_name, type_id, unit_price,
+                                                 stock_quantity, min_quantity, package_quantity, unit,
+                                                 loaded_stock_quantity),
+            self.on_saved,
+            self.on_save_failed,
+            action="material-save"
+        )
+
+    def on_saved(self, result):
+        # Сохраненная строка нужна странице, чтобы обновить только ее
+        self.saved_row = result
+        self.set_busy(False)
+        self.accept()
+
+    def on_save_failed(self, message):
+        self.set_busy(False)
+        self.parent().show_error_message(
+            "Ошибка сохранения",
+            f"Не удалось сохранить материал: {message}"
+        )
+
+class MaterialCalculatorDialog(QDialog):
+    # Калькулятор сырья: несколько заданий (тип продукции, тип материала,
+    # количество, размеры) рассчитываются одним запросом
+
+    COLUMNS = ("Тип продукции", "Тип материала", "Материал", "Количество",
+               "Ширина, м", "Длина, м", "Сырье", "Упаковок")
+    RESULT_COLUMN = 6
+
+    def __init__(self, parent=None, db_worker=None):
+        super().__init__(parent)
+        self.db_worker = db_worker
+        self.reference_cache = parent.reference_cache
+        self.task_key = f"material-calculator-{id(self)}"
+        self.product_types = []
+        self.material_types = []
+        self.materials_by_type = {}
+        self.setModal(True)
+        self.setWindowTitle("Расчет сырья")
+        self.setMinimumSize(900, 500)
+        self.init_ui()
+        self.load_data()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setFont(theme_font(12))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        layout.addWidget(self.table)
+
+        buttons_layout = QHBoxLayout()
+
+        self.add_row_button = QPushButton("Добавить строку")
+        self.add_row_button.clicked.connect(self.add_row)
+        buttons_layout.addWidget(self.add_row_button)
+
+        self.remove_row_button = QPushButton("Удалить строку")
+        self.remove_row_button.clicked.connect(self.remove_row)
+        buttons_layout.addWidget(self.remove_row_button)
+
+        buttons_layout.addStretch()
+
+        self.calculate_button = QPushButton("Рассчитать")
+        self.calculate_button.clicked.connect(self.calculate)
+        buttons_layout.addWidget(self.calculate_button)
+
+        self.write_off_button = QPushButton("Списать со склада")
+        self.write_off_button.setToolTip("Рассчитать и списать сырье по строкам с выбранным материалом")
+        self.write_off_button.clicked.connect(self.write_off)
+        buttons_layout.addWidget(self.write_off_button)
+
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        self.button_box.rejected.connect(self.reject)
+        buttons_layout.addWidget(self.button_box)
+
+        layout.addLayout(buttons_layout)
+        self.set_busy(True)
+
+    def load_data(self):
+        # Справочники и список материалов загружаются в фоне
+        if not self.db_worker or not self.db_worker.is_available():
+            return
+
+        reference_cache = self.reference_cache
+        self.db_worker.submit(
+            self.task_key,
+            lambda connection: fetch_calculator_data(connection, reference_cache),
+            self.on_data_loaded,
+            self.on_data_load_failed,
+            read_only=True,
+            action="material-calculator"
+        )
+
+    def on_data_loaded(self, result):
+        self.product_types, self.material_types, materials = result
+        self.materials_by_type = {}
+        for material_id, material_name, type_id, package_quantity in materials:
+            self.materials_by_type.setdefault(type_id, []).append((material_id, material_name, package_quantity))
+
+        self.set_busy(False)
+        self.add_row()
+
+    def on_data_load_failed(self, message):
+        self.parent().show_error_message(
+            "Ошибка загрузки данных",
+            f"Не удалось загрузить данные: {message}"
+        )
+        self.reject()
+
+    def add_row(self):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+
+        product_combo = QComboBox()
+        for type_row in self.product_types:
+            product_combo.addItem(type_row[1], type_row[0])
+        self.table.setCellWidget(row, 0, product_combo)
+
+        material_type_combo = QComboBox()
+        for type_row in self.material_types:
+            material_type_combo.addItem(type_row[1], type_row[0])
+        self.table.setCellWidget(row, 1, material_type_combo)
+
+        material_combo = QComboBox()
+        self.table.setCellWidget(row, 2, material_combo)
+        material_type_combo.currentIndexChanged.connect(
+            lambda index: self.fill_materials(material_combo, material_type_combo.currentData())
+        )
+        self.fill_materials(material_combo, material_type_combo.currentData())
+
+        quantity_spin = QSpinBox()
+        quantity_spin.setRange(1, 9999999)
+        self.table.setCellWidget(row, 3, quantity_spin)
+
+        for column in (4, 5):
+            size_spin = QDoubleSpinBox()
+            size_spin.setRange(0.01, 9999.99)
+            size_spin.setDecimals(2)
+            size_spin.setValue(1)
+            self.table.setCellWidget(row, column, size_spin)
+
+        for column in (self.RESULT_COLUMN, self.RESULT_COLUMN + 1):
+            item = QTableWidgetItem("")
+            item.setFlags(Qt.ItemIsEnabled)
+            item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.table.setItem(row, column, item)
+
+    def fill_materials(self, material_combo, type_id):
+        # Материал указывать не обязательно: без него упаковки не считаются
+        material_combo.clear()
+        material_combo.addItem("— без упаковки —", None)
+        for material_id, material_name, package_quantity in self.materials_by_type.get(type_id, []):
+            material_combo.addItem(f"{material_name} (в упаковке {package_quantity})", material_id)
+
+    def remove_row(self):
+        row = self.table.currentRow()
+        if row >= 0:
+            self.table.removeRow(row)
+
+    def jobs(self):
+        jobs = []
+        for row in range(self.table.rowCount()):
+            jobs.append((
+                self.table.cellWidget(row, 0).currentData(),
+                self.table.cellWidget(row, 1).currentData(),
+                self.table.cellWidget(row, 3).value(),
+                self.table.cellWidget(row, 4).value(),
+                self.table.cellWidget(row, 5).value(),
+                self.table.cellWidget(row, 2).currentData(),
+            ))
+        return jobs
+
+    def calculate(self):
+        jobs = self.jobs()
+        if not jobs or not self.db_worker or not self.db_worker.is_available():
+            return
+
+        self.set_busy(True)
+        self.db_worker.submit(
+            self.task_key,
+            lambda connection: calculate_material_requirements(connection, jobs),
+            self.on_calculated,
+            self.on_calculation_failed,
+            read_only=True,
+            action="material-calculation"
+        )
+
+    def on_calculated(self, results):
+        self.set_busy(False)
+        for row, (required, packages) in enumerate(results[:self.table.rowCount()]):
+            if required < 0:
+                required_text = packages_text = "ошибка"
             else:
-                # Добавление нового материала
-                query = """
-                    INSERT INTO materials 
-                    (material_name, id_type_material, unit_price, 
-                     stock_quantity, min_quantity, package_quantity, unit)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """
-                cursor.execute(query, (material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit))
-
-            self.db_connection.commit()
-            return True
+                required_text = str(required)
+                packages_text = "—" if packages is None else str(packages)
+            self.table.item(row, self.RESULT_COLUMN).setText(required_text)
+            self.table.item(row, self.RESULT_COLUMN + 1).setText(packages_text)
+
+    def on_calculation_failed(self, message):
+        self.set_busy(False)
+        self.parent().show_error_message(
+            "Ошибка расчета",
+            f"Не удалось рассчитать сырье: {message}"
+        )
 
-        except Exception as e:
-            self.db_connection.rollback()
-            raise e
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
+    def write_off(self):
+        # Расход сырья на производство записывается в журнал движения материалов
+        jobs = self.jobs()
+        if not any(job[5] is not None for job in jobs):
+            self.parent().show_warning_message("Списание", "Выберите материал хотя бы в одной строке.")
+            return
+        if not self.db_worker or not self.db_worker.is_available():
+            return
+
+        reply = QMessageBox.question(
+            self, 'Подтверждение',
+            'Списать рассчитанное сырье со склада по строкам с выбранным материалом?',
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+
+        self.set_busy(True)
+        self.db_worker.submit(
+            self.task_key,
+            lambda connection: write_off_material_requirements(connection, jobs),
+            self.on_written_off,
+            self.on_write_off_failed,
+            action="material-write-off"
+        )
+
+    def on_written_off(self, result):
+        results, stock = result
+        self.on_calculated(results)
+        self.parent().show_info_message("Списание", f"Сырье списано, изменено остатков материалов: {len(stock)}.")
+
+    def on_write_off_failed(self, message):
+        self.set_busy(False)
+        self.parent().show_error_message(
+            "Ошибка списания",
+            f"Не удалось списать сырье: {message}"
+        )
+
+    def set_busy(self, busy):
+        self.add_row_button.setEnabled(not busy)
+        self.remove_row_button.setEnabled(not busy)
+        self.calculate_button.setEnabled(not busy)
+        self.write_off_button.setEnabled(not busy)
+
+    def done(self, result):
+        # Закрытие диалога отменяет его незавершенные запросы
+        if self.db_worker:
+            self.db_worker.cancel(self.task_key)
+        super().done(result)
+
+
+class ReplenishmentTableModel(QAbstractTableModel):
+    # Таблица плана пополнения (строки fetch_replenishment_plan)
+
+    # (заголовок, индекс поля в строке плана)
+    COLUMNS = (
+        ("Материал", 1),
+        ("Тип", 2),
+        ("Поставщик", 3),
+        ("На складе", 4),
+        ("Минимум", 5),
+        ("Не хватает", 6),
+        ("Упаковок", 7),
+        ("К заказу", 8),
+        ("Ед.", 9),
+        ("Сумма, ₽", 10),
+    )
+    SUPPLIER_COLUMN = 2
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self._rows[index.row()][self.COLUMNS[index.column()][1]]
+
+        if role == Qt.DisplayRole:
+            if index.column() == self.SUPPLIER_COLUMN:
+                return value or "не указан"
+            if value is None:
+                return "—"
+            if index.column() == len(self.COLUMNS) - 1:
+                return f"{value:.2f}"
+            return str(value)
+        if role == SORT_ROLE:
+            if value is None:
+                return "" if index.column() == self.SUPPLIER_COLUMN else -1
+            return float(value) if index.column() == len(self.COLUMNS) - 1 else value
+        if role == Qt.TextAlignmentRole and index.column() >= 3 and index.column() != 8:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+
+class ReplenishmentDialog(QDialog):
+    # План пополнения запасов: материалы ниже минимума, сгруппированные по поставщикам
+
+    def __init__(self, parent=None, db_worker=None):
+        super().__init__(parent)
+        self.db_worker = db_worker
+        self.task_key = f"replenishment-{id(self)}"
+        self.setWindowTitle("Пополнение запасов")
+        self.setMinimumSize(1000, 600)
+        self.init_ui()
+        self.load_data()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Поставщик:"))
+        self.supplier_combo = QComboBox()
+        self.supplier_combo.setFont(theme_font(12))
+        self.supplier_combo.setSizeAdjustPolicy(QComboBox.AdjustToContents)
+        self.supplier_combo.currentIndexChanged.connect(self.apply_supplier_filter)
+        filter_layout.addWidget(self.supplier_combo)
+        filter_layout.addStretch()
+        layout.addLayout(filter_layout)
+
+        # Сортировка по любой колонке щелчком по заголовку
+        self.plan_model = ReplenishmentTableModel(self)
+        self.proxy_model = QSortFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.plan_model)
+        self.proxy_model.setSortRole(SORT_ROLE)
+        self.proxy_model.setFilterKeyColumn(ReplenishmentTableModel.SUPPLIER_COLUMN)
+
+        self.table_view = QTableView()
+        self.table_view.setFont(theme_font(12))
+        self.table_view.setModel(self.proxy_model)
+        self.table_view.setSortingEnabled(True)
+        self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_view.verticalHeader().setVisible(False)
+        self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table_view.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(self.table_view)
+
+        self.total_label = QLabel("")
+        self.total_label.setFont(theme_font(14, bold=True))
+        set_variant(self.total_label, "title")
+        layout.addWidget(self.total_label)
+
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        self.button_box.rejected.connect(self.reject)
+        layout.addWidget(self.button_box)
+
+    def load_data(self):
+        if not self.db_worker or not self.db_worker.is_available():
+            return
+
+        self.total_label.setText("Расчет плана...")
+        self.db_worker.submit(
+            self.task_key,
+            fetch_replenishment_plan,
+            self.on_plan_loaded,
+            self.on_plan_load_failed,
+            read_only=True,
+            action="replenishment-plan"
+        )
+
+    def on_plan_loaded(self, rows):
+        self.plan_model.set_rows(rows)
+        self.table_view.sortByColumn(ReplenishmentTableModel.SUPPLIER_COLUMN, Qt.AscendingOrder)
+
+        # Итоги по поставщикам (строки уже упорядочены по поставщику)
+        totals = {}
+        for row in rows:
+            count, cost = totals.get(row[3], (0, 0))
+            totals[row[3]] = (count + 1, cost + row[10])
+
+        self.supplier_combo.blockSignals(True)
+        self.supplier_combo.clear()
+        self.supplier_combo.addItem(f"Все ({len(rows)} поз.)", None)
+        for supplier, (count, cost) in totals.items():
+            self.supplier_combo.addItem(f"{supplier or 'не указан'} — {count} поз., {cost:.2f} ₽", supplier or "")
+        self.supplier_combo.blockSignals(False)
+        self.apply_supplier_filter()
+
+    def on_plan_load_failed(self, message):
+        self.total_label.setText("")
+        self.parent().show_error_message(
+            "Ошибка загрузки данных",
+            f"Не удалось рассчитать план пополнения: {message}"
+        )
+
+    def apply_supplier_filter(self):
+        supplier = self.supplier_combo.currentData()
+        if supplier is None:
+            self.proxy_model.setFilterRegularExpression("")
+        else:
+            self.proxy_model.setFilterRegularExpression(
+                "^" + QRegularExpression.escape(supplier or "не указан") + "$"
+            )
+
+        total = sum(float(self.proxy_model.index(row, len(ReplenishmentTableModel.COLUMNS) - 1).data(SORT_ROLE))
+                    for row in range(self.proxy_model.rowCount()))
+        if self.plan_model.rowCount():
+            self.total_label.setText(f"Позиций: {self.proxy_model.rowCount()}, итого к закупке: {total:.2f} ₽")
+        else:
+            self.total_label.setText("Все материалы в пределах минимального остатка")
+
+    def done(self, result):
+        if self.db_worker:
+            self.db_worker.cancel(self.task_key)
+        super().done(result)
+
+
+class DiagnosticsDialog(QDialog):
+    # Скрытая панель диагностики (Ctrl+Shift+D): время запросов к базе
+    # и число обращений к серверу по действиям пользователя
+
+    STATEMENT_COLUMNS = (("Выполнений", "int"), ("Строк", "int"), ("Всего, мс", "money"),
+                         ("Среднее, мс", "money"), ("p50, мс", "money"), ("p95, мс", "money"),
+                         ("Макс., мс", "money"), ("Запрос", "text"))
+    ACTION_COLUMNS = (("Действие", "text"), ("Выполнений", "int"), ("Ошибок", "int"),
+                      ("Запросов в среднем", "money"), ("Запросов макс.", "int"), ("Строк", "int"),
+                      ("Время БД, мс", "money"), ("Время всего, мс", "money"), ("Макс., мс", "money"))
+
+    def __init__(self, parent=None, stats=None):
+        super().__init__(parent)
+        self.stats = stats
+        self.setWindowTitle("Диагностика запросов")
+        self.setMinimumSize(1100, 600)
+        self.init_ui()
+        self.refresh()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.summary_label = QLabel("")
+        layout.addWidget(self.summary_label)
+
+        self.tabs = QTabWidget()
+        self.actions_model = ReportTableModel(self.ACTION_COLUMNS, self)
+        self.tabs.addTab(create_report_view(self.actions_model), "Действия")
+        self.statements_model = ReportTableModel(self.STATEMENT_COLUMNS, self)
+        self.tabs.addTab(create_report_view(self.statements_model), "Запросы")
+        layout.addWidget(self.tabs)
+
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        refresh_button = self.button_box.addButton("Обновить", QDialogButtonBox.ActionRole)
+        refresh_button.clicked.connect(self.refresh)
+        reset_button = self.button_box.addButton("Сбросить", QDialogButtonBox.ActionRole)
+        reset_button.clicked.connect(self.reset)
+        dump_button = self.button_box.addButton("Сохранить JSON...", QDialogButtonBox.ActionRole)
+        dump_button.clicked.connect(self.dump)
+        self.button_box.rejected.connect(self.reject)
+        layout.addWidget(self.button_box)
+
+    def refresh(self):
+        data = self.stats.snapshot()
+        self.actions_model.set_rows([
+            (entry["action"], entry["count"], entry["errors"], entry["mean_round_trips"],
+             entry["max_round_trips"], entry["rows"], entry["mean_db_ms"], entry["mean_elapsed_ms"],
+             entry["max_elapsed_ms"])
+            for entry in data["actions"]
+        ])
+        self.statements_model.set_rows([
+            (entry["count"], entry["rows"], entry["total_ms"], entry["mean_ms"], entry["p50_ms"],
+             entry["p95_ms"], entry["max_ms"], entry["query"])
+            for entry in data["statements"]
+        ])
+        self.summary_label.setText(
+            f"Статистика с {data['started_at']}; медленные запросы (от {data['slow_query_ms']:g} мс) "
+            f"пишутся в {self.stats.slow_query_log}"
+        )
+
+    def reset(self):
+        self.stats.reset()
+        self.refresh()
+
+    def dump(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить статистику", "query_stats.json", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            self.stats.dump(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить статистику: {str(e)}")
+
+
+def run_cli(argv):
+    # Консольные команды без графического интерфейса:
+    #   python main.py export <таблица> <файл.csv|файл.parquet>
+    #   python main.py migrate
+    #   python main.py refresh-reports [--full]
+    #   python main.py compact-stock [--days N]
+    parser = argparse.ArgumentParser(prog="main.py", description="Система управления «Наш декор»")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="выгрузка таблицы в CSV или Parquet")
+    export_parser.add_argument("table", choices=sorted(EXPORT_TABLES))
+    export_parser.add_argument("path", help="файл .csv или .parquet")
+
+    commands.add_parser("migrate", help="применение миграций схемы базы данных")
+
+    reports_parser = commands.add_parser("refresh-reports", help="обновление таблиц отчетов")
+    reports_parser.add_argument("--full", action="store_true", help="пересчитать с нуля")
+
+    stock_parser = commands.add_parser("compact-stock", help="сворачивание журнала движения материалов")
+    stock_parser.add_argument("--days", type=int, default=STOCK_LEDGER_RETENTION_DAYS,
+                              help=f"сколько дней хранить построчно (по умолчанию {STOCK_LEDGER_RETENTION_DAYS})")
+
+    args = parser.parse_args(argv)
+
+    db = ConnectionManager(load_db_config())
+    try:
+        if args.command == "export":
+            count = db.run(lambda connection: export_table(connection, args.table, args.path), retries=DbWorker.READ_RETRIES)
+            print(f"Выгружено строк: {count} -> {args.path}")
+        elif args.command == "migrate":
+            applied = db.run(apply_migrations)
+            print(f"Применены миграции: {', '.join(applied)}" if applied else "База данных в актуальном состоянии")
+        elif args.command == "refresh-reports":
+            new_requests, new_supplies = db.run(lambda connection: refresh_reports(connection, args.full))
+            print(f"Учтено новых заявок: {new_requests}, поставок: {new_supplies}")
+        elif args.command == "compact-stock":
+            deleted, balances = db.run(lambda connection: compact_stock_movements(connection, args.days))
+            print(f"Свернуто движений: {deleted} в {balances} строк остатка")
+            mismatches = db.run(fetch_stock_mismatches, retries=DbWorker.READ_RETRIES)
+            for material_id, material_name, stock_quantity, ledger_total in mismatches:
+                print(f"Остаток не сходится с журналом: {material_name} (id {material_id}): "
+                      f"{stock_quantity} на складе, {ledger_total} по журналу", file=sys.stderr)
+    except Exception as e:
+        print(f"Ошибка: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+        dump_query_stats(db)
+    return 0
+
+
+# Команды, при которых main.py работает без окна
+CLI_COMMANDS = ("export", "migrate", "refresh-reports", "compact-stock")
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS:
+        sys.exit(run_cli(sys.argv[1:]))
+
+    # python main.py --profile-startup: вывести длительность фаз запуска и выйти
+    profiler = None
+    if "--profile-startup" in sys.argv:
+        sys.argv.remove("--profile-startup")
+        profiler = StartupProfiler()
+        profiler.mark("импорт модулей")
+
     app = QApplication(sys.argv)
-    app.setFont(QFont("Gabriola", 12))
+    apply_theme(app)
+    if profiler is not None:
+        profiler.mark("QApplication")
 
-    window = MainWindow()
+    window = MainWindow(profiler)
+    if profiler is not None:
+        profiler.mark("создание окна")
     window.show()
 
-    sys.exit(app.exec())
\ No newline at end of file
+    code = app.exec()
+    if profiler is not None:
+        window.close()
+    sys.exit(code)
\ No newline at end of file
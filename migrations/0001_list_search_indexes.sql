@@ -0,0 +1,34 @@
+-- Индексы для списков, поиска и фильтров на страницах "Продукция" и "Материалы"
+-- (те же, что в скрипте бд.sql, для уже созданных баз)
+
+-- Порядок списков и keyset-пагинация: ORDER BY name COLLATE "C", id
+CREATE INDEX IF NOT EXISTS products_name_order_idx
+    ON public.products (product_name COLLATE "C", id_product);
+
+CREATE INDEX IF NOT EXISTS materials_name_order_idx
+    ON public.materials (material_name COLLATE "C", id_material);
+
+-- Фильтры по типу
+CREATE INDEX IF NOT EXISTS products_type_idx
+    ON public.products (id_type_product);
+
+CREATE INDEX IF NOT EXISTS materials_type_idx
+    ON public.materials (id_type_material);
+
+-- Поиск ILIKE по артикулу и наименованию. Расширение pg_trgm есть не в каждой
+-- сборке PostgreSQL: без него поиск работает, но без триграммных индексов.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS products_articul_trgm_idx
+            ON public.products USING gin (articul gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS products_name_trgm_idx
+            ON public.products USING gin (product_name gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS materials_name_trgm_idx
+            ON public.materials USING gin (material_name gin_trgm_ops);
+    ELSE
+        RAISE NOTICE 'pg_trgm недоступно, триграммные индексы не созданы';
+    END IF;
+END
+$$;
@@ -0,0 +1,16 @@
+-- Индексы на внешние ключи: соединения и проверки ссылочной целостности
+-- используют их вместо последовательного чтения таблиц
+
+CREATE INDEX IF NOT EXISTS requests_product_idx ON public.requests (id_product);
+CREATE INDEX IF NOT EXISTS requests_partner_idx ON public.requests (id_part);
+CREATE INDEX IF NOT EXISTS requests_employee_idx ON public.requests (id_employ);
+
+CREATE INDEX IF NOT EXISTS supplies_material_idx ON public.supplies (id_material);
+CREATE INDEX IF NOT EXISTS supplies_supplier_idx ON public.supplies (id_suppliers);
+CREATE INDEX IF NOT EXISTS supplies_sklad_idx ON public.supplies (id_sklad);
+
+CREATE INDEX IF NOT EXISTS staff_employee_idx ON public.staff (id_employ);
+CREATE INDEX IF NOT EXISTS staff_specialization_idx ON public.staff (id_specialization);
+
+CREATE INDEX IF NOT EXISTS partners_type_idx ON public.partners (id_type_part);
+CREATE INDEX IF NOT EXISTS suppliers_type_idx ON public.suppliers (id_type_sup);
@@ -0,0 +1,11 @@
+-- Проверка внешних ключей, созданных как NOT VALID. Если в таблице есть строки
+-- со ссылками на несуществующие записи, миграция остановится с ошибкой -
+-- такие строки нужно исправить вручную и перезапустить приложение.
+
+ALTER TABLE public.materials VALIDATE CONSTRAINT type_material_fr;
+ALTER TABLE public.partners VALIDATE CONSTRAINT type_part_fr;
+ALTER TABLE public.products VALIDATE CONSTRAINT type_product_fr;
+ALTER TABLE public.requests VALIDATE CONSTRAINT partners_fr;
+ALTER TABLE public.staff VALIDATE CONSTRAINT specialization_fr;
+ALTER TABLE public.supplies VALIDATE CONSTRAINT sklad_fr;
+ALTER TABLE public.supplies VALIDATE CONSTRAINT suppliers_fr;
@@ -0,0 +1,27 @@
+-- Уникальность артикула: проверка дублей и upsert при импорте идут по индексу
+
+DO $$
+DECLARE
+    duplicates text;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'products_articul_key') THEN
+        RETURN;
+    END IF;
+
+    SELECT string_agg(articul, ', ') INTO duplicates
+    FROM (
+        SELECT articul
+        FROM public.products
+        GROUP BY articul
+        HAVING count(*) > 1
+        ORDER BY articul
+        LIMIT 20
+    ) d;
+
+    IF duplicates IS NOT NULL THEN
+        RAISE EXCEPTION 'Повторяющиеся артикулы продукции: %. Исправьте их и перезапустите приложение', duplicates;
+    END IF;
+
+    ALTER TABLE public.products ADD CONSTRAINT products_articul_key UNIQUE (articul);
+END
+$$;
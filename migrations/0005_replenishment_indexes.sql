@@ -0,0 +1,10 @@
+-- Индексы для плана пополнения запасов
+
+-- Частичный индекс: только материалы ниже минимального остатка
+CREATE INDEX IF NOT EXISTS materials_low_stock_idx
+    ON public.materials (id_material)
+    WHERE stock_quantity < min_quantity;
+
+-- Последняя поставка каждого материала (DISTINCT ON по id_material)
+CREATE INDEX IF NOT EXISTS supplies_material_latest_idx
+    ON public.supplies (id_material, id_supplies DESC);
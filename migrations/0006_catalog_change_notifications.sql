@@ -0,0 +1,73 @@
+-- Уведомления об изменениях продукции и материалов для открытых копий приложения.
+-- Триггеры уровня оператора: один NOTIFY на INSERT/UPDATE/DELETE со списком id
+-- измененных строк, поэтому импорт и пересчет цен не порождают поток уведомлений.
+-- Полезная нагрузка (канал catalog_changes): {"table": "products", "ids": [..]};
+-- если строк больше 500, ids = null и клиент перечитывает список целиком.
+
+CREATE OR REPLACE FUNCTION public.notify_catalog_change()
+    RETURNS trigger
+    LANGUAGE plpgsql
+AS $$
+DECLARE
+    changed_ids bigint[];
+BEGIN
+    -- TG_ARGV[0] - имя колонки первичного ключа
+    IF TG_OP = 'DELETE' THEN
+        EXECUTE format('SELECT array_agg(%1$I) FROM (SELECT %1$I FROM old_rows LIMIT 501) r', TG_ARGV[0])
+            INTO changed_ids;
+    ELSE
+        EXECUTE format('SELECT array_agg(%1$I) FROM (SELECT %1$I FROM new_rows LIMIT 501) r', TG_ARGV[0])
+            INTO changed_ids;
+    END IF;
+
+    IF changed_ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    IF cardinality(changed_ids) > 500 THEN
+        changed_ids := NULL;
+    END IF;
+
+    PERFORM pg_notify(
+        'catalog_changes',
+        json_build_object('table', TG_TABLE_NAME, 'ids', changed_ids)::text
+    );
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS products_notify_insert ON public.products;
+CREATE TRIGGER products_notify_insert
+    AFTER INSERT ON public.products
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_catalog_change('id_product');
+
+DROP TRIGGER IF EXISTS products_notify_update ON public.products;
+CREATE TRIGGER products_notify_update
+    AFTER UPDATE ON public.products
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_catalog_change('id_product');
+
+DROP TRIGGER IF EXISTS products_notify_delete ON public.products;
+CREATE TRIGGER products_notify_delete
+    AFTER DELETE ON public.products
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_catalog_change('id_product');
+
+DROP TRIGGER IF EXISTS materials_notify_insert ON public.materials;
+CREATE TRIGGER materials_notify_insert
+    AFTER INSERT ON public.materials
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_catalog_change('id_material');
+
+DROP TRIGGER IF EXISTS materials_notify_update ON public.materials;
+CREATE TRIGGER materials_notify_update
+    AFTER UPDATE ON public.materials
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_catalog_change('id_material');
+
+DROP TRIGGER IF EXISTS materials_notify_delete ON public.materials;
+CREATE TRIGGER materials_notify_delete
+    AFTER DELETE ON public.materials
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_catalog_change('id_material');
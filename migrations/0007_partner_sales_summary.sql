@@ -0,0 +1,103 @@
+-- Итоги продаж по партнерам для страницы "Партнеры": объем (сумма count по
+-- заявкам), число заявок и дата последней заявки. Таблица поддерживается
+-- триггерами на requests, поэтому страница не агрегирует заявки при открытии.
+
+CREATE TABLE IF NOT EXISTS public.partner_sales_summary
+(
+    id_part integer NOT NULL,
+    total_quantity bigint NOT NULL DEFAULT 0,
+    requests_count integer NOT NULL DEFAULT 0,
+    last_request_date date,
+    CONSTRAINT partner_sales_summary_pkey PRIMARY KEY (id_part),
+    CONSTRAINT partner_sales_summary_partner_fr FOREIGN KEY (id_part)
+        REFERENCES public.partners (id_part) ON DELETE CASCADE
+);
+
+-- Начальное заполнение одним групповым запросом
+INSERT INTO public.partner_sales_summary (id_part, total_quantity, requests_count, last_request_date)
+SELECT r.id_part, sum(r.count), count(*), max(r.date)
+FROM public.requests r
+GROUP BY r.id_part
+ON CONFLICT (id_part) DO UPDATE
+SET total_quantity = EXCLUDED.total_quantity,
+    requests_count = EXCLUDED.requests_count,
+    last_request_date = EXCLUDED.last_request_date;
+
+-- Новые заявки: итоги увеличиваются на агрегаты вставленных строк
+CREATE OR REPLACE FUNCTION public.partner_sales_add()
+    RETURNS trigger
+    LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO public.partner_sales_summary AS s (id_part, total_quantity, requests_count, last_request_date)
+    SELECT n.id_part, sum(n.count), count(*), max(n.date)
+    FROM new_rows n
+    GROUP BY n.id_part
+    ON CONFLICT (id_part) DO UPDATE
+    SET total_quantity = s.total_quantity + EXCLUDED.total_quantity,
+        requests_count = s.requests_count + EXCLUDED.requests_count,
+        last_request_date = greatest(s.last_request_date, EXCLUDED.last_request_date);
+    RETURN NULL;
+END
+$$;
+
+-- Изменение и удаление заявок: итоги затронутых партнеров пересчитываются
+-- по индексу requests_partner_idx (дату последней заявки нельзя "вычесть")
+CREATE OR REPLACE FUNCTION public.partner_sales_refresh()
+    RETURNS trigger
+    LANGUAGE plpgsql
+AS $$
+DECLARE
+    partner_ids integer[];
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT o.id_part) INTO partner_ids FROM old_rows o;
+    ELSE
+        SELECT array_agg(DISTINCT id_part) INTO partner_ids
+        FROM (SELECT id_part FROM old_rows UNION SELECT id_part FROM new_rows) changed;
+    END IF;
+
+    INSERT INTO public.partner_sales_summary AS s (id_part, total_quantity, requests_count, last_request_date)
+    SELECT p.id_part, coalesce(sum(r.count), 0), count(r.id_req), max(r.date)
+    FROM public.partners p
+    LEFT JOIN public.requests r ON r.id_part = p.id_part
+    WHERE p.id_part = ANY(partner_ids)
+    GROUP BY p.id_part
+    ON CONFLICT (id_part) DO UPDATE
+    SET total_quantity = EXCLUDED.total_quantity,
+        requests_count = EXCLUDED.requests_count,
+        last_request_date = EXCLUDED.last_request_date;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS requests_sales_insert ON public.requests;
+CREATE TRIGGER requests_sales_insert
+    AFTER INSERT ON public.requests
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.partner_sales_add();
+
+DROP TRIGGER IF EXISTS requests_sales_update ON public.requests;
+CREATE TRIGGER requests_sales_update
+    AFTER UPDATE ON public.requests
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.partner_sales_refresh();
+
+DROP TRIGGER IF EXISTS requests_sales_delete ON public.requests;
+CREATE TRIGGER requests_sales_delete
+    AFTER DELETE ON public.requests
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.partner_sales_refresh();
+
+-- Порядок и поиск на странице партнеров
+CREATE INDEX IF NOT EXISTS partners_name_order_idx
+    ON public.partners (partner_name COLLATE "C", id_part);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS partners_name_trgm_idx
+            ON public.partners USING gin (partner_name gin_trgm_ops);
+    END IF;
+END
+$$;
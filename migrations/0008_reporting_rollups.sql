@@ -0,0 +1,49 @@
+-- Предагрегированные данные для страницы "Отчеты". Страница читает только эти
+-- таблицы; они пополняются приложением (refresh_reports) строками requests и
+-- supplies, добавленными после водяной отметки (последнего учтенного id).
+
+-- Продажи по месяцам в разрезе типа продукции, типа партнера и сотрудника
+CREATE TABLE IF NOT EXISTS public.report_sales_monthly
+(
+    month date NOT NULL,
+    id_type_product integer NOT NULL,
+    id_type_part integer NOT NULL,
+    id_employ integer NOT NULL,
+    quantity bigint NOT NULL,
+    revenue numeric(18, 2) NOT NULL,
+    requests_count integer NOT NULL,
+    CONSTRAINT report_sales_monthly_pkey PRIMARY KEY (month, id_type_product, id_type_part, id_employ)
+);
+
+-- Поставки в разрезе типа материала и поставщика
+CREATE TABLE IF NOT EXISTS public.report_supplies
+(
+    id_type_material integer NOT NULL,
+    id_suppliers integer NOT NULL,
+    quantity bigint NOT NULL,
+    deliveries_count integer NOT NULL,
+    CONSTRAINT report_supplies_pkey PRIMARY KEY (id_type_material, id_suppliers)
+);
+
+-- Текущие остатки по типам материалов (снимок на момент обновления)
+CREATE TABLE IF NOT EXISTS public.report_stock_by_type
+(
+    id_type_material integer NOT NULL,
+    materials_count integer NOT NULL,
+    stock_quantity bigint NOT NULL,
+    stock_value numeric(18, 2) NOT NULL,
+    below_min_count integer NOT NULL,
+    CONSTRAINT report_stock_by_type_pkey PRIMARY KEY (id_type_material)
+);
+
+-- Водяные отметки: последний учтенный id исходной таблицы
+CREATE TABLE IF NOT EXISTS public.report_watermarks
+(
+    source text NOT NULL,
+    last_id bigint NOT NULL DEFAULT 0,
+    refreshed_at timestamp with time zone,
+    CONSTRAINT report_watermarks_pkey PRIMARY KEY (source)
+);
+
+INSERT INTO public.report_watermarks (source) VALUES ('requests'), ('supplies'), ('stock')
+ON CONFLICT (source) DO NOTHING;
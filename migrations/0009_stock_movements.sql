@@ -0,0 +1,177 @@
+-- Журнал движения материалов. Остаток materials.stock_quantity больше не
+-- перезаписывается целиком: приход по поставкам, расход на производство и
+-- ручные корректировки добавляются строками в stock_movements, а триггер
+-- применяет их к остаткам одним групповым UPDATE stock_quantity + delta.
+-- Журнал только дописывается; старые строки периодически сворачиваются
+-- в строки 'balance' (python main.py compact-stock), сумма delta по
+-- материалу всегда равна его остатку.
+
+CREATE TABLE IF NOT EXISTS public.stock_movements
+(
+    id_movement bigserial NOT NULL,
+    id_material integer NOT NULL,
+    delta integer NOT NULL,
+    kind varchar(20) NOT NULL,
+    id_supplies integer,
+    comment text,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    CONSTRAINT stock_movements_pkey PRIMARY KEY (id_movement),
+    CONSTRAINT stock_movements_material_fr FOREIGN KEY (id_material)
+        REFERENCES public.materials (id_material) ON DELETE CASCADE,
+    CONSTRAINT stock_movements_kind_check
+        CHECK (kind IN ('balance', 'supply', 'production', 'adjustment'))
+);
+
+CREATE INDEX IF NOT EXISTS stock_movements_material_idx
+    ON public.stock_movements (id_material, id_movement);
+
+-- Для сворачивания по дате
+CREATE INDEX IF NOT EXISTS stock_movements_created_idx
+    ON public.stock_movements (created_at);
+
+-- Начальные остатки: по строке 'balance' на материал
+INSERT INTO public.stock_movements (id_material, delta, kind, comment)
+SELECT m.id_material, m.stock_quantity, 'balance', 'Начальный остаток'
+FROM public.materials m
+WHERE m.stock_quantity <> 0
+  AND NOT EXISTS (SELECT 1 FROM public.stock_movements);
+
+-- Строки журнала не изменяются (удаление разрешено для сворачивания
+-- и каскада при удалении материала)
+CREATE OR REPLACE FUNCTION public.stock_movements_readonly()
+    RETURNS trigger
+    LANGUAGE plpgsql
+AS $$
+BEGIN
+    RAISE EXCEPTION 'Журнал движения материалов нельзя изменять, добавьте корректировку'
+        USING ERRCODE = 'feature_not_supported';
+END
+$$;
+
+DROP TRIGGER IF EXISTS stock_movements_readonly ON public.stock_movements;
+CREATE TRIGGER stock_movements_readonly
+    BEFORE UPDATE ON public.stock_movements
+    FOR EACH STATEMENT EXECUTE FUNCTION public.stock_movements_readonly();
+
+-- Новые движения: суммы delta по материалам применяются к остаткам.
+-- Строки материалов блокируются по порядку id, поэтому встречные пакеты
+-- не взаимоблокируются; 'balance' - уже учтенный остаток, не применяется.
+CREATE OR REPLACE FUNCTION public.stock_movements_apply()
+    RETURNS trigger
+    LANGUAGE plpgsql
+AS $$
+DECLARE
+    negative record;
+BEGIN
+    PERFORM 1
+    FROM public.materials m
+    WHERE m.id_material IN (SELECT n.id_material FROM new_rows n WHERE n.kind <> 'balance')
+    ORDER BY m.id_material
+    FOR NO KEY UPDATE;
+
+    WITH deltas AS (
+        SELECT n.id_material, sum(n.delta) AS delta
+        FROM new_rows n
+        WHERE n.kind <> 'balance'
+        GROUP BY n.id_material
+        HAVING sum(n.delta) <> 0
+    ),
+    updated AS (
+        UPDATE public.materials m
+        SET stock_quantity = m.stock_quantity + d.delta
+        FROM deltas d
+        WHERE m.id_material = d.id_material
+        RETURNING m.id_material, m.material_name, m.stock_quantity, d.delta
+    )
+    SELECT * INTO negative
+    FROM updated u
+    WHERE u.stock_quantity < 0 AND u.delta < 0
+    ORDER BY u.id_material
+    LIMIT 1;
+
+    IF FOUND THEN
+        RAISE EXCEPTION 'Остаток не может стать отрицательным: % (остаток %)',
+            negative.material_name, negative.stock_quantity
+            USING ERRCODE = 'check_violation';
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS stock_movements_apply ON public.stock_movements;
+CREATE TRIGGER stock_movements_apply
+    AFTER INSERT ON public.stock_movements
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.stock_movements_apply();
+
+-- Новые материалы: начальный остаток записывается строкой 'balance'
+CREATE OR REPLACE FUNCTION public.materials_opening_balance()
+    RETURNS trigger
+    LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO public.stock_movements (id_material, delta, kind, comment)
+    SELECT n.id_material, n.stock_quantity, 'balance', 'Начальный остаток'
+    FROM new_rows n
+    WHERE n.stock_quantity <> 0;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS materials_opening_balance ON public.materials;
+CREATE TRIGGER materials_opening_balance
+    AFTER INSERT ON public.materials
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.materials_opening_balance();
+
+-- Поставки: приход по новым строкам, разница при изменении и
+-- сторнирование при удалении
+CREATE OR REPLACE FUNCTION public.supplies_stock_movements()
+    RETURNS trigger
+    LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.stock_movements (id_material, delta, kind, id_supplies)
+        SELECT n.id_material, n.count, 'supply', n.id_supplies
+        FROM new_rows n
+        WHERE n.id_material IS NOT NULL AND n.count <> 0;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO public.stock_movements (id_material, delta, kind, id_supplies, comment)
+        SELECT changed.id_material, sum(changed.delta), 'supply', changed.id_supplies, 'Изменение поставки'
+        FROM (
+            SELECT n.id_material, coalesce(n.count, 0) AS delta, n.id_supplies FROM new_rows n
+            UNION ALL
+            SELECT o.id_material, -coalesce(o.count, 0), o.id_supplies FROM old_rows o
+        ) changed
+        WHERE changed.id_material IS NOT NULL
+        GROUP BY changed.id_material, changed.id_supplies
+        HAVING sum(changed.delta) <> 0;
+    ELSE
+        INSERT INTO public.stock_movements (id_material, delta, kind, id_supplies, comment)
+        SELECT o.id_material, -o.count, 'supply', o.id_supplies, 'Удаление поставки'
+        FROM old_rows o
+        WHERE o.id_material IS NOT NULL AND o.count <> 0
+          AND EXISTS (SELECT 1 FROM public.materials m WHERE m.id_material = o.id_material);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS supplies_stock_insert ON public.supplies;
+CREATE TRIGGER supplies_stock_insert
+    AFTER INSERT ON public.supplies
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.supplies_stock_movements();
+
+DROP TRIGGER IF EXISTS supplies_stock_update ON public.supplies;
+CREATE TRIGGER supplies_stock_update
+    AFTER UPDATE ON public.supplies
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.supplies_stock_movements();
+
+DROP TRIGGER IF EXISTS supplies_stock_delete ON public.supplies;
+CREATE TRIGGER supplies_stock_delete
+    AFTER DELETE ON public.supplies
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.supplies_stock_movements();
@@ -0,0 +1,50 @@
+-- Очередь новых заявок и поставок для таблиц отчетов (миграция 0008) вместо
+-- водяной отметки по id. Id выдаются при вставке, а транзакции фиксируются в
+-- другом порядке: строки незафиксированной транзакции с меньшими id оказывались
+-- ниже отметки и не попадали в отчеты. Строка очереди фиксируется вместе со
+-- строкой заявки/поставки, поэтому refresh_reports забирает из очереди ровно
+-- то, что уже видно.
+
+CREATE TABLE IF NOT EXISTS public.report_queue
+(
+    source text NOT NULL,
+    id bigint NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS report_queue_source_idx
+    ON public.report_queue (source);
+
+-- Еще не учтенные строки (выше последней водяной отметки)
+INSERT INTO public.report_queue (source, id)
+SELECT 'requests', r.id_req
+FROM public.requests r
+WHERE r.id_req > (SELECT w.last_id FROM public.report_watermarks w WHERE w.source = 'requests');
+
+INSERT INTO public.report_queue (source, id)
+SELECT 'supplies', s.id_supplies
+FROM public.supplies s
+WHERE s.id_supplies > (SELECT w.last_id FROM public.report_watermarks w WHERE w.source = 'supplies');
+
+-- TG_ARGV[0] - имя источника в очереди, TG_ARGV[1] - колонка первичного ключа
+CREATE OR REPLACE FUNCTION public.report_queue_add()
+    RETURNS trigger
+    LANGUAGE plpgsql
+AS $$
+BEGIN
+    EXECUTE format('INSERT INTO public.report_queue (source, id) SELECT %L, %I FROM new_rows',
+                   TG_ARGV[0], TG_ARGV[1]);
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS requests_report_queue ON public.requests;
+CREATE TRIGGER requests_report_queue
+    AFTER INSERT ON public.requests
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.report_queue_add('requests', 'id_req');
+
+DROP TRIGGER IF EXISTS supplies_report_queue ON public.supplies;
+CREATE TRIGGER supplies_report_queue
+    AFTER INSERT ON public.supplies
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.report_queue_add('supplies', 'id_supplies');
@@ -0,0 +1,17 @@
+-- Время последнего обновления отчетов одной строкой вместо таблицы
+-- водяных отметок: после перехода на очередь report_queue (миграция 0010)
+-- last_id не используется, а refreshed_at у всех источников одинаковое.
+
+CREATE TABLE IF NOT EXISTS public.report_refreshed_at
+(
+    id boolean NOT NULL DEFAULT true,
+    refreshed_at timestamp with time zone,
+    CONSTRAINT report_refreshed_at_pkey PRIMARY KEY (id),
+    CONSTRAINT report_refreshed_at_single_row CHECK (id)
+);
+
+INSERT INTO public.report_refreshed_at (refreshed_at)
+SELECT max(w.refreshed_at) FROM public.report_watermarks w
+ON CONFLICT (id) DO NOTHING;
+
+DROP TABLE IF EXISTS public.report_watermarks;
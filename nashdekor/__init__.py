@@ -0,0 +1,8 @@
+# Данные и расчеты «Наш декор» без интерфейса: их используют и приложение (main.py),
+# и HTTP-сервис каталога (nashdekor.api).
+#   db - настройки, пул соединений, статистика запросов, миграции
+#   catalog - продукция, материалы, партнеры, расчет стоимости
+#   snapshot - локальная копия каталога в SQLite
+#   reports - отчеты
+#   stock - журнал движения материалов, проведение поставок
+#   transfer - импорт и выгрузка файлов
@@ -0,0 +1,497 @@
+# HTTP-сервис каталога для сайта и портала партнеров: страницы продукции и материалов
+# и расчет стоимости в JSON. Запуск: python -m nashdekor.api [--host ...] [--port ...]
+#
+# Запросы к базе - те же функции, что у приложения (nashdekor.catalog). Они выполняются
+# в пуле потоков на соединениях ConnectionManager (потоков столько же, сколько соединений),
+# а цикл asyncio тем временем обслуживает остальных клиентов. Готовые ответы хранятся
+# в кэше и сбрасываются уведомлениями catalog_changes, поэтому повторные запросы
+# не доходят до базы; клиенту отдается ETag, и неизмененный ответ - это 304 без тела.
+import sys
+import json
+import math
+import time
+import base64
+import signal
+import hashlib
+import asyncio
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.parse import urlsplit, parse_qsl
+
+import psycopg2
+
+from nashdekor.db import load_db_config, dump_query_stats, ConnectionManager, is_connection_error
+from nashdekor.catalog import (LIST_PAGE_SIZE, REFERENCE_CACHE_TTL, CATALOG_CHANNEL, CATALOG_TABLES,
+                               fetch_products, fetch_materials, fetch_product_quote)
+
+
+API_HOST = "127.0.0.1"
+API_PORT = 8080
+
+# Наибольший размер страницы (?limit=)
+API_MAX_LIMIT = 1000
+
+# Границы integer в PostgreSQL: числа вне них база отвергает ошибкой, поэтому
+# целые параметры и id проверяются до запроса
+INT4_MIN = -2 ** 31
+INT4_MAX = 2 ** 31 - 1
+
+# Сколько готовых ответов хранить в кэше
+API_CACHE_SIZE = 10000
+
+# Названия типов в списках и итоги продаж партнеров в расчетах стоимости меняются без
+# уведомлений, поэтому ответы живут в кэше не дольше этого времени, секунд
+API_LIST_TTL = REFERENCE_CACHE_TTL
+API_QUOTE_TTL = 60
+
+# Пауза перед повторным подключением слушателя уведомлений, секунд
+API_LISTEN_RECONNECT = 5
+
+# Ограничения запроса: размер заголовков, тела и время ожидания следующего запроса
+# на открытом соединении (keep-alive), секунд
+API_MAX_HEADER_BYTES = 16384
+API_MAX_BODY_BYTES = 65536
+API_KEEPALIVE_TIMEOUT = 15
+
+HTTP_REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class RequestError(Exception):
+    # Ошибка в запросе клиента: ответ с кодом status и текстом ошибки
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_cursor(key):
+    # Ключ последней строки страницы (наименование, id) -> непрозрачная строка для ?after=
+    return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(value):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(value.encode("ascii") + b"=" * (-len(value) % 4)))
+    except ValueError:
+        raise RequestError(400, "Некорректный параметр after")
+    if (not isinstance(key, list) or len(key) != 2 or not isinstance(key[0], str)
+            or not isinstance(key[1], int) or isinstance(key[1], bool)
+            or not INT4_MIN <= key[1] <= INT4_MAX):
+        raise RequestError(400, "Некорректный параметр after")
+    return tuple(key)
+
+
+def query_number(query, name, integer=False, default=None, minimum=None, maximum=None):
+    # Числовой параметр запроса; целые ограничены диапазоном integer базы
+    value = query.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        number = int(value) if integer else float(value)
+    except ValueError:
+        raise RequestError(400, f"Параметр {name} должен быть числом")
+    if integer:
+        minimum = INT4_MIN if minimum is None else max(minimum, INT4_MIN)
+        maximum = INT4_MAX if maximum is None else min(maximum, INT4_MAX)
+    elif not math.isfinite(number):
+        raise RequestError(400, f"Параметр {name} должен быть числом")
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        raise RequestError(400, f"Параметр {name} вне допустимого диапазона")
+    return number
+
+
+def list_params(query):
+    # Страница и фильтры списка в том же виде, что у FilterBar приложения
+    filters = {
+        "text": (query.get("text") or "").strip(),
+        "type_id": query_number(query, "type_id", integer=True),
+        "price_min": query_number(query, "price_min", minimum=0),
+        "price_max": query_number(query, "price_max", minimum=0),
+    }
+    limit = query_number(query, "limit", integer=True, default=LIST_PAGE_SIZE, minimum=1, maximum=API_MAX_LIMIT)
+    after = decode_cursor(query["after"]) if query.get("after") else None
+    return after, limit, filters
+
+
+def json_value(value):
+    # numeric из базы приходит как Decimal
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def product_item(row):
+    product_id, type_name, product_name, min_cost, articul, width, type_id = row
+    return {"id": product_id, "type": type_name, "type_id": type_id, "name": product_name,
+            "articul": articul, "min_cost": json_value(min_cost), "width": json_value(width)}
+
+
+def material_item(row):
+    (material_id, type_name, material_name, unit_price, stock_quantity, min_quantity,
+     package_quantity, unit, type_id) = row
+    return {"id": material_id, "type": type_name, "type_id": type_id, "name": material_name,
+            "unit_price": json_value(unit_price), "stock_quantity": stock_quantity,
+            "min_quantity": min_quantity, "package_quantity": package_quantity, "unit": unit}
+
+
+def quote_item(row):
+    product_id, articul, product_name, price, quantity, discount, total = row
+    return {"product_id": product_id, "articul": articul, "name": product_name, "price": json_value(price),
+            "quantity": quantity, "discount_percent": discount, "total": json_value(total)}
+
+
+def page_body(rows, has_more, item):
+    # Ключ продолжения - (наименование, id) последней строки, как в keyset-пагинации списков
+    next_cursor = encode_cursor([rows[-1][2], rows[-1][0]]) if has_more and rows else None
+    return {"items": [item(row) for row in rows], "next": next_cursor}
+
+
+def json_response(body):
+    # (тело, ETag): ETag - хэш тела, одинаковые данные дают одинаковый ETag
+    data = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return data, '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"'
+
+
+def error_response(status, message, extra=None):
+    # (код, тело, ETag, дополнительные заголовки) для ответа с ошибкой
+    body, etag = json_response({"error": message})
+    return status, body, None, extra or {}
+
+
+class ResponseCache:
+    # Готовые ответы (тело, ETag) по нормализованному запросу. Запись зависит от таблиц
+    # каталога и сбрасывается их уведомлением; поколение таблицы не дает сохранить
+    # ответ, прочитанный до уведомления, но законченный после него.
+    # Пока слушатель уведомлений не подключен, кэш выключен.
+    # Используется только из потока цикла asyncio.
+
+    def __init__(self, size=API_CACHE_SIZE):
+        self.size = size
+        self.enabled = False
+        self._entries = OrderedDict()
+        self._generations = {}
+
+    def generation(self, tables):
+        return tuple(self._generations.get(table, 0) for table in tables)
+
+    def get(self, key):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires, tables, response = item
+        if time.monotonic() > expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def put(self, key, tables, response, ttl, generation):
+        if not self.enabled or self.generation(tables) != generation:
+            return
+        self._entries[key] = (time.monotonic() + ttl, tables, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, table):
+        self._generations[table] = self._generations.get(table, 0) + 1
+        for key in [key for key, (expires, tables, response) in self._entries.items() if table in tables]:
+            del self._entries[key]
+
+    def clear(self):
+        for table in CATALOG_TABLES:
+            self.invalidate(table)
+        self._entries.clear()
+
+
+class CatalogService:
+    # HTTP/1.1 с keep-alive поверх asyncio. Маршруты (только GET и HEAD):
+    #   /products, /materials - страница списка: ?limit=&after=&text=&type_id=&price_min=&price_max=
+    #   /products/<id>/quote - стоимость партии: ?quantity=&partner_id=
+    #   /health - проверка работы сервиса (без обращения к базе)
+
+    def __init__(self, db):
+        self.db = db
+        self.cache = ResponseCache()
+        self.executor = ThreadPoolExecutor(max_workers=db.max_connections, thread_name_prefix="nashdekor-api")
+        self.listener = None
+        self._inflight = {}
+        self._stopped = False
+
+    async def serve(self, host, port):
+        loop = asyncio.get_running_loop()
+        loop.create_task(self.listen())
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=API_MAX_HEADER_BYTES)
+        print(f"Сервис каталога: http://{host}:{port}", file=sys.stderr)
+
+        # Остановка по Ctrl+C и по SIGTERM (systemd, docker stop)
+        stop = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, stop.set)
+            except NotImplementedError:
+                # Windows: Ctrl+C прерывает asyncio.run() исключением KeyboardInterrupt
+                pass
+        async with server:
+            await stop.wait()
+        self._close_listener()
+
+    def close(self):
+        self._stopped = True
+        self._close_listener()
+        self.executor.shutdown(wait=True)
+        dump_query_stats(self.db)
+        self.db.close()
+
+    # Уведомления об изменениях каталога
+
+    def _connect_listener(self):
+        connection = psycopg2.connect(**self.db.connect_kwargs())
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CATALOG_CHANNEL}")
+        return connection
+
+    async def listen(self):
+        # Подключает слушателя в фоне; при неудаче повторяет через API_LISTEN_RECONNECT
+        loop = asyncio.get_running_loop()
+        while not self._stopped and self.listener is None:
+            try:
+                self.listener = await loop.run_in_executor(None, self._connect_listener)
+            except psycopg2.Error as e:
+                print(f"Слушатель уведомлений не подключен: {str(e).strip()}", file=sys.stderr)
+                await asyncio.sleep(API_LISTEN_RECONNECT)
+                continue
+            loop.add_reader(self.listener.fileno(), self._read_notifications)
+            # Пока слушателя не было, изменения могли пройти незамеченными
+            self.cache.clear()
+            self.cache.enabled = True
+
+    def _read_notifications(self):
+        try:
+            self.listener.poll()
+        except psycopg2.Error:
+            self._close_listener()
+            asyncio.get_running_loop().create_task(self.listen())
+            return
+        while self.listener.notifies:
+            notify = self.listener.notifies.pop(0)
+            try:
+                table = json.loads(notify.payload)["table"]
+            except (ValueError, KeyError, TypeError):
+                self.cache.clear()
+                continue
+            self.cache.invalidate(table)
+
+    def _close_listener(self):
+        self.cache.enabled = False
+        self.cache.clear()
+        if self.listener is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self.listener.fileno())
+            except (RuntimeError, ValueError):
+                pass
+            self.listener.close()
+            self.listener = None
+
+    # Запросы к базе
+
+    async def query(self, action, fn):
+        # fn(connection) на соединении пула в отдельном потоке; чтения повторяются после обрыва
+        loop = asyncio.get_running_loop()
+
+        def run():
+            with self.db.stats.action(action):
+                return self.db.run(fn, retries=1)
+
+        return await loop.run_in_executor(self.executor, run)
+
+    async def cached(self, key, tables, ttl, action, fn, build):
+        # Ответ из кэша или из базы. Одинаковые запросы, пришедшие одновременно,
+        # ждут одного обращения к базе. None - запись не найдена.
+        response = self.cache.get(key)
+        if response is not None:
+            return response
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, tables, ttl, action, fn, build))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, key, tables, ttl, action, fn, build):
+        generation = self.cache.generation(tables)
+        result = await self.query(action, fn)
+        if result is None:
+            return None
+        response = json_response(build(result))
+        self.cache.put(key, tables, response, ttl, generation)
+        return response
+
+    # Маршруты
+
+    async def route(self, path, query):
+        parts = [part for part in path.split("/") if part]
+
+        if parts == ["health"]:
+            return json_response({"status": "ok", "cache": self.cache.enabled})
+
+        if parts in (["products"], ["materials"]):
+            table = parts[0]
+            after, limit, filters = list_params(query)
+            fetch, item = (fetch_products, product_item) if table == "products" else (fetch_materials, material_item)
+            key = (table, after, limit, tuple(sorted(filters.items())))
+            return await self.cached(
+                key, (table,), API_LIST_TTL, f"api-{table}",
+                lambda connection: fetch(connection, after, limit, filters),
+                lambda result: page_body(result[0], result[1], item)
+            )
+
+        if len(parts) == 3 and parts[0] == "products" and parts[2] == "quote":
+            try:
+                product_id = int(parts[1])
+            except ValueError:
+                raise RequestError(404, "Продукт не найден")
+            if not INT4_MIN <= product_id <= INT4_MAX:
+                raise RequestError(404, "Продукт не найден")
+            quantity = query_number(query, "quantity", integer=True, default=1, minimum=1)
+            partner_id = query_number(query, "partner_id", integer=True)
+            key = ("quote", product_id, quantity, partner_id)
+            response = await self.cached(
+                key, ("products",), API_QUOTE_TTL, "api-quote",
+                lambda connection: fetch_product_quote(connection, product_id, quantity, partner_id),
+                quote_item
+            )
+            if response is None:
+                raise RequestError(404, "Продукт или партнер не найден")
+            return response
+
+        raise RequestError(404, "Адрес не найден")
+
+    async def respond(self, method, target, headers):
+        # (код, тело, ETag, дополнительные заголовки)
+        if method not in ("GET", "HEAD"):
+            return error_response(405, "Поддерживаются только GET и HEAD", {"Allow": "GET, HEAD"})
+
+        url = urlsplit(target)
+        try:
+            body, etag = await self.route(url.path, dict(parse_qsl(url.query)))
+        except RequestError as e:
+            return error_response(e.status, str(e))
+        except psycopg2.Error as e:
+            if is_connection_error(e):
+                return error_response(503, "База данных недоступна", {"Retry-After": str(API_LISTEN_RECONNECT)})
+            print(f"Ошибка запроса {target}: {str(e).strip()}", file=sys.stderr)
+            return error_response(500, "Ошибка базы данных")
+
+        if etag in [tag.strip() for tag in headers.get("if-none-match", "").split(",")]:
+            return 304, b"", etag, {}
+        return 200, body, etag, {}
+
+    # HTTP
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), API_KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send(writer, "GET", *error_response(431, "Слишком большие заголовки запроса"), False)
+                    break
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ")
+                except ValueError:
+                    await self.send(writer, "GET", *error_response(400, "Некорректная строка запроса"), False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, separator, value = line.partition(":")
+                    if separator:
+                        headers[name.strip().lower()] = value.strip()
+
+                # Тело запроса (маршрутам оно не нужно) дочитывается, чтобы не сбить следующий запрос
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0 or length > API_MAX_BODY_BYTES or "transfer-encoding" in headers:
+                    await self.send(writer, "GET", *error_response(413, "Тело запроса не поддерживается"), False)
+                    break
+                if length:
+                    await reader.readexactly(length)
+
+                connection_header = headers.get("connection", "").lower()
+                keep_alive = (connection_header != "close" if version == "HTTP/1.1"
+                              else connection_header == "keep-alive")
+
+                status, body, etag, extra = await self.respond(method, target, headers)
+                await self.send(writer, method, status, body, etag, extra, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, method, status, body, etag, extra, keep_alive):
+        lines = [f"HTTP/1.1 {status} {HTTP_REASONS[status]}"]
+        if status != 304:
+            lines.append("Content-Type: application/json; charset=utf-8")
+            lines.append(f"Content-Length: {len(body)}")
+        if etag is not None:
+            lines.append(f"ETag: {etag}")
+            # Кэшировать можно, но перед использованием - проверять по ETag
+            lines.append("Cache-Control: no-cache")
+        for name, value in extra.items():
+            lines.append(f"{name}: {value}")
+        lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+        data = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        if method != "HEAD" and status != 304:
+            data += body
+        writer.write(data)
+        await writer.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP-сервис каталога «Наш декор»")
+    parser.add_argument("--host", default=API_HOST, help=f"адрес (по умолчанию {API_HOST})")
+    parser.add_argument("--port", type=int, default=API_PORT, help=f"порт (по умолчанию {API_PORT})")
+    parser.add_argument("--connections", type=int,
+                        help="соединений с базой (по умолчанию max_connections из настроек)")
+    args = parser.parse_args(argv)
+
+    config = load_db_config()
+    if args.connections is not None:
+        if args.connections < 1:
+            parser.error("--connections должно быть не меньше 1")
+        config["max_connections"] = str(args.connections)
+
+    service = CatalogService(ConnectionManager(config))
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Ошибка: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
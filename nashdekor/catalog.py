@@ -0,0 +1,596 @@
+# Каталог: продукция, материалы и партнеры - списки, формы, сохранение и расчет стоимости
+import time
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+
+import psycopg2.errors
+
+from nashdekor.stock import post_stock_movements
+
+
+# Базовая стоимость погонного метра продукции
+BASE_COST_PER_METER = 100.0
+
+# Сколько строк "было/стало" показывать в отчете о пересчете
+RECALCULATION_REPORT_LIMIT = 500
+
+
+def recalculate_prices(connection, type_ids=None, product_ids=None):
+    # Пересчитывает min_cost = width * BASE_COST_PER_METER * coefficient_type_product
+    # одним UPDATE для всей продукции или для подмножества (по типам / по id).
+    # Строки, у которых стоимость не изменилась, не перезаписываются.
+    # Возвращает список (id_product, articul, product_name, старая, новая стоимость).
+    # Транзакцией управляет вызывающий код (commit/rollback).
+    conditions = []
+    params = {"base": BASE_COST_PER_METER}
+    if type_ids is not None:
+        conditions.append("p.id_type_product = ANY(%(type_ids)s)")
+        params["type_ids"] = list(type_ids)
+    if product_ids is not None:
+        conditions.append("p.id_product = ANY(%(product_ids)s)")
+        params["product_ids"] = list(product_ids)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    query = f"""
+        WITH calc AS (
+            SELECT p.id_product,
+                   p.min_cost AS old_cost,
+                   ROUND((p.width * %(base)s * tp.coefficient_type_product)::numeric, 2)::double precision AS new_cost
+            FROM products p
+            JOIN type_product tp ON p.id_type_product = tp.id_type_product
+            {where}
+        )
+        UPDATE products p
+        SET min_cost = calc.new_cost
+        FROM calc
+        WHERE p.id_product = calc.id_product
+          AND p.min_cost IS DISTINCT FROM calc.new_cost
+        RETURNING p.id_product, p.articul, p.product_name, calc.old_cost, p.min_cost
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        changes = cursor.fetchall()
+
+    changes.sort(key=lambda row: (row[2], row[0]))
+    return changes
+
+
+def calculate_product_cost(width, type_id, product_types):
+    # Стоимость продукта по тому же правилу, что и recalculate_prices:
+    # ширина * базовая стоимость * коэффициент типа, округление до копеек
+    # (как ROUND(double precision::numeric, 2) на сервере). product_types -
+    # строки справочника type_product из кэша (id, название, коэффициент),
+    # поэтому расчет не обращается к базе. None, если тип не найден.
+    for row_type_id, type_name, coefficient in product_types:
+        if row_type_id == type_id:
+            cost = Decimal(f"{width * BASE_COST_PER_METER * coefficient:.15g}")
+            return float(cost.quantize(Decimal("0.01"), ROUND_HALF_UP))
+    return None
+
+
+def calculate_material_requirements(connection, jobs):
+    # Расчет сырья для пачки заданий одним запросом. Задание - кортеж
+    # (id_type_product, id_type_material, количество продукции, ширина, длина[, id_material]).
+    # Сырье на единицу продукции = ширина * длина * коэффициент типа продукции,
+    # на все количество - с учетом процента брака типа материала, округление вверх.
+    # Если указан материал, считается и число целых упаковок (package_quantity).
+    # Возвращает список (сырье, упаковки) в порядке заданий; для некорректного
+    # задания (неизвестные типы, неположительные значения, материал другого
+    # типа) - (-1, -1), упаковки None, если материал не указан.
+    columns = ([], [], [], [], [], [])
+    for job in jobs:
+        job = tuple(job) + (None,) * (6 - len(job))
+        for column, value in zip(columns, job):
+            column.append(value)
+    if not columns[0]:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            WITH jobs AS (
+                SELECT *
+                FROM unnest(%s::integer[], %s::integer[], %s::integer[],
+                            %s::numeric[], %s::numeric[], %s::integer[])
+                     WITH ORDINALITY AS j(id_type_product, id_type_material, quantity, width, length, id_material, n)
+            ),
+            calc AS (
+                SELECT j.n,
+                       j.id_material,
+                       m.package_quantity,
+                       CASE
+                           WHEN tp.id_type_product IS NULL OR tm.id_type_material IS NULL
+                                OR j.quantity IS NULL OR j.quantity <= 0
+                                OR j.width IS NULL OR j.width <= 0
+                                OR j.length IS NULL OR j.length <= 0
+                                OR tm.percentage_material_defects < 0
+                                OR (j.id_material IS NOT NULL AND (m.id_material IS NULL
+                                    OR m.id_type_material <> j.id_type_material
+                                    OR m.package_quantity <= 0))
+                               THEN NULL
+                           ELSE ceil(j.quantity * j.width * j.length
+                                     * tp.coefficient_type_product::numeric
+                                     * (1 + tm.percentage_material_defects::numeric / 100))
+                       END AS required
+                FROM jobs j
+                LEFT JOIN type_product tp ON tp.id_type_product = j.id_type_product
+                LEFT JOIN type_material tm ON tm.id_type_material = j.id_type_material
+                LEFT JOIN materials m ON m.id_material = j.id_material
+            )
+            SELECT coalesce(required, -1)::bigint,
+                   CASE
+                       WHEN required IS NULL THEN -1
+                       WHEN id_material IS NULL THEN NULL
+                       ELSE ceil(required / package_quantity)
+                   END::bigint
+            FROM calc
+            ORDER BY n
+        """, columns)
+        return cursor.fetchall()
+
+
+def write_off_material_requirements(connection, jobs):
+    # Списание сырья на производство: задания пересчитываются в той же
+    # транзакции, по заданиям с указанным материалом сырье одним пакетом
+    # записывается в журнал движения как расход ('production').
+    # Возвращает (результаты расчета, {id_material: новый остаток}).
+    results = calculate_material_requirements(connection, jobs)
+    consumption = {}
+    for job, (required, packages) in zip(jobs, results):
+        material_id = job[5] if len(job) > 5 else None
+        if material_id is not None and required > 0:
+            consumption[material_id] = consumption.get(material_id, 0) + required
+    stock = post_stock_movements(
+        connection, [(material_id, -required) for material_id, required in consumption.items()],
+        "production", "Расчет сырья"
+    )
+    return results, stock
+
+
+# Единицы измерения материалов
+MATERIAL_UNITS = ["шт", "м", "кг", "л", "упак"]
+
+
+def validate_product_fields(articul, type_id, product_name, min_cost, width):
+    # Правила проверки продукта (диалог и импорт); при ошибке - ValueError
+    if not articul:
+        raise ValueError("Артикул не может быть пустым")
+    if not product_name:
+        raise ValueError("Наименование не может быть пустым")
+    if type_id is None:
+        raise ValueError("Не выбран тип продукта")
+    if min_cost <= 0:
+        raise ValueError("Стоимость должна быть положительной")
+    if width <= 0:
+        raise ValueError("Ширина должна быть положительной")
+
+
+def validate_material_fields(material_name, type_id, unit_price, stock_quantity,
+                             min_quantity, package_quantity, unit):
+    # Правила проверки материала (диалог и импорт); при ошибке - ValueError
+    if not material_name:
+        raise ValueError("Наименование не может быть пустым")
+    if type_id is None:
+        raise ValueError("Не выбран тип материала")
+    if unit_price <= 0:
+        raise ValueError("Цена должна быть положительной")
+    if stock_quantity < 0:
+        raise ValueError("Количество на складе не может быть отрицательным")
+    if min_quantity <= 0:
+        raise ValueError("Минимальное количество должно быть положительным")
+    if package_quantity <= 0:
+        raise ValueError("Количество в упаковке должно быть положительным")
+    if unit not in MATERIAL_UNITS:
+        raise ValueError(f"Неизвестная единица измерения: {unit}")
+
+
+# Время жизни справочников в кэше, секунд
+REFERENCE_CACHE_TTL = 300
+
+
+class ReferenceCache:
+    # Кэш редко меняющихся справочников (типы продукции, материалов, партнеров).
+    # Данные устаревают через ttl секунд или после явного invalidate().
+    # Используется и из GUI-потока, и из фоновых задач.
+
+    QUERIES = {
+        "type_product": "SELECT id_type_product, type_product, coefficient_type_product "
+                        "FROM type_product ORDER BY type_product",
+        "type_material": "SELECT id_type_material, type_material, percentage_material_defects "
+                         "FROM type_material ORDER BY type_material",
+        "type_part_sup": "SELECT id_type_part_sup, name FROM type_part_sup ORDER BY name",
+    }
+
+    def __init__(self, ttl=REFERENCE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def peek(self, name):
+        # Данные из кэша без обращения к БД; None, если их нет или они устарели
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def get(self, name, connection):
+        # Данные из кэша, при необходимости загруженные через connection
+        rows = self.peek(name)
+        if rows is None:
+            with connection.cursor() as cursor:
+                cursor.execute(self.QUERIES[name])
+                rows = cursor.fetchall()
+            with self._lock:
+                self._entries[name] = (time.monotonic(), rows)
+        return rows
+
+    def load_all(self, connection):
+        for name in self.QUERIES:
+            self.get(name, connection)
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+
+# Размер страницы списков продукции и материалов
+LIST_PAGE_SIZE = 200
+
+# Канал уведомлений об изменениях каталога (миграция 0006) и таблицы, о которых он сообщает
+CATALOG_CHANNEL = "catalog_changes"
+CATALOG_TABLES = ("products", "materials")
+
+
+def fetch_page(connection, query, key_columns, after, limit, conditions=(), params=()):
+    # Keyset-пагинация: следующая страница после ключа after (кортеж значений
+    # key_columns) без OFFSET. Возвращает (строки, есть_еще).
+    # В query должен быть плейсхолдер {where} для условий фильтра и ключа.
+    conditions = list(conditions)
+    params = list(params)
+    if after is not None:
+        conditions.append(f"({', '.join(key_columns)}) > ({', '.join(['%s'] * len(key_columns))})")
+        params.extend(after)
+    params.append(limit + 1)
+    where = "".join(f" AND {condition}" for condition in conditions)
+
+    with connection.cursor() as cursor:
+        cursor.execute(query.format(where=where), params)
+        rows = cursor.fetchall()
+
+    return rows[:limit], len(rows) > limit
+
+
+def like_escape(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def filter_conditions(filters, prefix_column, contains_column, type_column, price_column):
+    # Условия WHERE для фильтров списка: текст ищется как префикс в prefix_column
+    # (артикул) или как подстрока в contains_column (наименование); оба поиска
+    # обслуживаются триграммными индексами. Возвращает (условия, параметры).
+    conditions = []
+    params = []
+    if not filters:
+        return conditions, params
+
+    text = filters.get("text")
+    if text:
+        pattern = like_escape(text)
+        if prefix_column:
+            conditions.append(f"({prefix_column} ILIKE %s OR {contains_column} ILIKE %s)")
+            params.extend((pattern + "%", "%" + pattern + "%"))
+        else:
+            conditions.append(f"{contains_column} ILIKE %s")
+            params.append("%" + pattern + "%")
+    if filters.get("type_id") is not None:
+        conditions.append(f"{type_column} = %s")
+        params.append(filters["type_id"])
+    if filters.get("price_min") is not None:
+        conditions.append(f"{price_column} >= %s")
+        params.append(filters["price_min"])
+    if filters.get("price_max") is not None:
+        conditions.append(f"{price_column} <= %s")
+        params.append(filters["price_max"])
+    return conditions, params
+
+
+def fetch_products(connection, after=None, limit=LIST_PAGE_SIZE, filters=None, ids=None):
+    # Страница списка продукции, упорядоченного по (product_name, id_product).
+    # Сортировка по байтам (COLLATE "C") совпадает со сравнением строк в Python,
+    # поэтому модель может вставлять сохраненные строки на место без перезагрузки.
+    # ids - только указанные продукты (применение изменений других пользователей).
+    conditions, params = filter_conditions(filters, "p.articul", "p.product_name", "p.id_type_product", "p.min_cost")
+    if ids is not None:
+        conditions.append("p.id_product = ANY(%s)")
+        params.append(list(ids))
+    return fetch_page(connection, """SELECT 
+            p.id_product,
+            tp.type_product,
+            p.product_name,
+            p.min_cost,
+            p.articul,
+            p.width,
+            p.id_type_product
+        FROM products p
+        JOIN type_product tp ON p.id_type_product = tp.id_type_product
+        WHERE TRUE {where}
+        ORDER BY p.product_name COLLATE "C", p.id_product
+        LIMIT %s""", ('p.product_name COLLATE "C"', "p.id_product"), after, limit, conditions, params)
+
+
+def fetch_materials(connection, after=None, limit=LIST_PAGE_SIZE, filters=None, ids=None):
+    # Страница списка материалов, упорядоченного по (material_name, id_material)
+    conditions, params = filter_conditions(filters, None, "m.material_name", "m.id_type_material", "m.unit_price")
+    if ids is not None:
+        conditions.append("m.id_material = ANY(%s)")
+        params.append(list(ids))
+    return fetch_page(connection, """SELECT 
+            m.id_material,
+            tm.type_material,
+            m.material_name,
+            m.unit_price,
+            m.stock_quantity,
+            m.min_quantity,
+            m.package_quantity,
+            m.unit,
+            m.id_type_material
+        FROM materials m
+        JOIN type_material tm ON m.id_type_material = tm.id_type_material
+        WHERE TRUE {where}
+        ORDER BY m.material_name COLLATE "C", m.id_material
+        LIMIT %s""", ('m.material_name COLLATE "C"', "m.id_material"), after, limit, conditions, params)
+
+
+# Скидка партнера по объему продаж за все время (штук продукции):
+# от порога и выше - указанный процент
+PARTNER_DISCOUNT_TIERS = ((300000, 15), (50000, 10), (10000, 5))
+
+
+def partner_discount(total_quantity):
+    for threshold, discount in PARTNER_DISCOUNT_TIERS:
+        if total_quantity >= threshold:
+            return discount
+    return 0
+
+
+def fetch_product_quote(connection, product_id, quantity, partner_id=None):
+    # Стоимость партии продукции: цена - min_cost, скидка партнера (если указан) -
+    # по объему его продаж (partner_discount). Один запрос и для продукта, и для партнера.
+    # Возвращает (id_product, артикул, наименование, цена, количество, скидка %, сумма)
+    # или None, если продукт или партнер не найден.
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT p.articul, p.product_name, p.min_cost, pa.id_part, coalesce(s.total_quantity, 0)
+            FROM products p
+            LEFT JOIN partners pa ON pa.id_part = %s
+            LEFT JOIN partner_sales_summary s ON s.id_part = pa.id_part
+            WHERE p.id_product = %s
+        """, (partner_id, product_id))
+        row = cursor.fetchone()
+
+    if row is None:
+        return None
+    articul, product_name, price, found_partner_id, total_quantity = row
+    if partner_id is not None and found_partner_id is None:
+        return None
+    discount = partner_discount(total_quantity) if partner_id is not None else 0
+    total = round(price * quantity * (100 - discount) / 100, 2)
+    return product_id, articul, product_name, price, quantity, discount, total
+
+
+def fetch_partners(connection, after=None, limit=LIST_PAGE_SIZE, filters=None):
+    # Страница списка партнеров с итогами продаж из partner_sales_summary
+    # (поддерживается триггерами на requests, миграция 0007).
+    # Фильтр "цены" работает по объему продаж.
+    conditions, params = filter_conditions(filters, None, "p.partner_name", "p.id_type_part",
+                                           "coalesce(s.total_quantity, 0)")
+    return fetch_page(connection, """SELECT 
+            p.id_part,
+            t.name,
+            p.partner_name,
+            p.director,
+            p.phone_number,
+            p.rating,
+            coalesce(s.total_quantity, 0),
+            coalesce(s.requests_count, 0),
+            s.last_request_date,
+            p.id_type_part
+        FROM partners p
+        JOIN type_part_sup t ON p.id_type_part = t.id_type_part_sup
+        LEFT JOIN partner_sales_summary s ON s.id_part = p.id_part
+        WHERE TRUE {where}
+        ORDER BY p.partner_name COLLATE "C", p.id_part
+        LIMIT %s""", ('p.partner_name COLLATE "C"', "p.id_part"), after, limit, conditions, params)
+
+
+def fetch_product_form(connection, reference_cache, product_id=None):
+    # Типы продукции (из кэша справочников) и (при редактировании) данные продукта для диалога
+    types = reference_cache.get("type_product", connection)
+
+    product_data = None
+    if product_id:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT articul, id_type_product, product_name, min_cost, width 
+                FROM products 
+                WHERE id_product = %s
+            """, (product_id,))
+            product_data = cursor.fetchone()
+
+    return types, product_data
+
+
+def fetch_material_form(connection, reference_cache, material_id=None):
+    # Типы материалов (из кэша справочников) и (при редактировании) данные материала для диалога
+    types = reference_cache.get("type_material", connection)
+
+    material_data = None
+    if material_id:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT material_name, id_type_material, unit_price, 
+                       stock_quantity, min_quantity, package_quantity, unit 
+                FROM materials 
+                WHERE id_material = %s
+            """, (material_id,))
+            material_data = cursor.fetchone()
+
+    return types, material_data
+
+
+def fetch_replenishment_plan(connection):
+    # План пополнения: все материалы ниже минимального остатка одним запросом.
+    # Недостача округляется вверх до целых упаковок и оценивается по unit_price;
+    # поставщик - из последней поставки материала (supplies).
+    # Строка: (id_material, наименование, тип, поставщик или None, остаток, минимум,
+    #          недостача, упаковок или None, к заказу, единица, сумма)
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            WITH low AS (
+                SELECT m.*, m.min_quantity - m.stock_quantity AS shortfall
+                FROM materials m
+                WHERE m.stock_quantity < m.min_quantity
+            ),
+            last_supply AS (
+                SELECT DISTINCT ON (s.id_material) s.id_material, s.id_suppliers
+                FROM supplies s
+                JOIN low ON low.id_material = s.id_material
+                ORDER BY s.id_material, s.id_supplies DESC
+            ),
+            plan AS (
+                SELECT low.*,
+                       CASE WHEN low.package_quantity > 0
+                            THEN ceil(low.shortfall::numeric / low.package_quantity)::integer
+                       END AS packages
+                FROM low
+            )
+            SELECT p.id_material,
+                   p.material_name,
+                   tm.type_material,
+                   sp.supplier_name,
+                   p.stock_quantity,
+                   p.min_quantity,
+                   p.shortfall,
+                   p.packages,
+                   coalesce(p.packages * p.package_quantity, p.shortfall) AS order_quantity,
+                   p.unit,
+                   coalesce(p.packages * p.package_quantity, p.shortfall) * p.unit_price AS cost
+            FROM plan p
+            JOIN type_material tm ON tm.id_type_material = p.id_type_material
+            LEFT JOIN last_supply ls ON ls.id_material = p.id_material
+            LEFT JOIN suppliers sp ON sp.id_suppliers = ls.id_suppliers
+            ORDER BY sp.supplier_name NULLS LAST, p.material_name COLLATE "C", p.id_material
+        """)
+        return cursor.fetchall()
+
+
+def fetch_calculator_data(connection, reference_cache):
+    # Справочники для калькулятора сырья и материалы (id, наименование, тип, в упаковке)
+    product_types = reference_cache.get("type_product", connection)
+    material_types = reference_cache.get("type_material", connection)
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT id_material, material_name, id_type_material, package_quantity
+            FROM materials
+            ORDER BY material_name COLLATE "C", id_material
+        """)
+        materials = cursor.fetchall()
+    return product_types, material_types, materials
+
+
+def save_product_row(connection, product_id, articul, type_id, product_name, min_cost, width):
+    # Добавление (product_id = None) или обновление продукта.
+    # Возвращает сохраненную строку в формате списка продукции.
+    with connection.cursor() as cursor:
+        if product_id:
+            statement = """
+                UPDATE products 
+                SET articul = %s, 
+                    id_type_product = %s, 
+                    product_name = %s, 
+                    min_cost = %s, 
+                    width = %s
+                WHERE id_product = %s
+                RETURNING id_product, id_type_product, product_name, min_cost, articul, width
+            """
+            params = (articul, type_id, product_name, min_cost, width, product_id)
+        else:
+            statement = """
+                INSERT INTO products 
+                (articul, id_type_product, product_name, min_cost, width)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id_product, id_type_product, product_name, min_cost, articul, width
+            """
+            params = (articul, type_id, product_name, min_cost, width)
+
+        try:
+            cursor.execute(f"""
+                WITH saved AS ({statement})
+                SELECT s.id_product, tp.type_product, s.product_name, s.min_cost, s.articul, s.width, s.id_type_product
+                FROM saved s
+                JOIN type_product tp ON s.id_type_product = tp.id_type_product
+            """, params)
+        except psycopg2.errors.UniqueViolation:
+            # ограничение products_articul_key из миграции 0004
+            raise ValueError(f"Продукт с артикулом {articul} уже существует")
+        row = cursor.fetchone()
+        if row is None:
+            # UPDATE не нашел строку: продукт удалил другой пользователь
+            raise ValueError("Продукт не найден (возможно, удален)")
+        return row
+
+
+def save_material_row(connection, material_id, material_name, type_id, unit_price,
+                      stock_quantity, min_quantity, package_quantity, unit, loaded_stock_quantity=None):
+    # Добавление (material_id = None) или обновление материала.
+    # Остаток существующего материала не перезаписывается: разница между
+    # stock_quantity и остатком, который был загружен в форму
+    # (loaded_stock_quantity), записывается в журнал движения как
+    # корректировка, поэтому приход и расход, проведенные другими
+    # пользователями за это время, сохраняются. Без loaded_stock_quantity
+    # остаток не меняется.
+    # Возвращает сохраненную строку в формате списка материалов.
+    with connection.cursor() as cursor:
+        if material_id:
+            if loaded_stock_quantity is not None and stock_quantity != loaded_stock_quantity:
+                post_stock_movements(connection, [(material_id, stock_quantity - loaded_stock_quantity)],
+                                     "adjustment", "Изменение в карточке материала")
+            statement = """
+                UPDATE materials 
+                SET material_name = %s, 
+                    id_type_material = %s, 
+                    unit_price = %s, 
+                    min_quantity = %s, 
+                    package_quantity = %s, 
+                    unit = %s
+                WHERE id_material = %s
+                RETURNING *
+            """
+            params = (material_name, type_id, unit_price, min_quantity, package_quantity, unit, material_id)
+        else:
+            # начальный остаток попадает в журнал триггером materials_opening_balance
+            statement = """
+                INSERT INTO materials 
+                (material_name, id_type_material, unit_price, 
+                 stock_quantity, min_quantity, package_quantity, unit)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                RETURNING *
+            """
+            params = (material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit)
+
+        cursor.execute(f"""
+            WITH saved AS ({statement})
+            SELECT s.id_material, tm.type_material, s.material_name, s.unit_price,
+                   s.stock_quantity, s.min_quantity, s.package_quantity, s.unit, s.id_type_material
+            FROM saved s
+            JOIN type_material tm ON s.id_type_material = tm.id_type_material
+        """, params)
+        row = cursor.fetchone()
+        if row is None:
+            # UPDATE не нашел строку: материал удалил другой пользователь
+            raise ValueError("Материал не найден (возможно, удален)")
+        return row
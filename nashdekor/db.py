@@ -0,0 +1,482 @@
+# Подключение к базе данных: настройки, пул соединений, статистика запросов и миграции схемы
+import os
+import sys
+import json
+import time
+import threading
+import configparser
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.pool
+import psycopg2.errors
+import psycopg2.extensions
+
+
+# Папка приложения: main.py, db.ini, migrations
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Файл настроек подключения (лежит рядом с main.py); переменные окружения
+# NASHDEKOR_DB_* имеют приоритет над файлом
+DB_CONFIG_FILE = os.path.join(APP_DIR, "db.ini")
+
+DB_DEFAULTS = {
+    "dbname": "postgres",
+    "user": "postgres",
+    "password": "toor",
+    "host": "localhost",
+    "port": "5432",
+    "connect_timeout": "5",
+    "min_connections": "1",
+    "max_connections": "4",
+    "health_check_interval": "30",
+    "snapshot_file": "",
+    "slow_query_ms": "200",
+    "slow_query_log": "",
+    "stats_file": "",
+}
+
+
+def load_db_config(path=DB_CONFIG_FILE):
+    # Параметры подключения: значения по умолчанию <- секция [database] файла <- окружение
+    config = dict(DB_DEFAULTS)
+
+    parser = configparser.ConfigParser()
+    if parser.read(path, encoding="utf-8") and parser.has_section("database"):
+        for key in DB_DEFAULTS:
+            if parser.has_option("database", key):
+                config[key] = parser.get("database", key)
+
+    for key in DB_DEFAULTS:
+        value = os.environ.get(f"NASHDEKOR_DB_{key.upper()}")
+        if value is not None:
+            config[key] = value
+
+    return config
+
+
+# Журнал медленных запросов по умолчанию (лежит рядом с main.py)
+SLOW_QUERY_LOG_FILE = os.path.join(APP_DIR, "slow_queries.log")
+
+# Сколько разных текстов запросов хранить в статистике; остальные идут в одну строку
+QUERY_STATS_LIMIT = 500
+
+# Длина текста запроса в журнале медленных запросов
+SLOW_QUERY_TEXT_LIMIT = 2000
+
+
+class QueryStats:
+    # Статистика запросов к базе: гистограмма времени по каждому тексту запроса
+    # и итоги по действиям пользователя (число обращений к серверу, строки, время).
+    # Запросы дольше slow_query_ms пишутся в журнал медленных запросов.
+
+    # Верхние границы интервалов гистограммы, мс
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+    OTHER_QUERIES = "(прочие запросы)"
+
+    def __init__(self, slow_query_ms=200, slow_query_log=SLOW_QUERY_LOG_FILE):
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.statements = {}
+            self.actions = {}
+            self.started_at = time.time()
+
+    def cursor_factory(self, connection, name=None):
+        # Передается в psycopg2 как cursor_factory: все курсоры соединений пула замеряются
+        cursor = TimedCursor(connection, name)
+        cursor.stats = self
+        return cursor
+
+    @contextmanager
+    def action(self, name):
+        # Запросы внутри блока относятся к действию name (одна фоновая задача)
+        current = {"name": name, "round_trips": 0, "rows": 0, "db_ms": 0.0}
+        self._local.action = current
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._local.action = None
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                totals = self.actions.setdefault(name, {
+                    "count": 0, "errors": 0, "round_trips": 0, "max_round_trips": 0,
+                    "rows": 0, "db_ms": 0.0, "elapsed_ms": 0.0, "max_elapsed_ms": 0.0,
+                })
+                totals["count"] += 1
+                totals["errors"] += failed
+                totals["round_trips"] += current["round_trips"]
+                totals["max_round_trips"] = max(totals["max_round_trips"], current["round_trips"])
+                totals["rows"] += current["rows"]
+                totals["db_ms"] += current["db_ms"]
+                totals["elapsed_ms"] += elapsed_ms
+                totals["max_elapsed_ms"] = max(totals["max_elapsed_ms"], elapsed_ms)
+
+    def record(self, query, duration_ms, rows, sent_query=None):
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        text = " ".join(str(query).split())
+        rows = max(rows, 0)
+
+        current = getattr(self._local, "action", None)
+        if current is not None:
+            current["round_trips"] += 1
+            current["rows"] += rows
+            current["db_ms"] += duration_ms
+
+        with self._lock:
+            entry = self.statements.get(text)
+            if entry is None:
+                if len(self.statements) >= QUERY_STATS_LIMIT:
+                    text = self.OTHER_QUERIES
+                entry = self.statements.setdefault(text, {
+                    "count": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "buckets": [0] * (len(self.BUCKETS_MS) + 1),
+                })
+            entry["count"] += 1
+            entry["rows"] += rows
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["buckets"][self._bucket(duration_ms)] += 1
+
+        if self.slow_query_ms > 0 and duration_ms >= self.slow_query_ms:
+            self._log_slow(sent_query or text, duration_ms, rows, current["name"] if current else None)
+
+    def _bucket(self, duration_ms):
+        for index, bound in enumerate(self.BUCKETS_MS):
+            if duration_ms <= bound:
+                return index
+        return len(self.BUCKETS_MS)
+
+    def _percentile(self, entry, fraction):
+        # Оценка сверху: граница интервала гистограммы, в который попал перцентиль
+        threshold = entry["count"] * fraction
+        seen = 0
+        for index, count in enumerate(entry["buckets"]):
+            seen += count
+            if seen >= threshold and count:
+                if index < len(self.BUCKETS_MS):
+                    return min(self.BUCKETS_MS[index], entry["max_ms"])
+                break
+        return entry["max_ms"]
+
+    def _log_slow(self, query, duration_ms, rows, action):
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        line = json.dumps({
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "action": action,
+            "ms": round(duration_ms, 1),
+            "rows": rows,
+            "query": " ".join(query.split())[:SLOW_QUERY_TEXT_LIMIT],
+        }, ensure_ascii=False)
+        with self._lock:
+            try:
+                with open(self.slow_query_log, "a", encoding="utf-8") as file:
+                    file.write(line + "\n")
+            except OSError:
+                # Журнал не должен мешать работе: недоступный файл просто пропускаем
+                pass
+
+    def snapshot(self):
+        # Текущая статистика в виде, пригодном для JSON и панели диагностики
+        with self._lock:
+            statements = [
+                {
+                    "query": text,
+                    "count": entry["count"],
+                    "rows": entry["rows"],
+                    "total_ms": round(entry["total_ms"], 2),
+                    "mean_ms": round(entry["total_ms"] / entry["count"], 2),
+                    "p50_ms": round(self._percentile(entry, 0.5), 2),
+                    "p95_ms": round(self._percentile(entry, 0.95), 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                    "histogram": {
+                        (f"<={bound}" if index < len(self.BUCKETS_MS) else f">{self.BUCKETS_MS[-1]}"): count
+                        for index, (bound, count) in enumerate(
+                            zip(self.BUCKETS_MS + (None,), entry["buckets"]))
+                        if count
+                    },
+                }
+                for text, entry in self.statements.items()
+            ]
+            actions = [
+                {
+                    "action": name,
+                    "count": totals["count"],
+                    "errors": totals["errors"],
+                    "round_trips": totals["round_trips"],
+                    "mean_round_trips": round(totals["round_trips"] / totals["count"], 2),
+                    "max_round_trips": totals["max_round_trips"],
+                    "rows": totals["rows"],
+                    "mean_db_ms": round(totals["db_ms"] / totals["count"], 2),
+                    "mean_elapsed_ms": round(totals["elapsed_ms"] / totals["count"], 2),
+                    "max_elapsed_ms": round(totals["max_elapsed_ms"], 2),
+                }
+                for name, totals in self.actions.items()
+            ]
+            started_at = self.started_at
+
+        statements.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        actions.sort(key=lambda entry: entry["action"])
+        return {
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at)),
+            "generated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "slow_query_ms": self.slow_query_ms,
+            "statements": statements,
+            "actions": actions,
+        }
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, ensure_ascii=False, indent=2)
+
+
+def dump_query_stats(db):
+    # Сохраняет статистику запросов при выходе, если в настройках задан stats_file
+    path = db.config["stats_file"]
+    if not path:
+        return
+    try:
+        db.stats.dump(path)
+    except OSError as e:
+        print(f"Не удалось сохранить статистику запросов: {str(e)}", file=sys.stderr)
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    # Курсор, замеряющий каждое обращение к серверу (см. QueryStats)
+    stats = None
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(query, started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._record(sql, started)
+
+    def _record(self, query, started):
+        if self.stats is not None:
+            self.stats.record(query, (time.perf_counter() - started) * 1000, self.rowcount, self.query)
+
+
+class ConnectionManager:
+    # Пул соединений с PostgreSQL. Каждая операция берет соединение в аренду
+    # (lease) и возвращает его обратно; разорванные соединения отбрасываются,
+    # а пул пересоздается при следующем обращении после рестарта сервера.
+
+    def __init__(self, config):
+        self.config = config
+        self.min_connections = int(config["min_connections"])
+        self.max_connections = int(config["max_connections"])
+        self.health_check_interval = float(config["health_check_interval"])
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._last_used = {}
+        # Сколько заняло последнее создание пула (подключение к серверу), секунд
+        self.connect_time = None
+
+        # Замеры всех запросов, выполненных через соединения менеджера
+        self.stats = QueryStats(float(config["slow_query_ms"]), config["slow_query_log"] or SLOW_QUERY_LOG_FILE)
+
+    def connect_kwargs(self):
+        return {
+            "dbname": self.config["dbname"],
+            "user": self.config["user"],
+            "password": self.config["password"],
+            "host": self.config["host"],
+            "port": self.config["port"],
+            "connect_timeout": int(self.config["connect_timeout"]),
+            "cursor_factory": self.stats.cursor_factory,
+        }
+
+    def connect(self):
+        # Создает пул (при необходимости); ошибки подключения пробрасываются
+        with self._lock:
+            if self._pool is None:
+                started = time.perf_counter()
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.min_connections, self.max_connections, **self.connect_kwargs()
+                )
+                self.connect_time = time.perf_counter() - started
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            self._last_used.clear()
+
+    def _is_healthy(self, connection):
+        if connection.closed:
+            return False
+
+        # Простаивавшее соединение проверяем запросом SELECT 1
+        last_used = self._last_used.get(id(connection), 0)
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _acquire(self):
+        pool = self.connect()
+        for _ in range(self.max_connections + 1):
+            connection = pool.getconn()
+            if self._is_healthy(connection):
+                return pool, connection
+            self._last_used.pop(id(connection), None)
+            pool.putconn(connection, close=True)
+        raise psycopg2.OperationalError("Не удалось получить рабочее соединение с базой данных")
+
+    @contextmanager
+    def lease(self):
+        # Соединение в аренду на одну операцию
+        pool, connection = self._acquire()
+        try:
+            yield connection
+        finally:
+            broken = bool(connection.closed)
+            if broken:
+                self._last_used.pop(id(connection), None)
+            else:
+                self._last_used[id(connection)] = time.monotonic()
+            try:
+                pool.putconn(connection, close=broken)
+            except psycopg2.pool.PoolError:
+                # Пул был закрыт или пересоздан, пока соединение было в аренде
+                connection.close()
+
+    def run(self, fn, retries=0, on_lease=None):
+        # Выполняет fn(connection) в транзакции: commit при успехе, rollback при ошибке.
+        # При обрыве соединения операция повторяется до retries раз -
+        # передавайте retries > 0 только для идемпотентных чтений.
+        attempt = 0
+        while True:
+            try:
+                with self.lease() as connection:
+                    if on_lease is not None:
+                        on_lease(connection)
+                    try:
+                        result = fn(connection)
+                        connection.commit()
+                        return result
+                    except Exception:
+                        if not connection.closed:
+                            connection.rollback()
+                        raise
+                    finally:
+                        if on_lease is not None:
+                            on_lease(None)
+            except psycopg2.extensions.QueryCanceledError:
+                raise
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                if attempt >= retries:
+                    raise
+                attempt += 1
+                self._mark_all_suspect()
+                time.sleep(0.2 * attempt)
+
+    def _mark_all_suspect(self):
+        # После обрыва (например, рестарта сервера) проверяем каждое соединение пула
+        # при следующей выдаче, не дожидаясь интервала проверки
+        self._last_used.clear()
+
+
+# Версионированные миграции схемы: файлы NNNN_описание.sql в папке migrations
+# применяются по порядку номеров, примененные версии хранятся в schema_migrations
+MIGRATIONS_DIR = os.path.join(APP_DIR, "migrations")
+
+# Ключ advisory-блокировки: несколько одновременно запущенных копий приложения
+# применяют миграции по очереди
+MIGRATIONS_LOCK_KEY = 4720531
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    # Список (версия, имя файла) в порядке версий
+    migrations = []
+    if not os.path.isdir(directory):
+        return migrations
+    for file_name in os.listdir(directory):
+        prefix, _, rest = file_name.partition("_")
+        if file_name.endswith(".sql") and prefix.isdigit() and rest:
+            migrations.append((int(prefix), file_name))
+    migrations.sort()
+    return migrations
+
+
+def apply_migrations(connection, directory=MIGRATIONS_DIR):
+    # Применяет недостающие миграции, каждую в отдельной транзакции.
+    # Возвращает список имен примененных файлов.
+    applied = []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_KEY,))
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version integer PRIMARY KEY,
+                    name text NOT NULL,
+                    applied_at timestamp with time zone NOT NULL DEFAULT now()
+                )
+            """)
+            cursor.execute("SELECT version FROM schema_migrations")
+            done = {row[0] for row in cursor.fetchall()}
+            connection.commit()
+
+            for version, file_name in list_migrations(directory):
+                if version in done:
+                    continue
+                with open(os.path.join(directory, file_name), encoding="utf-8") as file:
+                    statement = file.read()
+                try:
+                    cursor.execute(statement)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                        (version, file_name)
+                    )
+                    connection.commit()
+                except psycopg2.Error as e:
+                    connection.rollback()
+                    message = e.diag.message_primary or str(e)
+                    raise RuntimeError(f"Миграция {file_name} не применена: {message}") from e
+                applied.append(file_name)
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_KEY,))
+            connection.commit()
+    return applied
+
+
+def is_connection_error(error):
+    # Нет связи с сервером (в отличие от ошибок самого запроса)
+    return (isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            and not isinstance(error, (psycopg2.extensions.QueryCanceledError,
+                                       psycopg2.extensions.TransactionRollbackError)))
@@ -0,0 +1,146 @@
+# Отчеты по предрасчитанным таблицам (миграция 0008)
+
+
+# Ключ advisory-блокировки обновления отчетов (одно обновление за раз)
+REPORTS_LOCK_KEY = 4720532
+
+# Разрезы отчета о продажах: (заголовок, соединение со справочником, название)
+SALES_REPORT_DIMENSIONS = {
+    "product_type": ("Тип продукции",
+                     "JOIN type_product d ON d.id_type_product = r.id_type_product", "d.type_product"),
+    "partner_type": ("Тип партнера",
+                     "JOIN type_part_sup d ON d.id_type_part_sup = r.id_type_part", "d.name"),
+    "employee": ("Сотрудник",
+                 "JOIN employees d ON d.id_employ = r.id_employ", "d.fio"),
+}
+
+
+def refresh_reports(connection, full=False):
+    # Пополняет таблицы отчетов (миграция 0008) строками requests и supplies из
+    # очереди report_queue (миграция 0010); остатки по типам материалов
+    # пересчитываются целиком (это текущее состояние, а не журнал). Изменения и
+    # удаление уже учтенных заявок и поставок подхватывает только полный
+    # пересчет (full=True). Очередь разбирается тем же запросом, что читает
+    # исходную таблицу, поэтому строки, зафиксированные позже, остаются в
+    # очереди до следующего обновления, а не теряются.
+    # Возвращает (новых заявок, новых поставок).
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (REPORTS_LOCK_KEY,))
+
+        if full:
+            cursor.execute("TRUNCATE report_sales_monthly, report_supplies")
+
+        # Заявки: cost - цена за единицу, выручка = cost * count
+        cursor.execute("""
+            WITH queued AS (
+                DELETE FROM report_queue WHERE source = 'requests' RETURNING id
+            ),
+            new_requests AS (
+                SELECT date_trunc('month', r.date)::date AS month,
+                       p.id_type_product,
+                       pa.id_type_part,
+                       r.id_employ,
+                       sum(r.count) AS quantity,
+                       sum(r.cost * r.count)::numeric(18, 2) AS revenue,
+                       count(*) AS requests_count
+                FROM requests r
+                JOIN products p ON p.id_product = r.id_product
+                JOIN partners pa ON pa.id_part = r.id_part
+                WHERE %(full)s OR r.id_req IN (SELECT id FROM queued)
+                GROUP BY 1, 2, 3, 4
+            ),
+            merged AS (
+                INSERT INTO report_sales_monthly AS t
+                       (month, id_type_product, id_type_part, id_employ, quantity, revenue, requests_count)
+                SELECT month, id_type_product, id_type_part, id_employ, quantity, revenue, requests_count
+                FROM new_requests
+                ON CONFLICT (month, id_type_product, id_type_part, id_employ) DO UPDATE
+                SET quantity = t.quantity + EXCLUDED.quantity,
+                    revenue = t.revenue + EXCLUDED.revenue,
+                    requests_count = t.requests_count + EXCLUDED.requests_count
+            )
+            SELECT coalesce(sum(requests_count), 0) FROM new_requests
+        """, {"full": full})
+        new_requests = cursor.fetchone()[0]
+
+        cursor.execute("""
+            WITH queued AS (
+                DELETE FROM report_queue WHERE source = 'supplies' RETURNING id
+            ),
+            new_supplies AS (
+                SELECT m.id_type_material,
+                       s.id_suppliers,
+                       sum(s.count) AS quantity,
+                       count(*) AS deliveries_count
+                FROM supplies s
+                JOIN materials m ON m.id_material = s.id_material
+                WHERE %(full)s OR s.id_supplies IN (SELECT id FROM queued)
+                GROUP BY 1, 2
+            ),
+            merged AS (
+                INSERT INTO report_supplies AS t (id_type_material, id_suppliers, quantity, deliveries_count)
+                SELECT id_type_material, id_suppliers, quantity, deliveries_count
+                FROM new_supplies
+                ON CONFLICT (id_type_material, id_suppliers) DO UPDATE
+                SET quantity = t.quantity + EXCLUDED.quantity,
+                    deliveries_count = t.deliveries_count + EXCLUDED.deliveries_count
+            )
+            SELECT coalesce(sum(deliveries_count), 0) FROM new_supplies
+        """, {"full": full})
+        new_supplies = cursor.fetchone()[0]
+
+        cursor.execute("DELETE FROM report_stock_by_type")
+        cursor.execute("""
+            INSERT INTO report_stock_by_type
+                   (id_type_material, materials_count, stock_quantity, stock_value, below_min_count)
+            SELECT id_type_material,
+                   count(*),
+                   sum(stock_quantity),
+                   sum(stock_quantity * unit_price),
+                   count(*) FILTER (WHERE stock_quantity < min_quantity)
+            FROM materials
+            GROUP BY id_type_material
+        """)
+
+        cursor.execute("UPDATE report_refreshed_at SET refreshed_at = now()")
+
+    return int(new_requests), int(new_supplies)
+
+
+def fetch_reports(connection, dimension):
+    # Данные страницы отчетов - только из таблиц отчетов.
+    # Возвращает (продажи, поставки, остатки, время обновления).
+    title, join, name_column = SALES_REPORT_DIMENSIONS[dimension]
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT to_char(r.month, 'YYYY-MM'), {name_column},
+                   sum(r.quantity), sum(r.revenue), sum(r.requests_count)
+            FROM report_sales_monthly r
+            {join}
+            GROUP BY r.month, {name_column}
+            ORDER BY r.month DESC, sum(r.revenue) DESC
+        """)
+        sales = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT tm.type_material, sp.supplier_name, r.quantity, r.deliveries_count
+            FROM report_supplies r
+            JOIN type_material tm ON tm.id_type_material = r.id_type_material
+            JOIN suppliers sp ON sp.id_suppliers = r.id_suppliers
+            ORDER BY tm.type_material, r.quantity DESC
+        """)
+        supplies = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT tm.type_material, r.materials_count, r.stock_quantity, r.stock_value, r.below_min_count
+            FROM report_stock_by_type r
+            JOIN type_material tm ON tm.id_type_material = r.id_type_material
+            ORDER BY r.stock_value DESC
+        """)
+        stock = cursor.fetchall()
+
+        cursor.execute("SELECT refreshed_at FROM report_refreshed_at")
+        row = cursor.fetchone()
+        refreshed_at = row[0] if row else None
+
+    return sales, supplies, stock, refreshed_at
@@ -0,0 +1,213 @@
+# Локальная копия каталога в SQLite
+import os
+import json
+import sqlite3
+import threading
+from decimal import Decimal
+
+from nashdekor.db import APP_DIR
+from nashdekor.catalog import LIST_PAGE_SIZE, ReferenceCache
+
+
+# Локальная копия (SQLite) продукции, материалов и справочников: с нее список
+# открывается сразу при запуске, и по ней можно работать без связи с сервером
+SNAPSHOT_FILE = os.path.join(APP_DIR, "snapshot.sqlite3")
+
+# Таблицы копии: (первичный ключ, колонка сортировки, колонки, справочник типов,
+# колонка типа, колонки поиска по префиксу и по подстроке, колонка цены)
+SNAPSHOT_TABLES = {
+    "products": ("id_product", "product_name",
+                 ("id_product", "product_name", "articul", "min_cost", "width", "id_type_product"),
+                 "type_product", "id_type_product", "articul", "product_name", "min_cost"),
+    "materials": ("id_material", "material_name",
+                  ("id_material", "material_name", "unit_price", "stock_quantity", "min_quantity",
+                   "package_quantity", "unit", "id_type_material"),
+                  "type_material", "id_type_material", None, "material_name", "unit_price"),
+}
+
+
+class SnapshotStore:
+    # Локальная копия в SQLite. Пишется из фоновой задачи синхронизации,
+    # читается из GUI-потока, поэтому все обращения идут под блокировкой.
+    # Строки отдаются в том же формате, что fetch_products/fetch_materials.
+
+    def __init__(self, path, source):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        # Регистронезависимый поиск по кириллице: встроенный lower() SQLite знает только ASCII
+        self._connection.create_function("py_lower", 1, lambda value: value.lower() if value else value,
+                                         deterministic=True)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            for table, (key_column, name_column, columns, *rest) in SNAPSHOT_TABLES.items():
+                self._connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ({key_column} INTEGER PRIMARY KEY, "
+                    f"{', '.join(column for column in columns if column != key_column)})"
+                )
+                self._connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_order ON {table} ({name_column}, {key_column})"
+                )
+            # Копия другой базы данных не используется
+            if self._get_meta("source") != source:
+                for table in SNAPSHOT_TABLES:
+                    self._connection.execute(f"DELETE FROM {table}")
+                self._connection.execute("DELETE FROM meta")
+                self._set_meta("source", source)
+
+    def _get_meta(self, key):
+        row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def horizon(self, table):
+        # Граница синхронизации таблицы (xmin-горизонт сервера) или None до первой загрузки
+        with self._lock:
+            value = self._get_meta(f"horizon:{table}")
+        return None if value is None else int(value)
+
+    def has_rows(self, table):
+        with self._lock:
+            return self._connection.execute(f"SELECT EXISTS (SELECT 1 FROM {table})").fetchone()[0] == 1
+
+    def checksum(self, table):
+        key_column = SNAPSHOT_TABLES[table][0]
+        with self._lock:
+            count, total = self._connection.execute(
+                f"SELECT count(*), coalesce(sum({key_column}), 0) FROM {table}"
+            ).fetchone()
+        return count, total
+
+    def apply(self, table, rows, horizon, full=False):
+        # Запись измененных строк (или всей таблицы при full) одной транзакцией
+        key_column, name_column, columns = SNAPSHOT_TABLES[table][:3]
+        with self._lock, self._connection:
+            if full:
+                self._connection.execute(f"DELETE FROM {table}")
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [tuple(float(value) if isinstance(value, Decimal) else value for value in row) for row in rows]
+            )
+            self._set_meta(f"horizon:{table}", str(horizon))
+
+    def retain(self, table, ids):
+        # Удаляет строки, которых больше нет на сервере (ids - все id сервера)
+        key_column = SNAPSHOT_TABLES[table][0]
+        with self._lock, self._connection:
+            self._connection.execute("CREATE TEMP TABLE IF NOT EXISTS retain_ids (id INTEGER PRIMARY KEY)")
+            self._connection.execute("DELETE FROM retain_ids")
+            self._connection.executemany("INSERT INTO retain_ids (id) VALUES (?)", ((row_id,) for row_id in ids))
+            deleted = self._connection.execute(
+                f"DELETE FROM {table} WHERE {key_column} NOT IN (SELECT id FROM retain_ids)"
+            ).rowcount
+            self._connection.execute("DELETE FROM retain_ids")
+        return deleted
+
+    def set_reference(self, name, rows):
+        with self._lock, self._connection:
+            self._set_meta(f"reference:{name}", json.dumps(
+                [[float(value) if isinstance(value, Decimal) else value for value in row] for row in rows]
+            ))
+
+    def reference(self, name):
+        with self._lock:
+            value = self._get_meta(f"reference:{name}")
+        return None if value is None else [tuple(row) for row in json.loads(value)]
+
+    def fetch_page(self, table, after=None, limit=LIST_PAGE_SIZE, filters=None):
+        # Страница списка из копии: тот же порядок и те же фильтры, что на сервере
+        (key_column, name_column, columns, reference_name, type_column,
+         prefix_column, contains_column, price_column) = SNAPSHOT_TABLES[table]
+        conditions = []
+        params = []
+        filters = filters or {}
+        text = (filters.get("text") or "").lower()
+        if text:
+            if prefix_column:
+                conditions.append(f"(instr(py_lower({prefix_column}), ?) = 1 OR instr(py_lower({contains_column}), ?) > 0)")
+                params.extend((text, text))
+            else:
+                conditions.append(f"instr(py_lower({contains_column}), ?) > 0")
+                params.append(text)
+        if filters.get("type_id") is not None:
+            conditions.append(f"{type_column} = ?")
+            params.append(filters["type_id"])
+        if filters.get("price_min") is not None:
+            conditions.append(f"{price_column} >= ?")
+            params.append(filters["price_min"])
+        if filters.get("price_max") is not None:
+            conditions.append(f"{price_column} <= ?")
+            params.append(filters["price_max"])
+        if after is not None:
+            conditions.append(f"({name_column}, {key_column}) > (?, ?)")
+            params.extend(after)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(columns)} FROM {table} {where} "
+                f"ORDER BY {name_column}, {key_column} LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+        type_names = {row[0]: row[1] for row in self.reference(reference_name) or []}
+
+        # Порядок колонок как в списке: id, тип, наименование, ... , id типа
+        result = []
+        for row in rows[:limit]:
+            if table == "products":
+                product_id, product_name, articul, min_cost, width, type_id = row
+                result.append((product_id, type_names.get(type_id, ""), product_name, min_cost, articul, width, type_id))
+            else:
+                (material_id, material_name, unit_price, stock_quantity, min_quantity,
+                 package_quantity, unit, type_id) = row
+                result.append((material_id, type_names.get(type_id, ""), material_name, unit_price, stock_quantity,
+                               min_quantity, package_quantity, unit, type_id))
+        return result, len(rows) > limit
+
+
+def sync_snapshot(connection, store):
+    # Догоняющая синхронизация копии. В снимке REPEATABLE READ берется xmin-горизонт:
+    # все транзакции с меньшим номером завершены, поэтому при следующей
+    # синхронизации достаточно строк с xmin не меньше сохраненного горизонта.
+    # Удаления выявляются сверкой количества и суммы id. При смене эпохи
+    # номеров транзакций (переполнение 32-битного xid) таблица загружается заново.
+    # Возвращает {таблица: (получено строк, удалено строк)}.
+    result = {}
+    with connection.cursor() as cursor:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        horizon = cursor.fetchone()[0]
+
+        for name, query in ReferenceCache.QUERIES.items():
+            cursor.execute(query)
+            store.set_reference(name, cursor.fetchall())
+
+        for table, (key_column, name_column, columns, *rest) in SNAPSHOT_TABLES.items():
+            since = store.horizon(table)
+            full = since is None or since >> 32 != horizon >> 32
+            if full:
+                cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            else:
+                cursor.execute(
+                    f"SELECT {', '.join(columns)} FROM {table} WHERE xmin::text::bigint >= %s",
+                    (since & 0xFFFFFFFF,)
+                )
+            rows = cursor.fetchall()
+            store.apply(table, rows, horizon, full)
+
+            deleted = 0
+            if not full:
+                cursor.execute(f"SELECT count(*), coalesce(sum({key_column}), 0) FROM {table}")
+                if tuple(cursor.fetchone()) != store.checksum(table):
+                    cursor.execute(f"SELECT {key_column} FROM {table}")
+                    deleted = store.retain(table, [row[0] for row in cursor.fetchall()])
+            result[table] = (len(rows), deleted)
+
+    return result
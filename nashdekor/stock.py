@@ -0,0 +1,156 @@
+# Движение материалов: журнал stock_movements (миграция 0009) и проведение поставок
+import psycopg2.errors
+
+
+# Ключ advisory-блокировки сворачивания журнала (одно сворачивание за раз)
+STOCK_LOCK_KEY = 4720533
+
+# Сколько дней движений хранить построчно (python main.py compact-stock)
+STOCK_LEDGER_RETENTION_DAYS = 90
+
+# Виды движений, которые можно записать вручную ('balance' пишет только база)
+STOCK_MOVEMENT_KINDS = {
+    "supply": "Приход",
+    "production": "Расход на производство",
+    "adjustment": "Корректировка",
+}
+
+
+def post_stock_movements(connection, movements, kind, comment=None):
+    # Записывает пакет движений [(id_material, delta), ...] одним INSERT;
+    # триггер stock_movements_apply прибавляет суммы delta к остаткам
+    # (stock_quantity = stock_quantity + delta), поэтому одновременные
+    # изменения остатка разными пользователями не теряются.
+    # Возвращает {id_material: новый остаток}.
+    if kind not in STOCK_MOVEMENT_KINDS:
+        raise ValueError(f"Неизвестный вид движения: {kind}")
+    movements = [(material_id, delta) for material_id, delta in movements if delta]
+    if not movements:
+        return {}
+
+    material_ids = [material_id for material_id, _ in movements]
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("""
+                INSERT INTO stock_movements (id_material, delta, kind, comment)
+                SELECT id_material, delta, %s, %s
+                FROM unnest(%s::integer[], %s::integer[]) AS t(id_material, delta)
+            """, (kind, comment, material_ids, [delta for _, delta in movements]))
+        except psycopg2.errors.CheckViolation as e:
+            # отрицательный остаток (триггер stock_movements_apply)
+            raise ValueError(e.diag.message_primary)
+        except psycopg2.errors.ForeignKeyViolation:
+            raise ValueError("Материал не найден (возможно, удален)")
+
+        cursor.execute(
+            "SELECT id_material, stock_quantity FROM materials WHERE id_material = ANY(%s)",
+            (material_ids,)
+        )
+        return dict(cursor.fetchall())
+
+
+def compact_stock_movements(connection, days=STOCK_LEDGER_RETENTION_DAYS):
+    # Сворачивает движения старше days дней: по каждому материалу они
+    # заменяются одной строкой 'balance' с их суммой (к остаткам она не
+    # применяется). Сумма delta по материалу при этом не меняется.
+    # Возвращает (удалено строк, записано строк 'balance').
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (STOCK_LOCK_KEY,))
+        cursor.execute("""
+            WITH old AS (
+                DELETE FROM stock_movements
+                WHERE created_at < now() - make_interval(days => %s)
+                RETURNING id_material, delta
+            ),
+            balances AS (
+                INSERT INTO stock_movements (id_material, delta, kind, comment, created_at)
+                SELECT id_material, sum(delta), 'balance', 'Свернутые движения',
+                       now() - make_interval(days => %s)
+                FROM old
+                GROUP BY id_material
+                HAVING sum(delta) <> 0
+                RETURNING 1
+            )
+            SELECT (SELECT count(*) FROM old), (SELECT count(*) FROM balances)
+        """, (days, days))
+        return cursor.fetchone()
+
+
+def fetch_stock_mismatches(connection, limit=20):
+    # Материалы, у которых остаток не совпадает с суммой журнала
+    # (например, stock_quantity изменили в обход журнала).
+    # Возвращает [(id_material, material_name, остаток, сумма журнала), ...].
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT m.id_material, m.material_name, m.stock_quantity, coalesce(l.total, 0)
+            FROM materials m
+            LEFT JOIN (
+                SELECT id_material, sum(delta) AS total
+                FROM stock_movements
+                GROUP BY id_material
+            ) l ON l.id_material = m.id_material
+            WHERE m.stock_quantity <> coalesce(l.total, 0)
+            ORDER BY m.id_material
+            LIMIT %s
+        """, (limit,))
+        return cursor.fetchall()
+
+
+def fetch_supply_form(connection):
+    # Данные страницы поставок: поставщики, склады и материалы
+    # (id, наименование, единица, остаток)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT id_suppliers, supplier_name FROM suppliers ORDER BY supplier_name, id_suppliers")
+        suppliers = cursor.fetchall()
+        cursor.execute("SELECT id_sklad, name FROM sklad ORDER BY name, id_sklad")
+        warehouses = cursor.fetchall()
+        cursor.execute("""
+            SELECT id_material, material_name, unit, stock_quantity
+            FROM materials
+            ORDER BY material_name COLLATE "C", id_material
+        """)
+        materials = cursor.fetchall()
+    return suppliers, warehouses, materials
+
+
+def validate_supply_note(supplier_id, warehouse_id, lines):
+    # Правила проверки накладной (страница поставок и проведение); при ошибке - ValueError
+    if supplier_id is None:
+        raise ValueError("Не выбран поставщик")
+    if warehouse_id is None:
+        raise ValueError("Не выбран склад")
+    if not lines:
+        raise ValueError("В накладной нет строк")
+    for line_number, (material_id, count) in enumerate(lines, start=1):
+        if material_id is None:
+            raise ValueError(f"Строка {line_number}: не выбран материал")
+        if count <= 0:
+            raise ValueError(f"Строка {line_number}: количество должно быть больше нуля")
+
+
+def post_supply_note(connection, supplier_id, warehouse_id, lines):
+    # Проводит накладную (один поставщик, один склад, строки [(id_material, количество), ...])
+    # одной транзакцией: строки supplies добавляются одним INSERT, а приход на
+    # остатки делает триггер supplies_stock_insert через журнал движения -
+    # одним групповым UPDATE materials на всю накладную.
+    # Возвращает (добавлено строк поставок, {id_material: новый остаток}).
+    validate_supply_note(supplier_id, warehouse_id, lines)
+
+    material_ids = [material_id for material_id, _ in lines]
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("""
+                INSERT INTO supplies (id_suppliers, id_material, id_sklad, count)
+                SELECT %s, l.id_material, %s, l.count
+                FROM unnest(%s::integer[], %s::integer[]) WITH ORDINALITY AS l(id_material, count, n)
+                ORDER BY l.n
+            """, (supplier_id, warehouse_id, material_ids, [count for _, count in lines]))
+        except psycopg2.errors.ForeignKeyViolation:
+            raise ValueError("Поставщик, склад или материал не найден (возможно, удален)")
+        inserted = cursor.rowcount
+
+        cursor.execute(
+            "SELECT id_material, stock_quantity FROM materials WHERE id_material = ANY(%s)",
+            (material_ids,)
+        )
+        return inserted, dict(cursor.fetchall())
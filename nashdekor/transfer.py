@@ -0,0 +1,366 @@
+# Импорт продукции и материалов из CSV/Excel и выгрузка таблиц в CSV/Parquet
+import io
+import csv
+import importlib
+
+from nashdekor.catalog import validate_product_fields, validate_material_fields
+
+
+# Колонки файлов импорта (первая строка файла - заголовок)
+PRODUCT_IMPORT_COLUMNS = ("articul", "type_product", "product_name", "min_cost", "width")
+MATERIAL_IMPORT_COLUMNS = ("material_name", "type_material", "unit_price", "stock_quantity",
+                           "min_quantity", "package_quantity", "unit")
+SUPPLY_NOTE_COLUMNS = ("material_name", "count")
+
+# Сколько строк файла проверяется и отправляется через COPY за один раз
+IMPORT_BATCH_SIZE = 5000
+
+
+def import_optional(name):
+    # Необязательные пакеты (openpyxl, pyarrow) импортируются при первом использовании,
+    # а не при запуске: вместе они удлиняли запуск примерно на 0,2 с
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def read_table_file(path):
+    # Потоковое чтение CSV (разделитель , ; или табуляция) или Excel (.xlsx).
+    # Возвращает пары (номер строки файла, список значений-строк).
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        openpyxl = import_optional("openpyxl")
+        if openpyxl is None:
+            raise ValueError("Для импорта из Excel установите пакет openpyxl")
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for line_number, values in enumerate(workbook.active.iter_rows(values_only=True), start=1):
+                yield line_number, ["" if value is None else str(value) for value in values]
+        finally:
+            workbook.close()
+        return
+
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        try:
+            dialect = csv.Sniffer().sniff(file.read(65536), delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        file.seek(0)
+        for line_number, values in enumerate(csv.reader(file, dialect), start=1):
+            yield line_number, values
+
+
+def parse_number(value, field, integer=False):
+    # Число из ячейки файла; допускается запятая как десятичный разделитель
+    try:
+        number = float(value.strip().replace(" ", "").replace(",", "."))
+    except ValueError:
+        raise ValueError(f"Поле {field}: некорректное число \"{value}\"")
+    if integer:
+        if not number.is_integer():
+            raise ValueError(f"Поле {field}: ожидается целое число")
+        return int(number)
+    return number
+
+
+def import_table_file(connection, path, columns, parse_row, staging_ddl, upsert_sql):
+    # Общий конвейер импорта: строки файла проверяются пачками, корректные
+    # уходят через COPY во временную таблицу, затем один upsert переносит их
+    # в рабочую таблицу. Возвращает (добавлено, обновлено, ошибки), где
+    # ошибки - список (номер строки, сообщение).
+    rows = read_table_file(path)
+    header_line = next(rows, None)
+    if header_line is None:
+        raise ValueError("Файл пуст")
+
+    header = [name.strip().lower() for name in header_line[1]]
+    missing = [name for name in columns if name not in header]
+    if missing:
+        raise ValueError(f"В файле нет колонок: {', '.join(missing)}")
+    positions = [header.index(name) for name in columns]
+
+    errors = []
+    with connection.cursor() as cursor:
+        cursor.execute(staging_ddl)
+
+        def flush(batch):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for line_number, values in batch:
+                try:
+                    parsed = parse_row([values[i].strip() if i < len(values) else "" for i in positions])
+                except ValueError as e:
+                    errors.append((line_number, str(e)))
+                    continue
+                writer.writerow((line_number,) + parsed)
+            buffer.seek(0)
+            cursor.copy_expert("COPY import_staging FROM STDIN WITH (FORMAT csv)", buffer)
+
+        batch = []
+        for line_number, values in rows:
+            if not any(value.strip() for value in values):
+                continue
+            batch.append((line_number, values))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+        cursor.execute(upsert_sql)
+        inserted, updated = cursor.fetchone()
+
+    return inserted, updated, errors
+
+
+def import_products(connection, path, reference_cache):
+    # Импорт продукции из CSV/Excel; строки сопоставляются по артикулу
+    type_ids = {type_name.strip().lower(): type_id
+                for type_id, type_name, coefficient in reference_cache.get("type_product", connection)}
+
+    def parse_row(values):
+        articul, type_name, product_name, min_cost, width = values
+        min_cost = parse_number(min_cost, "min_cost")
+        width = parse_number(width, "width")
+        type_id = type_ids.get(type_name.lower())
+        if type_name and type_id is None:
+            raise ValueError(f"Неизвестный тип продукта: {type_name}")
+        validate_product_fields(articul, type_id, product_name, min_cost, width)
+        return articul, type_id, product_name, min_cost, width
+
+    return import_table_file(
+        connection, path, PRODUCT_IMPORT_COLUMNS, parse_row,
+        """CREATE TEMP TABLE import_staging (
+               line_number integer,
+               articul text,
+               id_type_product integer,
+               product_name text,
+               min_cost double precision,
+               width double precision
+           ) ON COMMIT DROP""",
+        """WITH source AS (
+               -- при повторе артикула в файле побеждает последняя строка
+               SELECT DISTINCT ON (articul) *
+               FROM import_staging
+               ORDER BY articul, line_number DESC
+           ),
+           saved AS (
+               INSERT INTO products (articul, id_type_product, product_name, min_cost, width)
+               SELECT s.articul, s.id_type_product, s.product_name, s.min_cost, s.width
+               FROM source s
+               ON CONFLICT (articul) DO UPDATE
+               SET id_type_product = EXCLUDED.id_type_product,
+                   product_name = EXCLUDED.product_name,
+                   min_cost = EXCLUDED.min_cost,
+                   width = EXCLUDED.width
+               -- xmax = 0 только у только что вставленных строк
+               RETURNING xmax = 0 AS inserted
+           )
+           SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+           FROM saved"""
+    )
+
+
+def import_materials(connection, path, reference_cache):
+    # Импорт материалов из CSV/Excel; строки сопоставляются по наименованию
+    type_ids = {type_name.strip().lower(): type_id
+                for type_id, type_name, defects in reference_cache.get("type_material", connection)}
+
+    def parse_row(values):
+        material_name, type_name, unit_price, stock_quantity, min_quantity, package_quantity, unit = values
+        unit_price = parse_number(unit_price, "unit_price")
+        stock_quantity = parse_number(stock_quantity, "stock_quantity", integer=True)
+        min_quantity = parse_number(min_quantity, "min_quantity", integer=True)
+        package_quantity = parse_number(package_quantity, "package_quantity", integer=True)
+        type_id = type_ids.get(type_name.lower())
+        if type_name and type_id is None:
+            raise ValueError(f"Неизвестный тип материала: {type_name}")
+        validate_material_fields(material_name, type_id, unit_price, stock_quantity,
+                                 min_quantity, package_quantity, unit)
+        return material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit
+
+    return import_table_file(
+        connection, path, MATERIAL_IMPORT_COLUMNS, parse_row,
+        """CREATE TEMP TABLE import_staging (
+               line_number integer,
+               material_name text,
+               id_type_material integer,
+               unit_price numeric(10, 2),
+               stock_quantity integer,
+               min_quantity integer,
+               package_quantity integer,
+               unit text
+           ) ON COMMIT DROP""",
+        """WITH source AS (
+               -- при повторе наименования в файле побеждает последняя строка
+               SELECT DISTINCT ON (material_name) *
+               FROM import_staging
+               ORDER BY material_name, line_number DESC
+           ),
+           updated AS (
+               -- остаток не перезаписывается: m.stock_quantity в RETURNING - текущее
+               -- значение заблокированной строки, разница уходит в журнал движения
+               UPDATE materials m
+               SET id_type_material = s.id_type_material,
+                   unit_price = s.unit_price,
+                   min_quantity = s.min_quantity,
+                   package_quantity = s.package_quantity,
+                   unit = s.unit
+               FROM source s
+               WHERE m.material_name = s.material_name
+               RETURNING m.id_material, s.stock_quantity - m.stock_quantity AS delta
+           ),
+           adjusted AS (
+               INSERT INTO stock_movements (id_material, delta, kind, comment)
+               SELECT id_material, delta, 'adjustment', 'Импорт материалов'
+               FROM updated
+               WHERE delta <> 0
+           ),
+           inserted AS (
+               INSERT INTO materials (material_name, id_type_material, unit_price, stock_quantity,
+                                      min_quantity, package_quantity, unit)
+               SELECT s.material_name, s.id_type_material, s.unit_price, s.stock_quantity,
+                      s.min_quantity, s.package_quantity, s.unit
+               FROM source s
+               WHERE NOT EXISTS (SELECT 1 FROM materials m WHERE m.material_name = s.material_name)
+               RETURNING 1
+           )
+           SELECT (SELECT count(*) FROM inserted), (SELECT count(*) FROM updated)"""
+    )
+
+
+def read_supply_note(path, material_ids):
+    # Строки накладной из CSV/Excel (колонки SUPPLY_NOTE_COLUMNS) для страницы
+    # поставок; material_ids - {наименование в нижнем регистре: id_material}.
+    # Возвращает (строки [(id_material, количество)], ошибки [(номер строки, сообщение)]).
+    rows = read_table_file(path)
+    header_line = next(rows, None)
+    if header_line is None:
+        raise ValueError("Файл пуст")
+
+    header = [name.strip().lower() for name in header_line[1]]
+    missing = [name for name in SUPPLY_NOTE_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"В файле нет колонок: {', '.join(missing)}")
+    name_position, count_position = (header.index(name) for name in SUPPLY_NOTE_COLUMNS)
+
+    lines = []
+    errors = []
+    for line_number, values in rows:
+        if not any(value.strip() for value in values):
+            continue
+        values = [value.strip() for value in values] + [""] * (len(header) - len(values))
+        try:
+            material_id = material_ids.get(values[name_position].lower())
+            if material_id is None:
+                raise ValueError(f"Неизвестный материал: {values[name_position]}")
+            count = parse_number(values[count_position], "count", integer=True)
+            if count <= 0:
+                raise ValueError("Количество должно быть больше нуля")
+        except ValueError as e:
+            errors.append((line_number, str(e)))
+            continue
+        lines.append((material_id, count))
+    return lines, errors
+
+
+def write_import_error_report(path, errors):
+    # Отчет об ошибках импорта рядом с исходным файлом: <файл>.errors.csv
+    report_path = path + ".errors.csv"
+    with open(report_path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file, delimiter=";")
+        writer.writerow(("Строка", "Ошибка"))
+        writer.writerows(errors)
+    return report_path
+
+
+# Таблицы, доступные для выгрузки: имя -> (название, запрос)
+EXPORT_TABLES = {
+    "products": ("Продукция", """
+        SELECT p.id_product, p.articul, p.product_name, tp.type_product, p.min_cost, p.width
+        FROM products p
+        JOIN type_product tp ON p.id_type_product = tp.id_type_product
+        ORDER BY p.id_product"""),
+    "materials": ("Материалы (остатки)", """
+        SELECT m.id_material, m.material_name, tm.type_material, m.unit_price,
+               m.stock_quantity, m.min_quantity, m.package_quantity, m.unit
+        FROM materials m
+        JOIN type_material tm ON m.id_type_material = tm.id_type_material
+        ORDER BY m.id_material"""),
+    "supplies": ("Поставки", """
+        SELECT s.id_supplies, sp.supplier_name, m.material_name, sk.name AS sklad, s.count
+        FROM supplies s
+        JOIN suppliers sp ON s.id_suppliers = sp.id_suppliers
+        JOIN materials m ON s.id_material = m.id_material
+        JOIN sklad sk ON s.id_sklad = sk.id_sklad
+        ORDER BY s.id_supplies"""),
+    "requests": ("Заявки", """
+        SELECT r.id_req, r.date, pa.partner_name, p.articul, p.product_name,
+               r.count, r.cost, e.fio AS employee
+        FROM requests r
+        JOIN partners pa ON r.id_part = pa.id_part
+        JOIN products p ON r.id_product = p.id_product
+        JOIN employees e ON r.id_employ = e.id_employ
+        ORDER BY r.id_req"""),
+}
+
+# Сколько строк за раз читается серверным курсором при выгрузке в Parquet
+EXPORT_BATCH_SIZE = 10000
+
+
+def export_table(connection, table, path):
+    # Потоковая выгрузка таблицы в CSV (COPY ... TO STDOUT) или Parquet
+    # (серверный курсор, запись группами строк); память не зависит от размера таблицы.
+    # Возвращает количество выгруженных строк.
+    title, query = EXPORT_TABLES[table]
+
+    if path.lower().endswith(".parquet"):
+        return export_parquet(connection, query, path)
+
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", file)
+            return cursor.rowcount
+
+
+def parquet_schema(batch):
+    # Схема файла по первой группе строк: точность decimal расширяется до максимальной,
+    # а колонки без значений (только NULL) записываются как строки
+    pyarrow = import_optional("pyarrow")
+    fields = []
+    for field in batch.schema:
+        if pyarrow.types.is_decimal(field.type):
+            field = field.with_type(pyarrow.decimal128(38, field.type.scale))
+        elif pyarrow.types.is_null(field.type):
+            field = field.with_type(pyarrow.string())
+        fields.append(field)
+    return pyarrow.schema(fields)
+
+
+def export_parquet(connection, query, path):
+    pyarrow = import_optional("pyarrow")
+    if pyarrow is None or import_optional("pyarrow.parquet") is None:
+        raise ValueError("Для выгрузки в Parquet установите пакет pyarrow")
+
+    exported = 0
+    writer = None
+    with connection.cursor(name="export_cursor") as cursor:
+        cursor.itersize = EXPORT_BATCH_SIZE
+        cursor.execute(query)
+        try:
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                names = [column.name for column in cursor.description]
+                columns = {name: [row[i] for row in rows] for i, name in enumerate(names)}
+                if writer is None:
+                    schema = parquet_schema(pyarrow.table(columns))
+                    writer = pyarrow.parquet.ParquetWriter(path, schema)
+                if not rows:
+                    break
+                writer.write_table(pyarrow.table(columns, schema=writer.schema))
+                exported += len(rows)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    return exported
@@ -0,0 +1,161 @@
+# Проверки HTTP-сервиса каталога без базы данных: курсоры страниц,
+# разбор параметров и кэш ответов
+import asyncio
+import base64
+import json
+import unittest
+
+from nashdekor.api import (API_MAX_LIMIT, INT4_MAX, INT4_MIN, CatalogService, RequestError, ResponseCache,
+                           decode_cursor, encode_cursor, list_params, query_number)
+from nashdekor.catalog import LIST_PAGE_SIZE
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+class CursorTest(unittest.TestCase):
+    def test_round_trip(self):
+        for key in (("Обои «Лён» 7", 42), ("", 1), ("a=b&c", INT4_MAX), ("x" * 300, INT4_MIN)):
+            cursor = encode_cursor(key)
+            self.assertNotIn("=", cursor)
+            self.assertEqual(decode_cursor(cursor), key)
+
+    def test_bad_values(self):
+        for value in ("!!!", "не base64", raw_cursor({"a": 1}), raw_cursor(["a"]), raw_cursor(["a", 1, 2]),
+                      raw_cursor([1, 1]), raw_cursor(["a", "1"]), raw_cursor(["a", 1.5]), raw_cursor(["a", True]),
+                      raw_cursor(["a", INT4_MAX + 1]), raw_cursor(["a", INT4_MIN - 1]),
+                      base64.urlsafe_b64encode(b"\xff\xfe").decode("ascii")):
+            with self.subTest(value=value), self.assertRaises(RequestError) as error:
+                decode_cursor(value)
+            self.assertEqual(error.exception.status, 400)
+
+
+class ListParamsTest(unittest.TestCase):
+    def assert_bad_request(self, query):
+        with self.assertRaises(RequestError) as error:
+            list_params(query)
+        self.assertEqual(error.exception.status, 400)
+
+    def test_defaults(self):
+        after, limit, filters = list_params({})
+        self.assertIsNone(after)
+        self.assertEqual(limit, LIST_PAGE_SIZE)
+        self.assertEqual(filters, {"text": "", "type_id": None, "price_min": None, "price_max": None})
+
+    def test_values(self):
+        cursor = encode_cursor(("Обои", 5))
+        after, limit, filters = list_params({"after": cursor, "limit": str(API_MAX_LIMIT), "text": "  лён ",
+                                             "type_id": "3", "price_min": "10.5", "price_max": "100"})
+        self.assertEqual(after, ("Обои", 5))
+        self.assertEqual(limit, API_MAX_LIMIT)
+        self.assertEqual(filters, {"text": "лён", "type_id": 3, "price_min": 10.5, "price_max": 100.0})
+
+    def test_empty_values_are_defaults(self):
+        after, limit, filters = list_params({"after": "", "limit": "", "type_id": "", "price_min": ""})
+        self.assertIsNone(after)
+        self.assertEqual(limit, LIST_PAGE_SIZE)
+        self.assertIsNone(filters["type_id"])
+        self.assertIsNone(filters["price_min"])
+
+    def test_invalid(self):
+        for query in ({"limit": "0"}, {"limit": str(API_MAX_LIMIT + 1)}, {"limit": "abc"}, {"limit": "1.5"},
+                      {"type_id": "x"}, {"type_id": str(INT4_MAX + 1)}, {"type_id": "99999999999"},
+                      {"type_id": str(INT4_MIN - 1)}, {"price_min": "-1"}, {"price_max": "дорого"},
+                      {"price_min": "inf"}, {"price_max": "nan"}, {"after": "###"}):
+            with self.subTest(query=query):
+                self.assert_bad_request(query)
+
+    def test_int4_bounds(self):
+        self.assertEqual(query_number({"n": str(INT4_MAX)}, "n", integer=True), INT4_MAX)
+        self.assertEqual(query_number({"n": str(INT4_MIN)}, "n", integer=True), INT4_MIN)
+        self.assertEqual(query_number({"n": "5"}, "n", integer=True, minimum=1, maximum=10), 5)
+        with self.assertRaises(RequestError):
+            query_number({"n": str(INT4_MAX + 1)}, "n", integer=True, minimum=1)
+
+
+class QuoteRouteTest(unittest.TestCase):
+    # Неверный id отклоняется до обращения к базе
+
+    class NoDatabase:
+        max_connections = 1
+
+    def test_product_id_out_of_range(self):
+        service = CatalogService(self.NoDatabase())
+        try:
+            for product_id in ("99999999999", str(INT4_MAX + 1), "abc"):
+                with self.subTest(product_id=product_id), self.assertRaises(RequestError) as error:
+                    asyncio.run(service.route(f"/products/{product_id}/quote", {}))
+                self.assertEqual(error.exception.status, 404)
+            with self.assertRaises(RequestError) as error:
+                asyncio.run(service.route("/products/1/quote", {"partner_id": "99999999999"}))
+            self.assertEqual(error.exception.status, 400)
+        finally:
+            service.executor.shutdown()
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(size=3)
+        self.cache.enabled = True
+
+    def put(self, key, tables=("products",), ttl=60):
+        self.cache.put(key, tables, (key, "etag"), ttl, self.cache.generation(tables))
+
+    def test_disabled_cache_stores_nothing(self):
+        self.cache.enabled = False
+        self.put("a")
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_put_and_get(self):
+        self.put("a")
+        self.assertEqual(self.cache.get("a"), ("a", "etag"))
+
+    def test_invalidate_drops_only_dependent_entries(self):
+        self.put("products", ("products",))
+        self.put("materials", ("materials",))
+        self.cache.invalidate("products")
+        self.assertIsNone(self.cache.get("products"))
+        self.assertIsNotNone(self.cache.get("materials"))
+
+    def test_stale_generation_is_not_stored(self):
+        # ответ прочитан до уведомления, а закончен после него
+        generation = self.cache.generation(("products",))
+        self.cache.invalidate("products")
+        self.cache.put("a", ("products",), ("a", "etag"), 60, generation)
+        self.assertIsNone(self.cache.get("a"))
+        self.put("a")
+        self.assertIsNotNone(self.cache.get("a"))
+
+    def test_generation_per_table(self):
+        before = self.cache.generation(("products", "materials"))
+        self.cache.invalidate("materials")
+        after = self.cache.generation(("products", "materials"))
+        self.assertEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+
+    def test_expired_entry(self):
+        self.put("a", ttl=-1)
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_least_recently_used_is_evicted(self):
+        for key in ("a", "b", "c"):
+            self.put(key)
+        self.cache.get("a")
+        self.put("d")
+        self.assertIsNone(self.cache.get("b"))
+        for key in ("a", "c", "d"):
+            self.assertIsNotNone(self.cache.get(key))
+
+    def test_clear(self):
+        self.put("a", ("products",))
+        self.put("b", ("materials",))
+        generation = self.cache.generation(("products", "materials"))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("a"))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertNotEqual(self.cache.generation(("products", "materials")), generation)
+
+
+if __name__ == "__main__":
+    unittest.main()
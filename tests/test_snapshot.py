@@ -0,0 +1,157 @@
+# Проверки локальной копии каталога (SQLite во временном файле): порядок и
+# страницы списка, фильтры с той же семантикой, что filter_conditions на сервере,
+# удаление отсутствующих строк и сброс копии другой базы
+import os
+import shutil
+import tempfile
+import unittest
+from decimal import Decimal
+
+from nashdekor.snapshot import SnapshotStore
+
+
+# (id_product, product_name, articul, min_cost, width, id_type_product)
+PRODUCTS = [
+    (1, "Обои «Лён» белые", "ЛН-100", Decimal("1500.00"), 1.06, 1),
+    (2, "Обои «Лён» серые", "ЛН-101", Decimal("1650.50"), 1.06, 1),
+    (3, "Ламинат дуб", "LM-200", Decimal("800.00"), 0.19, 2),
+    (4, "ЛЁН декоративный", "ДК-300", Decimal("2500.00"), 0.50, 3),
+    (5, "Плитка 100% керамика", "PL-400", Decimal("950.00"), 0.30, 2),
+    (6, "Арка", "АР-500", Decimal("3000.00"), 1.20, 3),
+    (7, "Обои «Лён» белые", "ЛН-102", Decimal("1500.00"), 1.06, 1),
+]
+
+PRODUCT_TYPES = [(1, "Обои"), (2, "Напольные покрытия"), (3, "Декор")]
+
+# (id_material, material_name, unit_price, stock_quantity, min_quantity, package_quantity, unit, id_type_material)
+MATERIALS = [
+    (10, "Клей обойный", Decimal("350.00"), 20, 5, 1, "кг", 1),
+    (11, "Краска белая", Decimal("700.00"), 0, 10, 5, "л", 2),
+    (12, "клей ПВА", Decimal("120.00"), 3, 2, 1, "кг", 1),
+]
+
+MATERIAL_TYPES = [(1, "Клей"), (2, "Краска")]
+
+
+class SnapshotStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "snapshot.sqlite3")
+        self.store = self.open_store("server-a")
+        self.store.apply("products", PRODUCTS, 100, full=True)
+        self.store.apply("materials", MATERIALS, 100, full=True)
+        self.store.set_reference("type_product", PRODUCT_TYPES)
+        self.store.set_reference("type_material", MATERIAL_TYPES)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def open_store(self, source):
+        store = SnapshotStore(self.path, source)
+        self.addCleanup(store.close)
+        return store
+
+    def product_ids(self, filters=None, after=None, limit=100):
+        rows, has_more = self.store.fetch_page("products", after, limit, filters)
+        return [row[0] for row in rows]
+
+    def test_order_and_row_format(self):
+        rows, has_more = self.store.fetch_page("products")
+        self.assertFalse(has_more)
+        # сортировка по (наименование, id) в порядке кодов символов, как COLLATE "C"
+        self.assertEqual([row[0] for row in rows], [6, 4, 3, 1, 7, 2, 5])
+        self.assertEqual(rows[2], (3, "Напольные покрытия", "Ламинат дуб", 800.0, "LM-200", 0.19, 2))
+
+        rows, has_more = self.store.fetch_page("materials")
+        self.assertEqual(rows[0], (10, "Клей", "Клей обойный", 350.0, 20, 5, 1, "кг", 1))
+
+    def test_paging(self):
+        pages = []
+        after = None
+        while True:
+            rows, has_more = self.store.fetch_page("products", after, 2)
+            pages.append([row[0] for row in rows])
+            if not has_more:
+                break
+            after = (rows[-1][2], rows[-1][0])
+        self.assertEqual(pages, [[6, 4], [3, 1], [7, 2], [5]])
+
+    def test_paging_with_filter(self):
+        filters = {"text": "лён"}
+        rows, has_more = self.store.fetch_page("products", None, 2, filters)
+        self.assertTrue(has_more)
+        self.assertEqual([row[0] for row in rows], [4, 1])
+        self.assertEqual(self.product_ids(filters, after=(rows[-1][2], rows[-1][0])), [7, 2])
+
+    def test_text_search_ignores_cyrillic_case(self):
+        for text in ("лён", "ЛЁН", "Лён"):
+            with self.subTest(text=text):
+                self.assertEqual(self.product_ids({"text": text}), [4, 1, 7, 2])
+        # ё и е - разные буквы, как и в ILIKE
+        self.assertEqual(self.product_ids({"text": "лен"}), [])
+
+    def test_articul_is_prefix_name_is_substring(self):
+        # артикул ищется только с начала, наименование - в любом месте
+        self.assertEqual(self.product_ids({"text": "лн-10"}), [1, 7, 2])
+        self.assertEqual(self.product_ids({"text": "н-10"}), [])
+        self.assertEqual(self.product_ids({"text": "дуб"}), [3])
+        self.assertEqual(self.product_ids({"text": "lm"}), [3])
+
+    def test_wildcards_are_literal(self):
+        # на сервере % и _ экранируются like_escape
+        self.assertEqual(self.product_ids({"text": "100%"}), [5])
+        self.assertEqual(self.product_ids({"text": "%"}), [5])
+        self.assertEqual(self.product_ids({"text": "_"}), [])
+
+    def test_materials_search_by_name(self):
+        rows, has_more = self.store.fetch_page("materials", filters={"text": "КЛЕЙ"})
+        self.assertEqual([row[0] for row in rows], [10, 12])
+
+    def test_type_and_price_filters(self):
+        self.assertEqual(self.product_ids({"type_id": 1}), [1, 7, 2])
+        self.assertEqual(self.product_ids({"price_min": 1500}), [6, 4, 1, 7, 2])
+        self.assertEqual(self.product_ids({"price_max": 1500}), [3, 1, 7, 5])
+        self.assertEqual(self.product_ids({"price_min": 900, "price_max": 1600.5}), [1, 7, 5])
+        self.assertEqual(self.product_ids({"text": "обои", "type_id": 1, "price_min": 1600}), [2])
+        self.assertEqual(self.product_ids({"type_id": 2, "price_max": 100}), [])
+        # пустые значения фильтров (как из list_params) не ограничивают список
+        self.assertEqual(len(self.product_ids({"text": "", "type_id": None, "price_min": None,
+                                               "price_max": None})), len(PRODUCTS))
+
+    def test_apply_updates_rows(self):
+        self.store.apply("products", [(3, "Ламинат ясень", "LM-200", Decimal("810.00"), 0.19, 2)], 120)
+        self.assertEqual(self.store.horizon("products"), 120)
+        rows, has_more = self.store.fetch_page("products", filters={"text": "ясень"})
+        self.assertEqual(rows, [(3, "Напольные покрытия", "Ламинат ясень", 810.0, "LM-200", 0.19, 2)])
+        self.assertEqual(self.product_ids({"text": "дуб"}), [])
+
+    def test_retain_deletes_missing_rows(self):
+        self.assertEqual(self.store.retain("products", [1, 2, 3, 5]), 3)
+        self.assertEqual(self.product_ids(), [3, 1, 2, 5])
+        self.assertEqual(self.store.checksum("products"), (4, 11))
+        self.assertEqual(self.store.retain("products", [1, 2, 3, 5]), 0)
+        # материалы не затронуты
+        self.assertEqual(self.store.checksum("materials"), (3, 33))
+
+    def test_reopen_keeps_rows(self):
+        store = self.open_store("server-a")
+        self.assertTrue(store.has_rows("products"))
+        self.assertEqual(store.horizon("products"), 100)
+        self.assertEqual(store.reference("type_product"), PRODUCT_TYPES)
+
+    def test_source_change_resets_file(self):
+        self.store.close()
+        store = self.open_store("server-b")
+        for table in ("products", "materials"):
+            self.assertFalse(store.has_rows(table))
+            self.assertIsNone(store.horizon(table))
+        self.assertIsNone(store.reference("type_product"))
+        store.close()
+        # и обратно: копия первой базы тоже не восстанавливается
+        store = self.open_store("server-a")
+        self.assertFalse(store.has_rows("products"))
+
+
+if __name__ == "__main__":
+    unittest.main()